@@ -0,0 +1,54 @@
+"""
+Cache backend benchmark.
+
+Measures a user cache hit (get), a read of 20 keys (mget) and a rate limit counter (incr) with each cache backend.
+The Redis and tiered backends are measured only when Redis answers at redis_host:redis_port; without Redis the
+tiered cache is measured over a second in-memory cache, so only its own overhead is shown.
+
+Usage: python -m benchmarks.bench_cache [iterations]
+"""
+import asyncio
+import sys
+import time
+
+from redis.exceptions import RedisError
+
+from src.database.redis import close_redis, get_redis
+from src.services.cache import Cache, MemoryCache, RedisCache, TieredCache
+
+
+async def per_call(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def measure(name: str, cache: Cache, iterations: int) -> None:
+    keys = [f"bench:user:{number}" for number in range(20)]
+    for key in keys:
+        await cache.set(key, b"x" * 512, ttl=60)
+    get = await per_call(lambda: cache.get(keys[0]), iterations)
+    mget = await per_call(lambda: cache.mget(keys), iterations)
+    incr = await per_call(lambda: cache.incr("bench:counter", ttl=60), iterations)
+    await cache.delete(*keys, "bench:counter")
+    print(f"{name:<24} get {get:8.2f} us   mget(20) {mget:8.2f} us   incr {incr:8.2f} us")
+
+
+async def main(iterations: int) -> None:
+    await measure("memory", MemoryCache(max_size=10000), iterations)
+    try:
+        await get_redis().ping()
+    except (RedisError, OSError) as err:
+        print(f"Redis is not available ({err}), measuring the tiered cache over memory")
+        await measure("tiered over memory", TieredCache(MemoryCache(10000), MemoryCache(10000), 5), iterations)
+        return
+    try:
+        await measure("redis", RedisCache(), iterations)
+        await measure("tiered over redis", TieredCache(MemoryCache(10000), RedisCache(), 5), iterations)
+    finally:
+        await close_redis()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
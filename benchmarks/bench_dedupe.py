@@ -0,0 +1,56 @@
+"""
+Duplicate detection benchmark.
+
+Builds a synthetic address book (10% of the contacts are near duplicates of another one: same phone in a different
+notation, or the same name with different case and word order) and measures normalization and clustering.
+
+Usage: python -m benchmarks.bench_dedupe [contacts]
+"""
+import random
+import sys
+import time
+
+from src.services.dedupe import find_clusters, fold_name, normalize_email, normalize_phone
+
+
+def synthetic_contacts(count: int):
+    rnd = random.Random(42)
+    contacts = []
+    for i in range(count):
+        if contacts and rnd.random() < 0.1:
+            _, name, surname, email, phone = contacts[rnd.randrange(len(contacts))]
+            if rnd.random() < 0.5:
+                phone = f"+38 ({phone[:3]}) {phone[3:6]}-{phone[6:]}"
+            else:
+                name, surname = surname.upper(), name
+            email = f"other{i}@example.com"
+        else:
+            name, surname = f"Name{i}", f"Surname{rnd.randrange(count)}"
+            email = f"user{i}@example.com"
+            phone = f"0{rnd.randrange(10 ** 9):09d}"
+        contacts.append((i, name, surname, email, phone))
+    return contacts
+
+
+def main(count: int) -> None:
+    contacts = synthetic_contacts(count)
+
+    start = time.perf_counter()
+    rows = [(i, normalize_email(email), normalize_phone(phone), fold_name(name, surname))
+            for i, name, surname, email, phone in contacts]
+    normalized = time.perf_counter() - start
+
+    # the database returns the keys sorted, see find_duplicates
+    keys = sorted(((kind, key), contact_id) for contact_id, *row in rows for kind, key in enumerate(row) if key)
+
+    start = time.perf_counter()
+    clusters = list(find_clusters(keys))
+    clustered = time.perf_counter() - start
+
+    print(f"contacts:      {count}")
+    print(f"normalization: {normalized:.2f} s (done once on write, stored in the indexed columns)")
+    print(f"clustering:    {clustered:.2f} s, {len(clusters)} clusters")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
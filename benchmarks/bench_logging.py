@@ -0,0 +1,43 @@
+"""
+Logging overhead benchmark.
+
+Measures the cost of one logger call made by the request handling code: a DEBUG call below the INFO level, which
+is rejected before a record is created, and an INFO call through the queue handler of setup_logging, whose JSON
+rendering and write happen in the writer thread, compared with a synchronous StreamHandler and with print.
+
+Usage: python -m benchmarks.bench_logging [calls]
+"""
+import contextlib
+import logging
+import os
+import sys
+import timeit
+
+from src.services.logs import setup_logging, stop_logging
+
+
+def per_call(statement, calls: int) -> float:
+    return min(timeit.repeat(statement, number=calls, repeat=5)) / calls * 1e6
+
+
+def main(calls: int) -> None:
+    logger = logging.getLogger("bench")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        baseline = per_call(lambda: None, calls)
+        setup_logging("INFO")
+        disabled = per_call(lambda: logger.debug("Get user from cache %s", "user@example.com"), calls)
+        queued = per_call(lambda: logger.info("Get user from cache %s", "user@example.com"), calls)
+        stop_logging()
+        root = logging.getLogger()
+        root.handlers[:] = [logging.StreamHandler(devnull)]
+        synchronous = per_call(lambda: logger.info("Get user from cache %s", "user@example.com"), calls)
+        printed = per_call(lambda: print("Get user from cache", "user@example.com"), calls)
+    print(f"{'empty call':<28} {baseline:8.3f} us", file=sys.stderr)
+    print(f"{'debug below the level':<28} {disabled:8.3f} us", file=sys.stderr)
+    print(f"{'info through the queue':<28} {queued:8.3f} us", file=sys.stderr)
+    print(f"{'info, synchronous handler':<28} {synchronous:8.3f} us", file=sys.stderr)
+    print(f"{'print':<28} {printed:8.3f} us", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,121 @@
+"""
+Contacts partitioning benchmark.
+
+Loads the same synthetic contacts into a plain table and into a table hash partitioned by user_id, each in its own
+schema of a PostgreSQL database, and measures the latency of single contact INSERTs and of per-user list queries,
+plus the size of the tables with their indexes. The rows are generated by the server, so a 100M row run needs
+only disk space and time: the default is a scaled-down 1M rows.
+
+Usage: python -m benchmarks.bench_partitions [rows] [partitions] [users]
+The database is taken from BENCH_DATABASE_URL, or SQLALCHEMY_DATABASE_URL; the schemas are dropped at the end.
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.conf.config import config
+
+TABLE = """
+CREATE TABLE {schema}.contacts (
+    id BIGSERIAL, name VARCHAR(150) NOT NULL, surname VARCHAR(150) NOT NULL, email VARCHAR(50) NOT NULL,
+    phone VARCHAR(20) NOT NULL, bd VARCHAR(50) NOT NULL, city VARCHAR(50) NOT NULL, notes VARCHAR(300) NOT NULL,
+    created_at TIMESTAMP DEFAULT now(), updated_at TIMESTAMP DEFAULT now(), user_id INTEGER NOT NULL,
+    email_normalized VARCHAR(50), phone_e164 VARCHAR(20), name_key VARCHAR(300),
+    PRIMARY KEY ({primary_key}), UNIQUE (user_id, email)
+) {partition_by}
+"""
+INDEXES = ["name", "surname", "email", "phone", "user_id, email_normalized", "user_id, phone_e164",
+           "user_id, name_key"]
+LOAD = """
+INSERT INTO {schema}.contacts (name, surname, email, phone, bd, city, notes, user_id, email_normalized, phone_e164,
+                               name_key)
+SELECT 'Name' || i, 'Surname' || (i % 100000), 'contact' || i || '@example.com', '0' || (500000000 + i % 499999999),
+       '1990-01-01', 'City' || (i % 1000), '', 1 + i % :users, 'contact' || i || '@example.com',
+       '+380' || (500000000 + i % 499999999), 'name' || i || ' surname' || (i % 100000)
+FROM generate_series(:start, :stop) AS i
+"""
+INSERT = """
+INSERT INTO {schema}.contacts (name, surname, email, phone, bd, city, notes, user_id)
+VALUES ('Bench', 'Insert', :email, '0501234567', '1990-01-01', 'Kyiv', '', :user_id)
+"""
+LIST = "SELECT * FROM {schema}.contacts WHERE user_id = :user_id ORDER BY id LIMIT 50"
+
+
+def report(name: str, samples: list[float]) -> None:
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{name:<24} mean {statistics.mean(samples) * 1000:8.3f} ms   p95 {p95 * 1000:8.3f} ms")
+
+
+async def setup(conn, schema: str, rows: int, partitions: int, users: int) -> None:
+    await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+    await conn.execute(text(f"CREATE SCHEMA {schema}"))
+    await conn.execute(text(TABLE.format(
+        schema=schema,
+        primary_key="id, user_id" if partitions else "id",
+        partition_by="PARTITION BY HASH (user_id)" if partitions else "",
+    )))
+    for remainder in range(partitions):
+        await conn.execute(text(f"CREATE TABLE {schema}.contacts_p{remainder} PARTITION OF {schema}.contacts "
+                                f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"))
+    for columns in INDEXES:
+        await conn.execute(text(f"CREATE INDEX ON {schema}.contacts ({columns})"))
+    # loaded in chunks, so the indexes are maintained as in production and the transactions stay small
+    for start in range(1, rows + 1, 1_000_000):
+        await conn.execute(text(LOAD.format(schema=schema)),
+                           {"users": users, "start": start, "stop": min(start + 999_999, rows)})
+        await conn.commit()
+    await conn.execute(text(f"ANALYZE {schema}.contacts"))
+    await conn.commit()
+
+
+async def measure(conn, schema: str, users: int, iterations: int) -> None:
+    rnd = random.Random(42)
+    inserts, lists = [], []
+    for i in range(iterations):
+        user_id = rnd.randint(1, users)
+        start = time.perf_counter()
+        await conn.execute(text(INSERT.format(schema=schema)), {"email": f"bench{i}@example.com", "user_id": user_id})
+        await conn.commit()
+        inserts.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        (await conn.execute(text(LIST.format(schema=schema)), {"user_id": user_id})).all()
+        lists.append(time.perf_counter() - start)
+    size = (await conn.execute(text(
+        "SELECT sum(pg_total_relation_size(c.oid)) FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = :schema AND c.relkind = 'r'"), {"schema": schema})).scalar_one()
+    print(f"{schema}: {size / 2 ** 20:.0f} MB with indexes")
+    report("  insert", inserts)
+    report("  list per user", lists)
+
+
+async def main(rows: int, partitions: int, users: int) -> None:
+    url = os.environ.get("BENCH_DATABASE_URL", config.sqlalchemy_database_url)
+    engine = create_async_engine(url)
+    print(f"rows: {rows}, users: {users}, partitions: {partitions}")
+    try:
+        async with engine.connect() as conn:
+            for schema, count in (("bench_plain", 0), ("bench_hash", partitions)):
+                start = time.perf_counter()
+                await setup(conn, schema, rows, count, users)
+                print(f"{schema}: loaded in {time.perf_counter() - start:.0f} s")
+                await measure(conn, schema, users, iterations=1000)
+    finally:
+        async with engine.connect() as conn:
+            for schema in ("bench_plain", "bench_hash"):
+                await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+            await conn.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    rows, partitions, users = args + [1_000_000, 16, 10_000][len(args):]
+    asyncio.run(main(rows, partitions, users))
@@ -0,0 +1,66 @@
+"""
+Signup latency benchmark.
+
+Measures the password hash alone, the create_user INSERT alone and the whole signup path
+(hash in a worker thread + INSERT) against an in-memory SQLite database, to check that signup
+is bounded by one INSERT plus password hashing.
+
+Usage: python -m benchmarks.bench_signup [iterations]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.db import Base
+from src.repository import users as repository_users
+from src.schemas import UserSchema, UserResponseSchema
+from src.services.auth import auth_service
+
+
+def report(name: str, samples: list[float]) -> None:
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{name:<24} mean {statistics.mean(samples) * 1000:8.3f} ms   p95 {p95 * 1000:8.3f} ms")
+
+
+async def main(iterations: int) -> None:
+    engine = create_async_engine("sqlite+aiosqlite://", connect_args={"check_same_thread": False},
+                                 poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    hashing, inserts, signups = [], [], []
+    for i in range(iterations):
+        start = time.perf_counter()
+        auth_service.get_password_hash("123456")
+        hashing.append(time.perf_counter() - start)
+
+        body = UserSchema(username=f"bench{i:05}", email=f"insert{i}@example.com", password="123456")
+        async with session_maker() as session:
+            start = time.perf_counter()
+            user = await repository_users.create_user(body, session)
+            inserts.append(time.perf_counter() - start)
+
+        body = UserSchema(username=f"bench{i:05}", email=f"signup{i}@example.com", password="123456")
+        async with session_maker() as session:
+            start = time.perf_counter()
+            body.password = await asyncio.to_thread(auth_service.get_password_hash, body.password)
+            user = await repository_users.create_user(body, session)
+            UserResponseSchema.model_validate(user)
+            signups.append(time.perf_counter() - start)
+
+    report("password hash", hashing)
+    report("create_user (INSERT)", inserts)
+    report("signup (hash + INSERT)", signups)
+    print(f"signup overhead over hash + INSERT: "
+          f"{(statistics.mean(signups) - statistics.mean(hashing) - statistics.mean(inserts)) * 1000:.3f} ms")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
@@ -0,0 +1,98 @@
+"""
+Worker scaling benchmark.
+
+Starts serve.py with 1, 2, 4, ... workers up to the number of CPUs, loads GET /health/live with keep-alive
+connections from several client processes, and prints the requests per second and the scaling efficiency:
+the throughput of N workers divided by N times the throughput of one. Near-linear scaling shows as an efficiency
+close to 1. The clients run on the same machine and take CPU too, so run it on a host with spare cores,
+or pin the server with --pin-cpus and the clients with taskset, to get meaningful numbers.
+
+Usage: python -m benchmarks.bench_workers [seconds] [connections] [max_workers]
+"""
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+HOST = "127.0.0.1"
+REQUEST = f"GET /health/live HTTP/1.1\r\nHost: {HOST}\r\n\r\n".encode()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((HOST, port), timeout=1) as sock:
+                sock.sendall(REQUEST)
+                if sock.recv(1024).startswith(b"HTTP/1.1 200"):
+                    return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("the server did not start")
+
+
+async def client(port: int, until: float) -> int:
+    reader, writer = await asyncio.open_connection(HOST, port)
+    done = 0
+    while time.monotonic() < until:
+        writer.write(REQUEST)
+        await reader.readuntil(b"}")  # the headers and the small JSON body
+        done += 1
+    writer.close()
+    return done
+
+
+def load(port: int, connections: int, seconds: float, results) -> None:
+    async def run() -> int:
+        until = time.monotonic() + seconds
+        return sum(await asyncio.gather(*(client(port, until) for _ in range(connections))))
+
+    results.put(asyncio.run(run()))
+
+
+def measure(workers: int, seconds: float, connections: int) -> float:
+    port = free_port()
+    env = dict(os.environ, RATE_LIMIT_ENABLED="false", WARMUP_TIMEOUT="0.1")
+    server = subprocess.Popen([sys.executable, "serve.py", "--workers", str(workers), "--host", HOST,
+                               "--port", str(port)], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port)
+        time.sleep(1)  # all the workers accept connections
+        results = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=load, args=(port, connections, seconds, results))
+                   for _ in range(workers)]
+        for process in clients:
+            process.start()
+        total = sum(results.get() for _ in clients)
+        for process in clients:
+            process.join()
+        return total / seconds
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(seconds: float, connections: int, max_workers: int) -> None:
+    print(f"{os.cpu_count()} CPUs, {seconds:.0f} s per run, {connections} connections per client process")
+    baseline = None
+    workers = 1
+    while workers <= max_workers:
+        rate = measure(workers, seconds, connections)
+        baseline = baseline or rate
+        print(f"{workers:>3} workers  {rate:10.0f} req/s   efficiency {rate / (workers * baseline):5.2f}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 10,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 32,
+         int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count() or 1)
@@ -1,16 +1,84 @@
 import asyncio
+import contextlib
+import logging
+import sys
 
-import redis.asyncio as redis
-import uvicorn
 from fastapi import FastAPI, Depends
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
+from fastapi.responses import JSONResponse
+from redis.exceptions import RedisError
+from sqlalchemy.exc import SQLAlchemyError
 from starlette.background import BackgroundTasks
 from starlette.middleware.cors import CORSMiddleware
-
-from src.routes import contacts, auth, users
-
-app = FastAPI()
+from starlette.staticfiles import StaticFiles
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.database.redis import close_redis
+from src.routes import contacts, auth, users, metrics, health, profiling
+from src.services import avatar, subscribers
+from src.services.compression import CompressionMiddleware, precompressed
+from src.services.events import bus
+from src.services.lifecycle import InFlightMiddleware, lifecycle, warm_up_database, warm_up_redis
+from src.services.logs import RequestIdMiddleware, setup_logging, stop_logging
+from src.services.outbox import relay
+from src.services.profiling import ProfilingMiddleware
+from src.services.rate_limit import RateLimit
+from src.services.tracking import open_recorder
+
+logger = logging.getLogger(__name__)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    The lifespan function starts the application and stops it.
+    On startup the database and Redis connections are opened and the hot queries prepared before the instance
+    reports ready; a dependency that is down is logged and does not prevent the start.
+    On shutdown the instance reports not ready, waits for the requests in progress and their background tasks,
+    finishes the outbox batch in progress, handles the queued events, writes the buffered email opens, stops the
+    thumbnail processes and only then closes the connection pools.
+
+    :param app: FastAPI: The application
+    :return: None
+    :doc-author: Trelent
+    """
+    setup_logging(config.log_level, config.log_json, config.log_debug_sample_rate)
+    # never more than the pools of this process may hold
+    db_connections = min(config.warmup_db_connections, config.db_pool_size)
+    redis_connections = min(config.warmup_redis_connections,
+                            config.redis_max_connections or config.warmup_redis_connections)
+    for name, warm_up in (("Database", warm_up_database(db_connections)),
+                          ("Redis", warm_up_redis(redis_connections))):
+        try:
+            await asyncio.wait_for(warm_up, config.warmup_timeout)
+        except (RedisError, SQLAlchemyError, OSError, asyncio.TimeoutError) as err:
+            logger.warning("%s warm-up failed: %s", name, err)
+    open_recorder.start()
+    bus.start()
+    relay.start()
+    # the schema never changes while the app runs, it is compressed once
+    precompressed.add(app.openapi_url, JSONResponse(app.openapi()).body)
+    lifecycle.draining = False
+    lifecycle.ready = True
+    try:
+        yield
+    finally:
+        await lifecycle.drain(config.shutdown_timeout)
+        await relay.stop(config.shutdown_timeout)
+        await bus.stop(config.shutdown_timeout)
+        await open_recorder.stop()
+        avatar.shutdown_pool()
+        await close_redis()
+        await sessionmanager.close()
+        stop_logging()
+
+
+app = FastAPI(lifespan=lifespan)
+# uvicorn installs its exit handler for SIGTERM after importing the application, so it is wrapped now;
+# uvicorn itself is not imported here, to keep the cold start small
+if "uvicorn" in sys.modules:
+    lifecycle.delay_server_exit(sys.modules["uvicorn"].Server, config.shutdown_delay)
+subscribers.register(bus, relay)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,11 +86,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Total-Count-Estimated", "X-Next-After-Id", "X-Request-ID"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(InFlightMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
+app.include_router(health.router)
 app.include_router(auth.router)
 app.include_router(contacts.router, prefix='/api')
 app.include_router(users.router, prefix='/api')
+app.include_router(metrics.router, prefix='/api')
+app.include_router(profiling.router, prefix='/api')
+
+if config.avatar_storage == "local":
+    app.mount(config.avatar_base_url, StaticFiles(directory=config.avatar_local_dir, check_dir=False), name="avatars")
 
 
 async def task():
@@ -35,26 +114,11 @@ async def task():
     :doc-author: Trelent
     """
     await asyncio.sleep(3)
-    print("Send email")
+    logger.info("Send email")
     return True
 
 
-@app.on_event("startup")
-async def startup(settings=None):
-    """
-    The startup function is called when the application starts up.
-    It can be used to initialize things that are needed by the app, such as a database connection pool or an external API client.
-    The startup function must be a coroutine and it receives one argument: settings.
-
-    :param settings: Pass in the fastapilimiter settings
-    :return: The redis connection object
-    :doc-author: Trelent
-    """
-    r = await redis.Redis(host='localhost', port=6379, db=0, encoding="utf-8", decode_responses=True)
-    await FastAPILimiter.init(r)
-
-
-@app.get("/", dependencies=[Depends(RateLimiter(times=2, seconds=5))])
+@app.get("/", dependencies=[Depends(RateLimit("2/5"))])
 def read_root(background_tasks: BackgroundTasks):
     """
     The read_root function is a ReST endpoint that returns the message &quot;CONTACT API&quot;.
@@ -67,4 +131,6 @@ def read_root(background_tasks: BackgroundTasks):
     return {"message": "CONTACT API"}
 
 if __name__ == '__main__':
+    import uvicorn
+
     uvicorn.run("main:app", host="localhost", reload=True, log_level="info", port=5000)
\ No newline at end of file
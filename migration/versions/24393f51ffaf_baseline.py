@@ -0,0 +1,63 @@
+"""baseline
+
+Revision ID: 24393f51ffaf
+Revises:
+Create Date: 2026-10-19 10:00:00.000000
+
+Databases created before the migrations existed already have this schema: run `alembic stamp 24393f51ffaf`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '24393f51ffaf'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=50), nullable=False),
+        sa.Column('email', sa.String(length=250), nullable=False),
+        sa.Column('password', sa.String(length=255), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('avatar', sa.String(length=255), nullable=True),
+        sa.Column('refresh_token', sa.String(length=255), nullable=True),
+        sa.Column('role', sa.Enum('admin', 'moderator', 'user', name='role'), nullable=False),
+        sa.Column('confirmed', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+    )
+    op.create_table(
+        'contacts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=150), nullable=False),
+        sa.Column('surname', sa.String(length=150), nullable=False),
+        sa.Column('email', sa.String(length=50), nullable=False),
+        sa.Column('phone', sa.String(length=20), nullable=False),
+        sa.Column('bd', sa.String(length=50), nullable=False),
+        sa.Column('city', sa.String(length=50), nullable=False),
+        sa.Column('notes', sa.String(length=300), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_contacts_name', 'contacts', ['name'])
+    op.create_index('ix_contacts_surname', 'contacts', ['surname'])
+    op.create_index('ix_contacts_email', 'contacts', ['email'], unique=True)
+    op.create_index('ix_contacts_phone', 'contacts', ['phone'])
+
+
+def downgrade() -> None:
+    op.drop_table('contacts')
+    op.drop_table('users')
+    sa.Enum(name='role').drop(op.get_bind(), checkfirst=True)
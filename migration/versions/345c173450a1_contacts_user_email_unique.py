@@ -0,0 +1,34 @@
+"""contact emails unique per user
+
+Revision ID: 345c173450a1
+Revises: 24393f51ffaf
+Create Date: 2026-10-19 10:10:00.000000
+
+The email of a contact was unique across all users, now it is unique within the address book of a user.
+This is also required to partition the table by user_id.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '345c173450a1'
+down_revision: Union[str, None] = '24393f51ffaf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.drop_index('ix_contacts_email')
+        batch_op.create_index('ix_contacts_email', ['email'])
+        batch_op.create_unique_constraint('uq_contacts_user_email', ['user_id', 'email'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.drop_constraint('uq_contacts_user_email', type_='unique')
+        batch_op.drop_index('ix_contacts_email')
+        batch_op.create_index('ix_contacts_email', ['email'], unique=True)
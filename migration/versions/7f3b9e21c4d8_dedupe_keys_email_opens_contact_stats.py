@@ -0,0 +1,107 @@
+"""dedupe keys, email opens and contact stats
+
+Revision ID: 7f3b9e21c4d8
+Revises: 345c173450a1
+Create Date: 2026-10-19 10:15:00.000000
+
+The normalized columns of contacts used to find duplicates, the email_opens table of the open tracking pixel
+and the contact_stats counters. The duplicate search reads the normalized keys sorted from the database, so the upgrade
+fills them for the existing contacts.
+The counters of contact_stats are only maintained by the contact writes, so the upgrade counts the existing contacts
+into them, in the same transaction. On a large table this takes one aggregate scan of contacts; when the upgrade
+is run offline (--sql) the backfill can not run, call POST /api/contacts/stats/reconcile for every user instead;
+the contacts then get their normalized keys when they are next saved.
+"""
+from collections import Counter
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.database.models import Contact
+from src.repository.stats import contact_buckets
+from src.services.dedupe import fold_name, normalize_email, normalize_phone
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f3b9e21c4d8'
+down_revision: Union[str, None] = '345c173450a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.add_column(sa.Column('email_normalized', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('phone_e164', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('name_key', sa.String(length=300), nullable=True))
+        batch_op.create_index('ix_contacts_user_email_normalized', ['user_id', 'email_normalized'])
+        batch_op.create_index('ix_contacts_user_phone_e164', ['user_id', 'phone_e164'])
+        batch_op.create_index('ix_contacts_user_name_key', ['user_id', 'name_key'])
+    op.create_table(
+        'email_opens',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=50), nullable=False),
+        sa.Column('opened_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_email_opens_username', 'email_opens', ['username'])
+    contact_stats = op.create_table(
+        'contact_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('dimension', sa.String(length=20), nullable=False),
+        sa.Column('bucket', sa.String(length=50), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'dimension', 'bucket'),
+    )
+    if not op.get_context().as_sql:
+        backfill_keys()
+        backfill_stats(contact_stats)
+
+
+def backfill_keys() -> None:
+    contacts = sa.table('contacts', sa.column('id'), sa.column('email'), sa.column('phone'), sa.column('name'),
+                        sa.column('surname'), sa.column('email_normalized'), sa.column('phone_e164'),
+                        sa.column('name_key'))
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(contacts.c.id, contacts.c.email, contacts.c.phone, contacts.c.name,
+                                  contacts.c.surname)).all()
+    keys = [{'contact_id': contact_id, 'email_normalized': normalize_email(email), 'phone_e164': normalize_phone(phone),
+             'name_key': fold_name(name, surname)} for contact_id, email, phone, name, surname in rows]
+    if keys:
+        bind.execute(
+            contacts.update().where(contacts.c.id == sa.bindparam('contact_id'))
+            .values(email_normalized=sa.bindparam('email_normalized'), phone_e164=sa.bindparam('phone_e164'),
+                    name_key=sa.bindparam('name_key')),
+            keys,
+        )
+
+
+def backfill_stats(contact_stats: sa.Table) -> None:
+    contacts = sa.table('contacts', sa.column('user_id'), sa.column('city'), sa.column('bd'))
+    counts = Counter()
+    rows = op.get_bind().execute(
+        sa.select(contacts.c.user_id, contacts.c.city, contacts.c.bd, sa.func.count())
+        .where(contacts.c.user_id.isnot(None))
+        .group_by(contacts.c.user_id, contacts.c.city, contacts.c.bd)
+    )
+    for user_id, city, bd, count in rows:
+        for dimension, bucket in contact_buckets(Contact(city=city, bd=bd)):
+            counts[user_id, dimension, bucket] += count
+    if counts:
+        op.bulk_insert(contact_stats, [{'user_id': user_id, 'dimension': dimension, 'bucket': bucket, 'count': count}
+                                       for (user_id, dimension, bucket), count in counts.items()])
+
+
+def downgrade() -> None:
+    op.drop_table('contact_stats')
+    op.drop_index('ix_email_opens_username', table_name='email_opens')
+    op.drop_table('email_opens')
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.drop_index('ix_contacts_user_name_key')
+        batch_op.drop_index('ix_contacts_user_phone_e164')
+        batch_op.drop_index('ix_contacts_user_email_normalized')
+        batch_op.drop_column('name_key')
+        batch_op.drop_column('phone_e164')
+        batch_op.drop_column('email_normalized')
@@ -0,0 +1,101 @@
+"""hash partition contacts by user_id
+
+Revision ID: cc45623f2230
+Revises: 7f3b9e21c4d8
+Create Date: 2026-10-19 10:20:00.000000
+
+Only on PostgreSQL, and only when CONTACTS_HASH_PARTITIONS is set, otherwise the revision does nothing.
+The setting must have the same value for the migration and for the application.
+The table is rebuilt as `contacts PARTITION BY HASH (user_id)` with the partitions contacts_p0 .. contacts_p{n-1},
+the rows are copied and the indexes are created on the partitioned table, so every partition gets its own,
+smaller indexes. The copy holds an exclusive lock on contacts: run it in a maintenance window.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.conf.config import config
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'cc45623f2230'
+down_revision: Union[str, None] = '7f3b9e21c4d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS = config.contacts_hash_partitions
+
+INDEXES = {
+    'ix_contacts_name': ['name'],
+    'ix_contacts_surname': ['surname'],
+    'ix_contacts_email': ['email'],
+    'ix_contacts_phone': ['phone'],
+    'ix_contacts_user_email_normalized': ['user_id', 'email_normalized'],
+    'ix_contacts_user_phone_e164': ['user_id', 'phone_e164'],
+    'ix_contacts_user_name_key': ['user_id', 'name_key'],
+}
+COLUMNS = ('id, name, surname, email, phone, bd, city, notes, created_at, updated_at, user_id, '
+           'email_normalized, phone_e164, name_key')
+
+
+def enabled() -> bool:
+    return PARTITIONS > 0 and op.get_context().dialect.name == 'postgresql'
+
+
+def create_contacts(name: str, partitioned: bool) -> None:
+    op.create_table(
+        name,
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('contacts_id_seq'::regclass)"),
+                  nullable=False),
+        sa.Column('name', sa.String(length=150), nullable=False),
+        sa.Column('surname', sa.String(length=150), nullable=False),
+        sa.Column('email', sa.String(length=50), nullable=False),
+        sa.Column('phone', sa.String(length=20), nullable=False),
+        sa.Column('bd', sa.String(length=50), nullable=False),
+        sa.Column('city', sa.String(length=50), nullable=False),
+        sa.Column('notes', sa.String(length=300), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=not partitioned),
+        sa.Column('email_normalized', sa.String(length=50), nullable=True),
+        sa.Column('phone_e164', sa.String(length=20), nullable=True),
+        sa.Column('name_key', sa.String(length=300), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint(*(['id', 'user_id'] if partitioned else ['id']), name=f'{name}_pkey'),
+        **({'postgresql_partition_by': 'HASH (user_id)'} if partitioned else {}),
+    )
+
+
+def rebuild(partitioned: bool) -> None:
+    op.execute('LOCK TABLE contacts IN ACCESS EXCLUSIVE MODE')
+    op.execute('ALTER TABLE contacts DROP CONSTRAINT uq_contacts_user_email')
+    for index in INDEXES:
+        op.drop_index(index, table_name='contacts')
+    op.rename_table('contacts', 'contacts_old')
+    op.execute('ALTER TABLE contacts_old RENAME CONSTRAINT contacts_pkey TO contacts_old_pkey')
+
+    create_contacts('contacts', partitioned)
+    if partitioned:
+        for remainder in range(PARTITIONS):
+            op.execute(f'CREATE TABLE contacts_p{remainder} PARTITION OF contacts '
+                       f'FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})')
+    op.execute(f'INSERT INTO contacts ({COLUMNS}) SELECT {COLUMNS} FROM contacts_old')
+    # the id sequence would be dropped with the old table
+    op.execute('ALTER SEQUENCE contacts_id_seq OWNED BY contacts.id')
+    op.drop_table('contacts_old')
+
+    op.create_unique_constraint('uq_contacts_user_email', 'contacts', ['user_id', 'email'])
+    for index, columns in INDEXES.items():
+        op.create_index(index, 'contacts', columns)
+    op.execute('ANALYZE contacts')
+
+
+def upgrade() -> None:
+    if enabled():
+        rebuild(partitioned=True)
+
+
+def downgrade() -> None:
+    if enabled():
+        rebuild(partitioned=False)
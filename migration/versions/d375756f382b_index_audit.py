@@ -0,0 +1,42 @@
+"""match the indexes to the queries
+
+Revision ID: d375756f382b
+Revises: cc45623f2230
+Create Date: 2026-10-19 11:00:00.000000
+
+Found with `python -m tools.explain_queries`. Every contact query filters by user_id: the lists by user_id alone
+ordered by id, the rest by (id, user_id), so (user_id, id) is added. No query filters by the name, surname, email
+or phone of a contact alone, so their single-column indexes only slowed down the writes. users.refresh_token is
+not indexed: it is no longer read, the refresh tokens are checked in the session store.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd375756f382b'
+down_revision: Union[str, None] = 'cc45623f2230'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+UNUSED = {
+    'ix_contacts_name': ['name'],
+    'ix_contacts_surname': ['surname'],
+    'ix_contacts_email': ['email'],
+    'ix_contacts_phone': ['phone'],
+}
+
+
+def upgrade() -> None:
+    op.create_index('ix_contacts_user_id_id', 'contacts', ['user_id', 'id'])
+    for index in UNUSED:
+        op.drop_index(index, table_name='contacts')
+    op.create_index('ix_contact_stats_dimension_bucket', 'contact_stats', ['dimension', 'bucket', 'count'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contact_stats_dimension_bucket', table_name='contact_stats')
+    for index, columns in UNUSED.items():
+        op.create_index(index, 'contacts', columns)
+    op.drop_index('ix_contacts_user_id_id', table_name='contacts')
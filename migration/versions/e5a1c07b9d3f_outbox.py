@@ -0,0 +1,39 @@
+"""transactional outbox
+
+Revision ID: e5a1c07b9d3f
+Revises: d375756f382b
+Create Date: 2026-10-19 12:00:00.000000
+
+The confirmation emails and the contact change events are written to the outbox in the transaction of the change
+and delivered by the relay of src.services.outbox, instead of being sent from the request after the commit.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a1c07b9d3f'
+down_revision: Union[str, None] = 'd375756f382b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('topic', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('available_at', sa.DateTime(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_outbox_available_at_id', 'outbox', ['available_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_outbox_available_at_id', table_name='outbox')
+    op.drop_table('outbox')
@@ -0,0 +1,163 @@
+"""
+Production entry point: a pre-fork server running the application in several uvicorn worker processes.
+
+The application is imported once in the supervisor and the workers are forked from it, so they share its memory
+and start fast. This is safe because importing main opens nothing: the database engine, the Redis clients and
+the integrations are created on first use, in each worker (see tests/test_unit_cold_start.py).
+The connection budgets are split between the workers, so adding workers never exceeds the database
+max_connections. A worker that exits, or is recycled after max_requests, is replaced.
+
+Usage: python serve.py [--workers N] [--host HOST] [--port PORT] [--max-requests N] [--max-requests-jitter N]
+                       [--pin-cpus] [--no-preload]
+The defaults come from the settings (WORKERS, MAX_REQUESTS, PIN_CPUS, DB_CONNECTION_BUDGET, ...).
+"""
+import argparse
+import logging
+import os
+import random
+import signal
+import socket
+import time
+
+from src.conf.config import config
+
+logger = logging.getLogger("serve")
+
+
+def worker_limits(workers: int, db_budget: int, redis_budget: int) -> dict:
+    """
+    The worker_limits function splits the global connection budgets between the workers.
+    The database pool of a worker has no overflow, so the budget is a hard limit.
+
+    :param workers: int: Number of worker processes
+    :param db_budget: int: Database connections for all the workers
+    :param redis_budget: int: Redis connections for all the workers
+    :return: The settings of one worker
+    """
+    return {
+        "db_pool_size": max(db_budget // workers, 1),
+        "db_max_overflow": 0,
+        "redis_max_connections": max(redis_budget // workers, 1),
+    }
+
+
+def available_cpus() -> list[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class Supervisor:
+    def __init__(self, args: argparse.Namespace, sock: socket.socket, app):
+        """
+        Forks the workers, replaces the ones that exit, and stops them all on SIGTERM or SIGINT.
+
+        :param args: argparse.Namespace: The command line options
+        :param sock: socket.socket: The listening socket, shared by the workers
+        :param app: The preloaded application, or None to import it in every worker
+        """
+        self.args = args
+        self.sock = sock
+        self.app = app
+        self.cpus = available_cpus()
+        self.workers: dict[int, tuple[int, float]] = {}
+        self.deadline: float | None = None
+
+    def spawn(self, index: int) -> None:
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = (index, time.monotonic())
+            return
+        exit_code = 0
+        try:
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, signal.SIG_DFL)
+            self.run_worker(index)
+        except BaseException:
+            logger.exception("Worker %d failed", index)
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def run_worker(self, index: int) -> None:
+        import uvicorn
+
+        from src.services.lifecycle import lifecycle
+
+        for name, value in worker_limits(self.args.workers, config.db_connection_budget,
+                                         config.redis_connection_budget).items():
+            setattr(config, name, value)
+        if self.args.pin_cpus and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, {self.cpus[index % len(self.cpus)]})
+        max_requests = None
+        if self.args.max_requests:
+            # the jitter keeps the workers from being recycled all at the same time
+            max_requests = self.args.max_requests + random.randint(0, self.args.max_requests_jitter)
+        # the application may have been imported before uvicorn, see Lifecycle.delay_server_exit
+        lifecycle.delay_server_exit(uvicorn.Server, config.shutdown_delay)
+        server = uvicorn.Server(uvicorn.Config(self.app or "main:app", lifespan="on", log_level="info",
+                                               limit_max_requests=max_requests,
+                                               timeout_graceful_shutdown=config.shutdown_timeout))
+        server.run(sockets=[self.sock])
+
+    def stop(self, signum, frame) -> None:
+        if self.deadline is not None:
+            return
+        logger.info("Stopping %d workers", len(self.workers))
+        self.deadline = time.monotonic() + config.shutdown_delay + config.shutdown_timeout + 5
+        for pid in self.workers:
+            os.kill(pid, signal.SIGTERM)
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for index in range(self.args.workers):
+            self.spawn(index)
+        logger.info("Started %d workers on %s:%d", self.args.workers, self.args.host, self.args.port)
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                if self.deadline is not None and time.monotonic() > self.deadline:
+                    for pid in self.workers:
+                        os.kill(pid, signal.SIGKILL)
+                time.sleep(0.1)
+                continue
+            index, started = self.workers.pop(pid, (None, 0.0))
+            if index is None or self.deadline is not None:
+                continue
+            logger.info("Worker %d (pid %d) exited with status %d, restarting", index, pid,
+                        os.waitstatus_to_exitcode(status))
+            if time.monotonic() - started < 1:
+                # a worker that fails at startup is not restarted in a tight loop
+                time.sleep(1)
+            self.spawn(index)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=config.workers)
+    parser.add_argument("--max-requests", type=int, default=config.max_requests)
+    parser.add_argument("--max-requests-jitter", type=int, default=config.max_requests_jitter)
+    parser.add_argument("--pin-cpus", action="store_true", default=config.pin_cpus)
+    parser.add_argument("--no-preload", dest="preload", action="store_false")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    args = parse_args(argv)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    app = None
+    if args.preload:
+        from main import app
+    Supervisor(args, sock, app).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import contextlib
+import logging
 from typing import AsyncIterator
 
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
@@ -6,6 +7,8 @@ from sqlalchemy.orm import DeclarativeBase
 
 from src.conf.config import config
 
+logger = logging.getLogger(__name__)
+
 
 class Base(DeclarativeBase):
     pass
@@ -13,11 +16,41 @@ class Base(DeclarativeBase):
 
 class DatabaseSessionManager:
     def __init__(self, url: str):
-        self._engine: AsyncEngine | None = create_async_engine(url)
-        self._session_maker: async_sessionmaker | None = async_sessionmaker(autocommit=False,
-                                                                            autoflush=False,
-                                                                            expire_on_commit=False,
-                                                                            bind=self._engine)
+        """
+        The engine and its pool are created on first use, so importing the application opens nothing
+        and does not load the database driver.
+
+        :param url: str: The database url
+        """
+        self.url = url
+        self._engine: AsyncEngine | None = None
+        self._session_maker: async_sessionmaker | None = None
+
+    @property
+    def engine(self) -> AsyncEngine:
+        if self._engine is None:
+            options = {}
+            if not self.url.startswith("sqlite"):
+                options = {"pool_size": config.db_pool_size, "max_overflow": config.db_max_overflow}
+            self._engine = create_async_engine(self.url, **options)
+            self._session_maker = async_sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False,
+                                                     bind=self._engine)
+        return self._engine
+
+    @property
+    def session_maker(self) -> async_sessionmaker:
+        if self._session_maker is None:
+            self.engine
+        return self._session_maker
+
+    async def close(self) -> None:
+        """
+        The close function closes the pooled connections. The manager stays usable, new connections are opened on demand.
+
+        :return: None
+        """
+        if self._engine is not None:
+            await self._engine.dispose()
 
     @contextlib.asynccontextmanager
     async def session(self) -> AsyncIterator[AsyncSession]:
@@ -31,12 +64,12 @@ class DatabaseSessionManager:
         :doc-author: Trelent
         """
         if self._session_maker is None:
-            raise Exception("DatabaseSessionManager is not initialized")
+            self.engine
         session = self._session_maker()
         try:
             yield session
         except Exception as err:
-            print(err)
+            logger.error("Database session failed: %s", err)
             await session.rollback()
         finally:
             await session.close()
@@ -56,4 +89,15 @@ async def get_db():
     :doc-author: Trelent
     """
     async with sessionmanager.session() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+def get_session_maker() -> async_sessionmaker:
+    """
+    The get_session_maker function is the dependency of the requests that spread their queries
+    over several pooled connections: each of the concurrent queries runs in a session of its own.
+
+    :return: The factory of the sessions
+    :doc-author: Trelent
+    """
+    return sessionmanager.session_maker
\ No newline at end of file
@@ -1,28 +1,61 @@
 import enum
 
-from datetime import date
+from datetime import date, datetime
 
-from sqlalchemy import Integer, String, ForeignKey, DATE, DateTime, Enum, func, Boolean
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import Integer, String, ForeignKey, DATE, DateTime, Enum, func, Boolean, Index, UniqueConstraint, \
+    DDL, event, JSON
+from sqlalchemy.orm import Mapped, mapped_column, relationship, declared_attr
 
+from src.conf.config import config
 from src.database.db import Base
 
+# On PostgreSQL the contacts table can be hash partitioned by user_id, see migration/versions.
+# A partitioned table needs the partition key in its primary key and in every unique constraint.
+CONTACTS_PARTITIONS = config.contacts_hash_partitions
+
 
 class Contact(Base):
     __tablename__ = "contacts"
-    id: Mapped[int] = mapped_column(primary_key=True)
-    name: Mapped[str] = mapped_column(String(150), index=True)
-    surname: Mapped[str] = mapped_column(String(150), index=True)
-    email: Mapped[str] = mapped_column(String(50), unique=True, index=True)
-    phone: Mapped[str] = mapped_column(String(20), index=True)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(150))
+    surname: Mapped[str] = mapped_column(String(150))
+    email: Mapped[str] = mapped_column(String(50))
+    phone: Mapped[str] = mapped_column(String(20))
     bd: Mapped[str] = mapped_column(String(50))
     city: Mapped[str] = mapped_column(String(50))
     notes: Mapped[str] = mapped_column(String(300))
     created_at: Mapped[date] = mapped_column('created_at', DateTime, default=func.now(), nullable=True)
     updated_at: Mapped[date] = mapped_column('updated_at', DateTime, default=func.now(), onupdate=func.now(),
                                              nullable=True)
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=not CONTACTS_PARTITIONS,
+                                         primary_key=bool(CONTACTS_PARTITIONS))
     user: Mapped["User"] = relationship('User', backref="todos", lazy='joined')
+    # normalized copies used to find duplicates, see src.services.dedupe
+    email_normalized: Mapped[str] = mapped_column(String(50), nullable=True)
+    phone_e164: Mapped[str] = mapped_column(String(20), nullable=True)
+    name_key: Mapped[str] = mapped_column(String(300), nullable=True)
+
+    __table_args__ = (
+        # every query filters by user_id: the lists by user_id alone, ordered by id, the rest by (id, user_id)
+        Index("ix_contacts_user_id_id", "user_id", "id"),
+        UniqueConstraint("user_id", "email", name="uq_contacts_user_email"),
+        Index("ix_contacts_user_email_normalized", "user_id", "email_normalized"),
+        Index("ix_contacts_user_phone_e164", "user_id", "phone_e164"),
+        Index("ix_contacts_user_name_key", "user_id", "name_key"),
+        {"postgresql_partition_by": "HASH (user_id)"} if CONTACTS_PARTITIONS else {},
+    )
+
+    @declared_attr.directive
+    def __mapper_args__(cls):
+        # the ORM identity stays the id alone, also when user_id is part of the primary key of the table
+        return {"primary_key": [cls.__table__.c.id]}
+
+
+for remainder in range(CONTACTS_PARTITIONS):
+    event.listen(Contact.__table__, "after_create", DDL(
+        f"CREATE TABLE contacts_p{remainder} PARTITION OF contacts "
+        f"FOR VALUES WITH (MODULUS {CONTACTS_PARTITIONS}, REMAINDER {remainder})"
+    ).execute_if(dialect="postgresql"))
 
 
 class Role(enum.Enum):
@@ -40,6 +73,53 @@ class User(Base):
     created_at: Mapped[date] = mapped_column('created_at', DateTime, default=func.now())
     updated_at: Mapped[date] = mapped_column('updated_at', DateTime, default=func.now(), onupdate=func.now())
     avatar: Mapped[str] = mapped_column(String(255), nullable=True)
+    # no longer written: refresh tokens are tracked in the session store
     refresh_token: Mapped[str] = mapped_column(String(255), nullable=True)
     role: Mapped[Enum] = mapped_column('role', Enum(Role), default=Role.user)
-    confirmed: Mapped[bool] = mapped_column(Boolean, default=False)
\ No newline at end of file
+    confirmed: Mapped[bool] = mapped_column(Boolean, default=False)
+
+
+class EmailOpen(Base):
+    __tablename__ = "email_opens"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    username: Mapped[str] = mapped_column(String(50), index=True)
+    opened_at: Mapped[date] = mapped_column('opened_at', DateTime, nullable=False)
+
+
+class ContactStat(Base):
+    """
+    Per-user contact counters, maintained in the same transaction as the contact writes.
+    dimension is "total", "city" or "birth_month", bucket is the value counted ("" for the total).
+    The contacts that existed before the table are counted by its migration, 7f3b9e21c4d8;
+    POST /api/contacts/stats/reconcile recounts the counters of a user.
+    """
+    __tablename__ = "contact_stats"
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    dimension: Mapped[str] = mapped_column(String(20), primary_key=True)
+    bucket: Mapped[str] = mapped_column(String(50), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # the totals of all users, for the admin list
+        Index("ix_contact_stats_dimension_bucket", "dimension", "bucket", "count"),
+    )
+
+
+class OutboxMessage(Base):
+    """
+    Messages to deliver after a commit, written in the same transaction as the change they announce,
+    so they exist if and only if the change does. The relay in src.services.outbox delivers them and deletes them.
+    A failed delivery is retried at available_at; after outbox_max_attempts the message stays for inspection.
+    """
+    __tablename__ = "outbox"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    topic: Mapped[str] = mapped_column(String(50), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    available_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # the relay reads the messages that are due, oldest first
+        Index("ix_outbox_available_at_id", "available_at", "id"),
+    )
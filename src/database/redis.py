@@ -0,0 +1,36 @@
+import redis.asyncio as redis
+
+from src.conf.config import config
+
+_client: redis.Redis | None = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    The get_redis function returns the shared asynchronous Redis client, creating it on the first call.
+    The client keeps its own connection pool, so it is safe to use from concurrent requests.
+    With redis_max_connections set, requests wait up to redis_timeout for a free connection instead of failing.
+
+    :return: The Redis client
+    """
+    global _client
+    if _client is None:
+        options = dict(host=config.redis_host, port=config.redis_port, db=0,
+                       socket_connect_timeout=config.redis_timeout, socket_timeout=config.redis_timeout)
+        if config.redis_max_connections:
+            options = {"connection_pool": redis.BlockingConnectionPool(
+                max_connections=config.redis_max_connections, timeout=config.redis_timeout, **options)}
+        _client = redis.Redis(**options)
+    return _client
+
+
+async def close_redis() -> None:
+    """
+    The close_redis function closes the shared client and its connections. A later get_redis call creates a new one.
+
+    :return: None
+    """
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.close(close_connection_pool=True)
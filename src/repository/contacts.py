@@ -1,8 +1,22 @@
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import contextlib
+import itertools
+from collections import Counter, deque
+from typing import AsyncIterator
+
+from sqlalchemy import Select, func, literal, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from src.database.models import Contact, User
-from src.schemas import ContactsSchema, ContactsUpdateSchema
+from src.repository.outbox import add_message
+from src.repository.stats import apply_deltas, contact_buckets
+from src.schemas import ContactsFilter, ContactsSchema, ContactsUpdateSchema
+from src.services.dedupe import ClusterStream, normalize_contact
+
+
+def add_contact_change(db: AsyncSession, contact_id: int, user_id: int, action: str) -> None:
+    # delivered after the commit as a ContactChanged event, see src.services.subscribers
+    add_message(db, "contact.changed", {"contact_id": contact_id, "user_id": user_id, "action": action})
 
 
 async def get_contacts(limit: int, offset: int, db: AsyncSession, user: User):
@@ -20,14 +34,43 @@ async def get_contacts(limit: int, offset: int, db: AsyncSession, user: User):
         :return: A list of contacts.
         :rtype: List[Contacts]
     """
-    sq = select(Contact).filter_by(user=user).offset(offset).limit(limit)
+    sq = select(Contact).filter_by(user_id=user.id).order_by(Contact.id).offset(offset).limit(limit)
     contacts = await db.execute(sq)
     return contacts.scalars().all()
 
 
-async def get_all_contacts(limit: int, offset: int, db: AsyncSession):
+def filter_contacts(sq: Select, filters: ContactsFilter | None, after_id: int | None = None) -> Select:
     """
-        Retrieves a list of notes for a specific user with specified pagination parameters.
+        Adds the conditions of the admin view to a query of contacts: the owner, the city, the creation date range
+        and, for keyset paging, the id after which to start.
+
+        :param sq: The query of contacts.
+        :type sq: Select
+        :param filters: The conditions, or None for all the contacts.
+        :type filters: ContactsFilter | None
+        :param after_id: Return only the contacts with a greater id.
+        :type after_id: int | None
+        :return: The query with the conditions.
+        :rtype: Select
+    """
+    if filters is not None:
+        if filters.user_id is not None:
+            sq = sq.where(Contact.user_id == filters.user_id)
+        if filters.city is not None:
+            sq = sq.where(Contact.city == filters.city)
+        if filters.created_from is not None:
+            sq = sq.where(Contact.created_at >= filters.created_from)
+        if filters.created_to is not None:
+            sq = sq.where(Contact.created_at < filters.created_to)
+    if after_id is not None:
+        sq = sq.where(Contact.id > after_id)
+    return sq
+
+
+async def get_all_contacts(limit: int, offset: int, db: AsyncSession, filters: ContactsFilter | None = None,
+                           after_id: int | None = None):
+    """
+        Retrieves a page of the contacts of all the users, ordered by id.
 
         :param offset: The number of contacts to skip.
         :type offset: int
@@ -35,14 +78,129 @@ async def get_all_contacts(limit: int, offset: int, db: AsyncSession):
         :type limit: int
         :param db: The database session.
         :type db: AsyncSession
+        :param filters: The conditions the contacts must match.
+        :type filters: ContactsFilter | None
+        :param after_id: The last id of the previous page, for keyset paging.
+        :type after_id: int | None
+        :return: A list of contacts.
+        :rtype: List[Contacts]
+    """
+    sq = filter_contacts(select(Contact), filters, after_id).order_by(Contact.id).offset(offset).limit(limit)
+    contacts = await db.execute(sq)
+    return contacts.scalars().all()
+
+
+async def count_all_contacts(db: AsyncSession, filters: ContactsFilter) -> int:
+    """
+        Counts the contacts of all the users that match the filters of the admin view, with one COUNT query.
+        Without filters the maintained counters are cheaper, see repository.stats.count_all_contacts.
+
+        :param db: The database session.
+        :type db: AsyncSession
+        :param filters: The conditions the contacts must match.
+        :type filters: ContactsFilter
+        :return: The number of matching contacts.
+        :rtype: int
+    """
+    result = await db.execute(filter_contacts(select(func.count()).select_from(Contact), filters))
+    return result.scalar_one()
+
+
+async def stream_all_contacts(db: AsyncSession, filters: ContactsFilter | None = None, after_id: int | None = None,
+                              batch_size: int = 1000) -> AsyncIterator[Contact]:
+    """
+        Streams the contacts of all the users in id order, reading them from the database in batches.
+
+        :param db: The database session.
+        :type db: AsyncSession
+        :param filters: The conditions the contacts must match.
+        :type filters: ContactsFilter | None
+        :param after_id: Start after this id.
+        :type after_id: int | None
+        :param batch_size: The number of contacts fetched at a time.
+        :type batch_size: int
+        :return: The contacts.
+        :rtype: AsyncIterator[Contact]
+    """
+    sq = filter_contacts(select(Contact), filters, after_id).order_by(Contact.id)
+    result = await db.stream_scalars(sq.execution_options(yield_per=batch_size))
+    async for contact in result:
+        yield contact
+
+
+async def get_contacts_range(first_id: int, last_id: int, db: AsyncSession, filters: ContactsFilter | None = None):
+    """
+        Retrieves the contacts whose id is between first_id and last_id, both included, ordered by id.
+
+        :param first_id: The first id of the range.
+        :type first_id: int
+        :param last_id: The last id of the range.
+        :type last_id: int
+        :param db: The database session.
+        :type db: AsyncSession
+        :param filters: The conditions the contacts must match.
+        :type filters: ContactsFilter | None
         :return: A list of contacts.
         :rtype: List[Contacts]
     """
-    sq = select(Contact).offset(offset).limit(limit)
+    sq = filter_contacts(select(Contact), filters).where(Contact.id.between(first_id, last_id)).order_by(Contact.id)
     contacts = await db.execute(sq)
     return contacts.scalars().all()
 
 
+async def fan_out_contacts(session_maker: async_sessionmaker, filters: ContactsFilter | None = None,
+                           after_id: int | None = None, parallel: int = 4, chunk_size: int = 5000,
+                           connections: asyncio.Semaphore | None = None) -> AsyncIterator[Contact]:
+    """
+        Streams the contacts of all the users in id order, splitting the scan into id ranges of chunk_size ids
+        that are fetched concurrently, each in its own session and so on its own pooled connection.
+        At most parallel ranges are in flight; they are yielded in order, so memory stays bounded
+        by parallel * chunk_size contacts. A range only opens its session once it holds a permit of connections,
+        so the concurrent exports can share a bounded number of pooled connections. When the consumer stops early,
+        the ranges in flight are cancelled and their sessions closed before the iterator returns.
+
+        :param session_maker: The factory of the sessions.
+        :type session_maker: async_sessionmaker
+        :param filters: The conditions the contacts must match.
+        :type filters: ContactsFilter | None
+        :param after_id: Start after this id.
+        :type after_id: int | None
+        :param parallel: The number of ranges fetched at the same time.
+        :type parallel: int
+        :param chunk_size: The number of ids in a range.
+        :type chunk_size: int
+        :param connections: The permits for the range reads, shared by the callers, unlimited by default.
+        :type connections: asyncio.Semaphore | None
+        :return: The contacts.
+        :rtype: AsyncIterator[Contact]
+    """
+    async with session_maker() as db:
+        result = await db.execute(filter_contacts(select(func.min(Contact.id), func.max(Contact.id)), filters,
+                                                  after_id))
+    first_id, last_id = result.one()
+    if first_id is None:
+        return
+    ranges = ((start, min(start + chunk_size - 1, last_id)) for start in range(first_id, last_id + 1, chunk_size))
+
+    async def fetch(first: int, last: int):
+        async with connections or contextlib.nullcontext(), session_maker() as session:
+            return await get_contacts_range(first, last, session, filters)
+
+    pending = deque(asyncio.create_task(fetch(*bounds)) for bounds in itertools.islice(ranges, parallel))
+    try:
+        while pending:
+            contacts = await pending.popleft()
+            bounds = next(ranges, None)
+            if bounds is not None:
+                pending.append(asyncio.create_task(fetch(*bounds)))
+            for contact in contacts:
+                yield contact
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
 async def get_contact(contacts_id: int, db: AsyncSession, user: User):
     """
         Retrieves a single note with the specified ID for a specific user.
@@ -74,8 +232,12 @@ async def create_contact(body: ContactsSchema, db: AsyncSession, user: User):
         :return: The newly created contact.
         :rtype: Contact
     """
-    contact = Contact(name=body.name, surname=body.surname, email=body.email, phone=body.phone, bd=body.bd, city=body.city, notes=body.notes, user=user)
+    contact = Contact(name=body.name, surname=body.surname, email=body.email, phone=body.phone, bd=body.bd, city=body.city, notes=body.notes, user_id=user.id)
+    normalize_contact(contact)
     db.add(contact)
+    await apply_deltas(db, user.id, Counter(contact_buckets(contact)))
+    await db.flush()
+    add_contact_change(db, contact.id, user.id, "created")
     await db.commit()
     await db.refresh(contact)
     return contact
@@ -100,6 +262,8 @@ async def update_contact(contact_id: int, body: ContactsUpdateSchema, db: AsyncS
     result = await db.execute(sq)
     contact = result.scalar_one_or_none()
     if contact:
+        deltas = Counter()
+        deltas.subtract(contact_buckets(contact))
         contact.name = body.name
         contact.surname = body.surname
         contact.email = body.email
@@ -107,6 +271,10 @@ async def update_contact(contact_id: int, body: ContactsUpdateSchema, db: AsyncS
         contact.bd = body.bd
         contact.city = body.city
         contact.notes = body.notes
+        normalize_contact(contact)
+        deltas.update(contact_buckets(contact))
+        await apply_deltas(db, user.id, deltas)
+        add_contact_change(db, contact.id, user.id, "updated")
         await db.commit()
         await db.refresh(contact)
     return contact
@@ -130,5 +298,88 @@ async def remove_contact(contact_id: int, db: AsyncSession, user: User):
     contact = result.scalar_one_or_none()
     if contact:
         await db.delete(contact)
+        deltas = Counter()
+        deltas.subtract(contact_buckets(contact))
+        await apply_deltas(db, user.id, deltas)
+        add_contact_change(db, contact_id, user.id, "deleted")
         await db.commit()
-    return contact
\ No newline at end of file
+    return contact
+
+
+async def find_duplicates(db: AsyncSession, user: User) -> AsyncIterator[list[int]]:
+    """
+        Finds groups of contacts of a user that are probably the same person: they share the normalized email,
+        the phone number, or the name and the birthday (the person_key of src.services.dedupe). The keys are read
+        in one query sorted by key, and each group is yielded as soon as the key changes, so only the ids of one key
+        are held in memory. A contact sharing its email with one contact and its phone with another is in both
+        groups.
+
+        :param db: The database session.
+        :type db: AsyncSession
+        :param user: The user to find duplicates for.
+        :type user: User
+        :return: The groups of contact ids.
+        :rtype: AsyncIterator[list[int]]
+    """
+    bd = func.trim(Contact.bd)
+    sq = union_all(
+        select(literal(0).label("kind"), Contact.email_normalized.label("key"), Contact.id)
+        .filter(Contact.user_id == user.id, Contact.email_normalized.isnot(None)),
+        select(literal(1), Contact.phone_e164, Contact.id)
+        .filter(Contact.user_id == user.id, Contact.phone_e164.isnot(None)),
+        select(literal(2), Contact.name_key + "|" + bd, Contact.id)
+        .filter(Contact.user_id == user.id, Contact.name_key.isnot(None), bd != ""),
+    ).order_by("kind", "key")
+    result = await db.stream(sq.execution_options(yield_per=10000))
+    clusters = ClusterStream()
+    async for kind, key, contact_id in result:
+        cluster = clusters.add((kind, key), contact_id)
+        if cluster:
+            yield cluster
+    cluster = clusters.close()
+    if cluster:
+        yield cluster
+
+
+async def merge_contacts(primary_id: int, duplicate_ids: list[int], db: AsyncSession, user: User):
+    """
+        Merges duplicates into the primary contact of a user. Empty fields of the primary contact are taken
+        from the duplicates, their notes are appended, and the duplicates are removed.
+
+        :param primary_id: The ID of the contact to keep.
+        :type primary_id: int
+        :param duplicate_ids: The IDs of the contacts to merge into it.
+        :type duplicate_ids: list[int]
+        :param db: The database session.
+        :type db: AsyncSession
+        :param user: The user the contacts belong to.
+        :type user: User
+        :return: The merged contact, or None if any of the contacts does not exist.
+        :rtype: Contact | None
+    """
+    ids = {primary_id, *duplicate_ids}
+    sq = select(Contact).filter(Contact.id.in_(ids), Contact.user_id == user.id)
+    result = await db.execute(sq)
+    contacts = {contact.id: contact for contact in result.scalars().all()}
+    if len(contacts) != len(ids):
+        return None
+    primary = contacts.pop(primary_id)
+    deltas = Counter()
+    for contact in [primary, *contacts.values()]:
+        deltas.subtract(contact_buckets(contact))
+    for duplicate in contacts.values():
+        for field in ("phone", "bd", "city"):
+            if not getattr(primary, field):
+                setattr(primary, field, getattr(duplicate, field))
+        if duplicate.notes and duplicate.notes not in (primary.notes or ""):
+            primary.notes = "; ".join(filter(None, [primary.notes, duplicate.notes]))[:300]
+        await db.delete(duplicate)
+    normalize_contact(primary)
+    deltas.update(contact_buckets(primary))
+    await apply_deltas(db, user.id, deltas)
+    add_contact_change(db, primary_id, user.id, "merged")
+    for duplicate_id in contacts:
+        add_contact_change(db, duplicate_id, user.id, "deleted")
+    await db.commit()
+    await db.refresh(primary)
+    return primary
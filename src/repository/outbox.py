@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import OutboxMessage
+
+
+def add_message(db: AsyncSession, topic: str, payload: dict) -> OutboxMessage:
+    """
+        Adds a message to the outbox of the current transaction. Nothing is written before the caller commits,
+        so the message is stored if and only if the change it announces is. The relay is woken up after the commit.
+
+        :param db: The database session of the change.
+        :type db: AsyncSession
+        :param topic: The topic of the message, it selects the handler of the relay.
+        :type topic: str
+        :param payload: The JSON serializable content of the message.
+        :type payload: dict
+        :return: The pending message.
+        :rtype: OutboxMessage
+    """
+    message = OutboxMessage(topic=topic, payload=payload)
+    db.add(message)
+    db.info["outbox"] = True
+    return message
+
+
+async def claim_messages(limit: int, max_attempts: int, lease: float, db: AsyncSession) -> list[OutboxMessage]:
+    """
+        Leases the oldest due messages: they are locked, made due again only after the lease, and the caller commits.
+        Rows locked by another relay are skipped, and the committed lease hides the messages from the other relays
+        while they are delivered outside of any transaction. A relay that dies during the delivery leaves its
+        messages to be claimed again once the lease expires.
+
+        :param limit: The maximum number of messages to claim.
+        :type limit: int
+        :param max_attempts: Messages that failed this many times are left alone.
+        :type max_attempts: int
+        :param lease: The number of seconds the messages are reserved for the caller.
+        :type lease: float
+        :param db: The database session.
+        :type db: AsyncSession
+        :return: The claimed messages, oldest first.
+        :rtype: list[OutboxMessage]
+    """
+    now = datetime.utcnow()
+    sq = (select(OutboxMessage)
+          .filter(OutboxMessage.available_at <= now, OutboxMessage.attempts < max_attempts)
+          .order_by(OutboxMessage.id)
+          .limit(limit)
+          .with_for_update(skip_locked=True))
+    result = await db.execute(sq)
+    messages = list(result.scalars().all())
+    if messages:
+        await db.execute(update(OutboxMessage)
+                         .filter(OutboxMessage.id.in_([message.id for message in messages]))
+                         .values(available_at=now + timedelta(seconds=lease))
+                         .execution_options(synchronize_session=False))
+    return messages
+
+
+async def delete_messages(ids: list[int], db: AsyncSession) -> None:
+    """
+        Deletes the delivered messages, with one statement.
+
+        :param ids: The IDs of the messages.
+        :type ids: list[int]
+        :param db: The database session.
+        :type db: AsyncSession
+    """
+    if ids:
+        await db.execute(delete(OutboxMessage).filter(OutboxMessage.id.in_(ids)))
+
+
+async def postpone_message(message_id: int, delay: float, db: AsyncSession) -> None:
+    """
+        Counts a failed delivery and makes the message due again after the delay. The message is updated by id,
+        so nothing happens when it was delivered by another relay after the lease expired.
+
+        :param message_id: The ID of the message that could not be delivered.
+        :type message_id: int
+        :param delay: The number of seconds before the next attempt.
+        :type delay: float
+        :param db: The database session.
+        :type db: AsyncSession
+    """
+    await db.execute(update(OutboxMessage)
+                     .filter(OutboxMessage.id == message_id)
+                     .values(attempts=OutboxMessage.attempts + 1,
+                             available_at=datetime.utcnow() + timedelta(seconds=delay))
+                     .execution_options(synchronize_session=False))
@@ -0,0 +1,181 @@
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import Contact, ContactStat
+
+BIRTHDAY_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%Y")
+
+
+def birth_month(bd: str | None) -> str:
+    """
+        Gets the month of birth from the free form birthday of a contact.
+
+        :param bd: The birthday.
+        :type bd: str | None
+        :return: The month as "01".."12", or "" if the birthday can not be parsed.
+        :rtype: str
+    """
+    for fmt in BIRTHDAY_FORMATS:
+        try:
+            return f"{datetime.strptime((bd or '').strip(), fmt).month:02}"
+        except ValueError:
+            continue
+    return ""
+
+
+def contact_buckets(contact: Contact) -> list[tuple[str, str]]:
+    """
+        Gets the counters a contact is counted in.
+
+        :param contact: The contact.
+        :type contact: Contact
+        :return: The (dimension, bucket) pairs.
+        :rtype: list[tuple[str, str]]
+    """
+    return [("total", ""), ("city", (contact.city or "").strip()[:50]), ("birth_month", birth_month(contact.bd))]
+
+
+def _dialect_insert(db: AsyncSession):
+    name = db.get_bind().dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+
+async def apply_deltas(db: AsyncSession, user_id: int, deltas: Counter) -> None:
+    """
+        Adds the deltas to the counters of a user. Does not commit: it is called by the contact writes
+        before their commit, so the counters change in the same transaction as the contacts.
+        On PostgreSQL and SQLite all counters are updated with a single INSERT ... ON CONFLICT statement.
+
+        :param db: The database session.
+        :type db: AsyncSession
+        :param user_id: The owner of the contacts.
+        :type user_id: int
+        :param deltas: The change of every (dimension, bucket) counter.
+        :type deltas: Counter
+    """
+    rows = [{"user_id": user_id, "dimension": dimension, "bucket": bucket, "count": delta}
+            for (dimension, bucket), delta in deltas.items() if delta]
+    if not rows:
+        return
+    insert = _dialect_insert(db)
+    if insert is not None:
+        stmt = insert(ContactStat).values(rows)
+        stmt = stmt.on_conflict_do_update(index_elements=["user_id", "dimension", "bucket"],
+                                          set_={"count": ContactStat.count + stmt.excluded.count})
+        await db.execute(stmt)
+        return
+    for row in rows:
+        stat = await db.get(ContactStat, (user_id, row["dimension"], row["bucket"]), with_for_update=True)
+        if stat is None:
+            db.add(ContactStat(**row))
+        else:
+            stat.count += row["count"]
+
+
+async def get_stats(db: AsyncSession, user_id: int) -> dict:
+    """
+        Gets the contact counters of a user. Reads one row per group, whatever the number of contacts.
+
+        :param db: The database session.
+        :type db: AsyncSession
+        :param user_id: The owner of the contacts.
+        :type user_id: int
+        :return: The total and the counts by city and by month of birth.
+        :rtype: dict
+    """
+    result = await db.execute(select(ContactStat).filter(ContactStat.user_id == user_id, ContactStat.count > 0))
+    stats = {"total": 0, "by_city": {}, "by_birth_month": {}}
+    for stat in result.scalars().all():
+        if stat.dimension == "total":
+            stats["total"] = stat.count
+        else:
+            stats[f"by_{stat.dimension}"][stat.bucket] = stat.count
+    return stats
+
+
+async def count_contacts(db: AsyncSession, user_id: int) -> int:
+    """
+        Gets the exact number of contacts of a user from the maintained "total" counter.
+
+        :param db: The database session.
+        :type db: AsyncSession
+        :param user_id: The owner of the contacts.
+        :type user_id: int
+        :return: The number of contacts.
+        :rtype: int
+    """
+    result = await db.execute(select(ContactStat.count).filter_by(user_id=user_id, dimension="total", bucket=""))
+    return result.scalar_one_or_none() or 0
+
+
+async def count_all_contacts(db: AsyncSession, estimated: bool = False) -> tuple[int, bool]:
+    """
+        Gets the number of contacts of all users. The exact count sums the "total" counters, one row per user.
+        The estimate is read from the planner statistics of PostgreSQL in O(1) and may lag behind by the changes
+        since the last ANALYZE; on other databases, or before the table was ever analyzed, the exact count is used.
+
+        :param db: The database session.
+        :type db: AsyncSession
+        :param estimated: Whether an estimate is good enough.
+        :type estimated: bool
+        :return: The number of contacts and whether it is an estimate.
+        :rtype: tuple[int, bool]
+    """
+    if estimated and db.get_bind().dialect.name == "postgresql":
+        # a partitioned table has no statistics of its own, its partitions are summed
+        result = await db.execute(text(
+            "SELECT sum(reltuples)::bigint FROM pg_class WHERE relkind = 'r' AND reltuples >= 0 "
+            "AND (oid = 'contacts'::regclass "
+            "OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = 'contacts'::regclass))"
+        ))
+        estimate = result.scalar_one_or_none()
+        if estimate is not None:
+            return estimate, True
+    result = await db.execute(select(func.coalesce(func.sum(ContactStat.count), 0))
+                              .filter_by(dimension="total", bucket=""))
+    return result.scalar_one(), False
+
+
+async def reconcile_stats(db: AsyncSession, user_id: int) -> int:
+    """
+        Recounts the counters of a user from the contacts table and repairs the ones that drifted.
+
+        :param db: The database session.
+        :type db: AsyncSession
+        :param user_id: The owner of the contacts.
+        :type user_id: int
+        :return: The number of repaired counters.
+        :rtype: int
+    """
+    actual = Counter()
+    result = await db.execute(select(Contact.city, Contact.bd, func.count())
+                              .filter(Contact.user_id == user_id).group_by(Contact.city, Contact.bd))
+    for city, bd, count in result.all():
+        for bucket in contact_buckets(Contact(city=city, bd=bd)):
+            actual[bucket] += count
+    result = await db.execute(select(ContactStat).filter(ContactStat.user_id == user_id).with_for_update())
+    stored = {(stat.dimension, stat.bucket): stat for stat in result.scalars().all()}
+    repaired = 0
+    for key, stat in stored.items():
+        if key not in actual:
+            # counters that dropped to zero are left behind by the writes, they are not drift
+            await db.delete(stat)
+            repaired += stat.count != 0
+        elif stat.count != actual[key]:
+            stat.count = actual[key]
+            repaired += 1
+    for (dimension, bucket), count in actual.items():
+        if (dimension, bucket) not in stored:
+            db.add(ContactStat(user_id=user_id, dimension=dimension, bucket=bucket, count=count))
+            repaired += 1
+    await db.commit()
+    return repaired
@@ -1,11 +1,14 @@
 import logging
 
-from libgravatar import Gravatar
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User
+from src.repository.outbox import add_message
 from src.schemas import UserSchema
+from src.services.events import UserUpdated, bus
+
+logger = logging.getLogger(__name__)
 
 
 async def get_user_by_email(email: str, db: AsyncSession) -> User:
@@ -22,51 +25,36 @@ async def get_user_by_email(email: str, db: AsyncSession) -> User:
     sq = select(User).filter_by(email=email)
     result = await db.execute(sq)
     user = result.scalar_one_or_none()
-    logging.info(user)
+    logger.debug("Get user by email: %s", user)
     return user
 
 
-async def create_user(body: UserSchema, db: AsyncSession) -> User:
+async def create_user(body: UserSchema, db: AsyncSession, host: str | None = None) -> User:
     """
-    Creates a new user.
+    Creates a new user. The avatar is left empty: the Gravatar url is resolved lazily when the user is
+    serialized, so no request to Gravatar is made here.
+    The user is flushed to get its id, then a user.created message is written to the outbox and both INSERTs
+    are committed together; the handler of the message sends the confirmation email.
+    Raises IntegrityError if the email is already registered.
 
     :param body: The data for the user to create.
     :type body: UserSchema
     :param db: The database session.
     :type db: AsyncSession
+    :param host: The base url of the confirmation link, or None to send no email.
+    :type host: str | None
     :return: The newly created user.
     :rtype: User
     """
-    avatar = None
-    try:
-        g = Gravatar(body.email)
-        avatar = g.get_image()
-    except Exception as e:
-        logging.error(e)
-    new_user = User(**body.model_dump(), avatar=avatar)  # User(username=username, email=email, password=password)
+    new_user = User(**body.model_dump())  # User(username=username, email=email, password=password)
     db.add(new_user)
+    await db.flush()
+    add_message(db, "user.created", {"user_id": new_user.id, "email": new_user.email,
+                                     "username": new_user.username, "host": host})
     await db.commit()
-    await db.refresh(new_user)
     return new_user
 
 
-async def update_token(user: User, token: str | None, db: AsyncSession) -> None:
-    """
-        Update token for user who is login.
-
-        :param user: The data for the user.
-        :type user: User
-        :param token: The token for user.
-        :type token: str|None
-        :param db: The database session.
-        :type db: AsyncSession
-        :return: The newly created user.
-        :rtype: User
-    """
-    user.refresh_token = token
-    await db.commit()
-
-
 async def confirmed_email(email: str, db: AsyncSession) -> None:
     """
     Confirmed email for registration user.
@@ -79,6 +67,7 @@ async def confirmed_email(email: str, db: AsyncSession) -> None:
     user = await get_user_by_email(email, db)
     user.confirmed = True
     await db.commit()
+    await bus.publish(UserUpdated(user.id, user.email))
 
 
 async def update_avatar(email, url: str, db: AsyncSession) -> User:
@@ -95,4 +84,5 @@ async def update_avatar(email, url: str, db: AsyncSession) -> User:
     user = await get_user_by_email(email, db)
     user.avatar = url
     await db.commit()
+    await bus.publish(UserUpdated(user.id, user.email))
     return user
\ No newline at end of file
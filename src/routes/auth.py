@@ -1,48 +1,58 @@
+import asyncio
 from typing import List
 
-from fastapi import APIRouter, HTTPException, Depends, status, Security, Request, BackgroundTasks, Response
+from fastapi import APIRouter, HTTPException, Depends, status, Security, Request, Response, Path
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
-from fastapi.responses import FileResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from starlette.background import BackgroundTasks
 
+from src.conf.config import config
 from src.database.db import get_db
+from src.database.models import User
 from src.schemas import UserSchema, UserResponseSchema, TokenModel
 from src.repository import users as repository_users
 from src.services.auth import auth_service
-from src.services.email import send_email
+from src.services.rate_limit import RateLimit
+from src.services.sessions import new_id
+from src.services.tracking import PIXEL, PIXEL_ETAG, PIXEL_HEADERS, open_recorder
 
 router = APIRouter(prefix='/auth', tags=["auth"])
 security = HTTPBearer()
+auth_limit = RateLimit(config.rate_limit_auth, scope="ip")
+tracking_limit = RateLimit(config.rate_limit_tracking, scope="ip")
 
 
-@router.post("/signup", response_model=UserResponseSchema, status_code=status.HTTP_201_CREATED)
-async def signup(body: UserSchema,background_tasks: BackgroundTasks, request: Request, db: AsyncSession = Depends(get_db)):
+@router.post("/signup", response_model=UserResponseSchema, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(auth_limit)])
+async def signup(body: UserSchema, request: Request, db: AsyncSession = Depends(get_db)):
     """
     The signup function creates a new user in the database.
         It takes a UserSchema object as input, and returns the newly created user.
         If an account with that email already exists, it raises an HTTP 409 Conflict error.
+        The duplicate is detected by the unique constraint, so the request costs the INSERTs of the user and of its
+        outbox message plus the password hash, which is computed in a worker thread to keep the event loop free.
+        The confirmation email is written to the outbox with the user and sent by the outbox relay, after the response.
 
     :param body: UserSchema: Validate the request body
-    :param background_tasks: BackgroundTasks: Add a task to the background queue
     :param request: Request: Get the base url of the request
     :param db: AsyncSession: Pass the database session to the function
     :return: A userschema object
     :doc-author: Trelent
     """
-    exist_user = await repository_users.get_user_by_email(body.email, db)
-    if exist_user:
+    body.password = await asyncio.to_thread(auth_service.get_password_hash, body.password)
+    try:
+        new_user = await repository_users.create_user(body, db, host=str(request.base_url))
+    except IntegrityError:
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
-    body.password = auth_service.get_password_hash(body.password)
-    new_user = await repository_users.create_user(body, db)
-    background_tasks.add_task(send_email, new_user.email, new_user.username, str(request.base_url))
     return new_user
 
 
-@router.post("/login", response_model=TokenModel)
+@router.post("/login", response_model=TokenModel, dependencies=[Depends(auth_limit)])
 async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     The login function is used to authenticate a user.
+    Every login starts a new session in the session store, so a user can be logged in on several devices.
 
     :param body: OAuth2PasswordRequestForm: Get the username and password from the request body
     :param db: AsyncSession: Get the database session
@@ -57,59 +67,78 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession =
     if not auth_service.verify_password(body.password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
     # Generate JWT
-    access_token = await auth_service.create_access_token(data={"sub": user.email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
-    await repository_users.update_token(user, refresh_token, db)
+    jti = new_id()
+    sid = await auth_service.sessions.create(user.email, jti)
+    access_token = await auth_service.create_access_token(data={"sub": user.email, "sid": sid})
+    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email, "sid": sid, "jti": jti})
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
-@router.get('/refresh_token', response_model=TokenModel)
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security),
-                        db: AsyncSession = Depends(get_db)):
+@router.get('/refresh_token', response_model=TokenModel, dependencies=[Depends(auth_limit)])
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security)):
     """
     The refresh_token function is used to refresh the access token.
-    It takes in a refresh token and returns a new access token.
-    The function first decodes the refresh_token to get the email of the user who owns it, then gets that user from
-    the database and checks if their stored refresh_token matches what was passed in. If not, it updates their stored
-    refresh_token to None (logging them out) and raises an HTTPException with status code 401 Unauthorized. Otherwise,
-    it creates new tokens for that user using auth_service's create functions, updates their stored tokens in the db with
+    It takes in a refresh token and returns a new access token and a new refresh token.
+    The refresh token must be the current one of its session: the session store swaps it for the new one atomically
+    and rejects the access tokens the session was issued before the refresh.
+    A refresh token that was already used means it leaked, so the whole session is revoked
+    and an HTTPException with status code 401 Unauthorized is raised. The database is not touched.
 
     :param credentials: HTTPAuthorizationCredentials: Get the token from the request header
-    :param db: AsyncSession: Get the database session
     :return: A new access token and a refresh token
     :doc-author: Trelent
     """
-    token = credentials.credentials
-    email = await auth_service.decode_refresh_token(token)
-    user = await repository_users.get_user_by_email(email, db)
-    if user.refresh_token != token:
-        await repository_users.update_token(user, None, db)
+    payload = await auth_service.decode_refresh_token(credentials.credentials)
+    email, sid, jti = payload["sub"], payload.get("sid"), payload.get("jti")
+    new_jti = new_id()
+    if not sid or not await auth_service.sessions.rotate(sid, email, jti, new_jti):
+        if sid:
+            await auth_service.sessions.revoke(sid)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
 
-    access_token = await auth_service.create_access_token(data={"sub": email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": email})
-    await repository_users.update_token(user, refresh_token, db)
+    access_token = await auth_service.create_access_token(data={"sub": email, "sid": sid})
+    refresh_token = await auth_service.create_refresh_token(data={"sub": email, "sid": sid, "jti": new_jti})
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
-@router.get('/{username}')
-async def refresh_token(username: str, response: Response):
+@router.post('/logout', dependencies=[Depends(auth_limit)])
+async def logout(token: str = Depends(auth_service.oauth2_scheme),
+                 current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The logout function ends the session of the access token.
+    The refresh token of the session stops working and the access tokens of the session are rejected from now on.
+
+    :param token: str: Get the access token from the authorization header
+    :param current_user: User: Get the current user
+    :return: A message that the user is logged out
+    :doc-author: Trelent
+    """
+    payload = auth_service.verify_access_token(token)
+    auth_service.revoke_access_token(token)
+    if payload and payload.get("sid"):
+        await auth_service.sessions.revoke(payload["sid"])
+    return {"message": "Logged out"}
+
+
+@router.get('/{username}', dependencies=[Depends(tracking_limit)])
+async def email_opened(request: Request, username: str = Path(max_length=50)):
     """
-    The refresh_token function is called by the email client when a user clicks on the link in their email.
-    The function then updates the database with a new token and returns an image to display in their browser.
+    The email_opened function is called by the email client when a user opens the email with the tracking image.
+    The open is recorded in memory and written to the database in batches, the image is served from memory.
+    A client that already has the image revalidates it and gets an empty 304 response.
 
-    :param username: str: Get the username of the user who opened our email
-    :param response: Response: Get the response from the server
-    :return: A response to the user
+    :param request: Request: Get the If-None-Match header
+    :param username: str: Get the username of the user who opened our email, at most as long as the column
+    :return: The tracking image
     :doc-author: Trelent
     """
-    print("------------------------")
-    print(f"{username} відкрив наш email")
-    print("------------------------")
-    return FileResponse("src/static/check.png", media_type="image/png", content_disposition_type="inline")
+    open_recorder.record(username)
+    if request.headers.get("if-none-match") == PIXEL_ETAG:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=PIXEL_HEADERS)
+    return Response(content=PIXEL, media_type="image/png", headers=PIXEL_HEADERS)
 
 
-@router.get('/confirmed_email/{token}')
+@router.get('/confirmed_email/{token}', dependencies=[Depends(auth_limit)])
 async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
     """
     The confirmed_email function is used to confirm a user's email address.
@@ -1,60 +1,229 @@
-from typing import List
+import asyncio
+import json
+from typing import List, Literal
 
-from fastapi import APIRouter, HTTPException, Depends, status, Path, Query
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, HTTPException, Depends, status, Path, Query, Header, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from src.database.db import get_db
+from src.conf.config import config
+from src.database.db import get_db, get_session_maker
 from src.database.models import User, Role
-from src.schemas import ContactsResponse, ContactsSchema, ContactsUpdateSchema
+from src.schemas import ContactsResponse, ContactsSchema, ContactsUpdateSchema, ContactsMergeSchema, \
+    ContactsStatsResponse, ContactsFilter
 from src.repository import contacts as repository_contacts
+from src.repository import stats as repository_stats
 from src.services.auth import auth_service
+from src.services.idempotency import fingerprint, run_idempotent
+from src.services.rate_limit import RateLimit
 from src.services.roles import RoleAccess
 
-router = APIRouter(prefix='/contacts', tags=["contacts"])
+router = APIRouter(prefix='/contacts', tags=["contacts"],
+                   dependencies=[Depends(RateLimit(config.rate_limit_read, scope="user"))])
 access_to_all = RoleAccess([Role.admin, Role.moderator])
+access_to_admin = RoleAccess([Role.admin])
+write_limit = RateLimit(config.rate_limit_write, scope="user")
+_export_connections: asyncio.Semaphore | None = None
+_export_limit = 0
+
+
+def get_export_connections() -> tuple[asyncio.Semaphore, int]:
+    """
+    The get_export_connections function returns the permits shared by the concurrent reads of all the exports
+    of the process, creating them on the first call: half of the connection pool, the other half is left to the
+    other requests. They are sized then, not at import, because serve.py sets the pool size of each worker
+    after the application was imported.
+
+    :return: The semaphore and its number of permits
+    """
+    global _export_connections, _export_limit
+    if _export_connections is None:
+        _export_limit = max(1, min(config.contacts_export_max_parallel,
+                                   (config.db_pool_size + config.db_max_overflow) // 2))
+        _export_connections = asyncio.Semaphore(_export_limit)
+    return _export_connections, _export_limit
 
 
 @router.get("/", response_model=List[ContactsResponse])
-async def get_contacts(limit: int = Query(10, ge=10, le=500), offset: int = Query(0, ge=0, le=200),
+async def get_contacts(response: Response, limit: int = Query(10, ge=10, le=500),
+                    offset: int = Query(0, ge=0, le=200), count: Literal["none", "exact", "estimated"] = "none",
                     db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
     """
     The get_contacts function returns a list of contacts.
+        With count=exact or count=estimated the X-Total-Count header carries the number of contacts of the user,
+        read from the maintained counter, so it is exact and cheap in both modes.
 
+    :param response: Response: Set the X-Total-Count header
     :param limit: int: Limit the number of contacts returned
     :param ge: Set a minimum value for the limit and offset parameters
     :param le: Limit the number of contacts returned
     :param offset: int: Specify the number of records to skip
     :param ge: Specify the minimum value of the limit parameter
     :param le: Set a maximum value for the limit parameter
+    :param count: str: Whether to return the total count
     :param db: AsyncSession: Get the database connection from the dependency injection system
     :param user: User: Get the current user from the database
     :return: A list of contacts
     :doc-author: Trelent
     """
     contacts = await repository_contacts.get_contacts(limit, offset, db, user)
+    if count != "none":
+        response.headers["X-Total-Count"] = str(await repository_stats.count_contacts(db, user.id))
     return contacts
 
 
 @router.get("/all", response_model=List[ContactsResponse], dependencies=[Depends(access_to_all)])
-async def get_contacts(limit: int = Query(10, ge=10, le=500), offset: int = Query(0, ge=0, le=200),
+async def get_contacts(response: Response, limit: int = Query(10, ge=10, le=500),
+                    offset: int = Query(0, ge=0, le=200), count: Literal["none", "exact", "estimated"] = "none",
+                    filters: ContactsFilter = Depends(), after_id: int | None = Query(None, ge=0),
                     db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
     """
-    The get_contacts function returns a list of contacts.
+    The get_contacts function returns a page of the contacts of all the users, ordered by id.
+        The contacts can be filtered by owner (user_id), city and creation date (created_from, created_to).
+        For keyset paging pass the X-Next-After-Id header of a full page as after_id: unlike offset,
+        it costs the same on every page and does not skip or repeat contacts when others are added meanwhile.
+        With count=exact the X-Total-Count header carries the sum of the per-user counters.
+        With count=estimated it carries the row estimate of the database planner, which costs nothing
+        but may be off by the changes since the last ANALYZE; X-Total-Count-Estimated is then set to true.
+        With filters both count the matching contacts exactly, with a COUNT query; after_id does not change the count.
 
+    :param response: Response: Set the X-Total-Count header
     :param limit: int: Limit the number of contacts returned
     :param ge: Set a minimum value for the limit and offset parameters
     :param le: Limit the number of contacts returned
     :param offset: int: Specify the offset of the first contact to return
     :param ge: Specify the minimum value that can be passed in for a parameter
     :param le: Specify that the limit must be less than or equal to 500
+    :param count: str: Whether to return the total count, and how
+    :param filters: ContactsFilter: The conditions the contacts must match
+    :param after_id: int: Return the contacts after this id
     :param db: AsyncSession: Get the database session, which is passed to the repository
     :param user: User: Get the current user
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = await repository_contacts.get_all_contacts(limit, offset, db)
+    contacts = await repository_contacts.get_all_contacts(limit, offset, db, filters, after_id)
+    if len(contacts) == limit:
+        response.headers["X-Next-After-Id"] = str(contacts[-1].id)
+    if count != "none":
+        if filters.model_dump(exclude_none=True):
+            total, estimated = await repository_contacts.count_all_contacts(db, filters), False
+        else:
+            total, estimated = await repository_stats.count_all_contacts(db, estimated=count == "estimated")
+        response.headers["X-Total-Count"] = str(total)
+        if estimated:
+            response.headers["X-Total-Count-Estimated"] = "true"
     return contacts
 
+
+@router.get("/all/export", dependencies=[Depends(access_to_all)])
+async def export_contacts(filters: ContactsFilter = Depends(), after_id: int | None = Query(None, ge=0),
+                          parallel: int = Query(1, ge=1, le=config.contacts_export_max_parallel),
+                          db: AsyncSession = Depends(get_db),
+                          session_maker: async_sessionmaker = Depends(get_session_maker)):
+    """
+    The export_contacts function streams the contacts of all the users as newline delimited JSON, in id order,
+        with the filters of the admin view. The contacts are read in batches and written as they come,
+        so the size of the export does not matter.
+        With parallel above 1 the id range is split into chunks fetched concurrently over that many
+        pooled connections, which is faster when the database has spare cores. The exports of the process
+        share half of the connection pool, see get_export_connections, and parallel is capped to it.
+
+    :param filters: ContactsFilter: The conditions the contacts must match
+    :param after_id: int: Start after this id, to resume an interrupted export
+    :param parallel: int: The number of connections to read with
+    :param db: AsyncSession: Get the database session
+    :param session_maker: async_sessionmaker: Open the sessions of the concurrent reads
+    :return: A stream of contacts
+    :doc-author: Trelent
+    """
+    connections, limit = get_export_connections()
+    parallel = min(parallel, limit)
+    if parallel > 1:
+        contacts = repository_contacts.fan_out_contacts(session_maker, filters, after_id, parallel,
+                                                        config.contacts_export_chunk, connections)
+    else:
+        contacts = repository_contacts.stream_all_contacts(db, filters, after_id, config.contacts_export_chunk)
+
+    async def lines():
+        async for contact in contacts:
+            yield ContactsResponse.model_validate(contact).model_dump_json() + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.get("/duplicates")
+async def get_duplicates(db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_duplicates function returns the groups of contacts that are probably the same person.
+        The groups are streamed as newline delimited JSON, one {"contact_ids": [...]} object per line.
+
+    :param db: AsyncSession: Get the database session
+    :param user: User: Get the current user
+    :return: A stream of groups of contact ids
+    :doc-author: Trelent
+    """
+    async def lines():
+        async for cluster in repository_contacts.find_duplicates(db, user):
+            yield json.dumps({"contact_ids": cluster}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.post("/merge", response_model=ContactsResponse, dependencies=[Depends(write_limit)])
+async def merge_contacts(body: ContactsMergeSchema, db: AsyncSession = Depends(get_db),
+                         user: User = Depends(auth_service.get_current_user)):
+    """
+    The merge_contacts function merges duplicate contacts into one.
+        Empty fields of the primary contact are filled from the duplicates, and the duplicates are deleted.
+
+    :param body: ContactsMergeSchema: The primary contact id and the ids of its duplicates
+    :param db: AsyncSession: Get the database session
+    :param user: User: Get the current user
+    :return: The merged contact
+    :doc-author: Trelent
+    """
+    contact = await repository_contacts.merge_contacts(body.primary_id, body.duplicate_ids, db, user)
+    if contact is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="NOT FOUND",
+        )
+    return contact
+
+
+@router.get("/stats", response_model=ContactsStatsResponse)
+async def get_stats(db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_stats function returns the number of contacts of the user, in total, by city and by month of birth.
+        The numbers are read from counters maintained on every contact change, the contacts are not scanned.
+
+    :param db: AsyncSession: Get the database session
+    :param user: User: Get the current user
+    :return: The contact counts
+    :doc-author: Trelent
+    """
+    return await repository_stats.get_stats(db, user.id)
+
+
+@router.post("/stats/reconcile", dependencies=[Depends(access_to_admin), Depends(write_limit)])
+async def reconcile_stats(user_id: int | None = Query(None, ge=1), db: AsyncSession = Depends(get_db),
+                          user: User = Depends(auth_service.get_current_user)):
+    """
+    The reconcile_stats function recounts the contact counters of a user from the contacts and repairs drifted ones.
+        Available to admins only.
+
+    :param user_id: int: The user to reconcile, the current user by default
+    :param db: AsyncSession: Get the database session
+    :param user: User: Get the current user
+    :return: The number of repaired counters
+    :doc-author: Trelent
+    """
+    repaired = await repository_stats.reconcile_stats(db, user_id or user.id)
+    return {"repaired": repaired}
+
+
 @router.get("/{contact_id}", response_model=ContactsResponse)
 async def get_contact(contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
     """
@@ -75,22 +244,42 @@ async def get_contact(contact_id: int = Path(ge=1), db: AsyncSession = Depends(g
     return contact
 
 
-@router.post("/", response_model=ContactsResponse, status_code=status.HTTP_201_CREATED)
-async def create_contact(body: ContactsSchema, db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+@router.post("/", response_model=ContactsResponse, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(write_limit)])
+async def create_contact(body: ContactsSchema, response: Response,
+                         idempotency_key: str | None = Header(None, min_length=1, max_length=255),
+                         db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
     """
     The create_contact function creates a new contact in the database.
+        With an Idempotency-Key header the contact is created once per user and key: retries get the stored
+        first response back (with the Idempotent-Replayed header) without touching the database.
 
     :param body: ContactsSchema: Validate the request body
+    :param response: Response: Set the Idempotent-Replayed header
+    :param idempotency_key: str: The Idempotency-Key header
     :param db: AsyncSession: Pass the database session to the repository function
     :param user: User: Get the user that is currently logged in
     :return: A contact object, which is a pydantic model
     :doc-author: Trelent
     """
-    contact = await repository_contacts.create_contact(body, db, user)
+    async def create():
+        try:
+            contact = await repository_contacts.create_contact(body, db, user)
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Contact with this email already exists")
+        return jsonable_encoder(ContactsResponse.model_validate(contact))
+
+    if idempotency_key is None:
+        return await create()
+    contact, replayed = await run_idempotent(str(user.id), idempotency_key,
+                                             fingerprint("POST", "/contacts", body.model_dump_json()), create)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
     return contact
 
 
-@router.put("/{contact_id}", response_model=ContactsResponse)
+@router.put("/{contact_id}", response_model=ContactsResponse, dependencies=[Depends(write_limit)])
 async def update_contact(body: ContactsUpdateSchema, contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
     """
     The update_contact function updates a contact in the database.
@@ -113,7 +302,7 @@ async def update_contact(body: ContactsUpdateSchema, contact_id: int = Path(ge=1
     return contact
 
 
-@router.delete("/{contact_id}", response_model=ContactsResponse)
+@router.delete("/{contact_id}", response_model=ContactsResponse, dependencies=[Depends(write_limit)])
 async def delete_contact(contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
     """
     The delete_contact function deletes a contact from the database.
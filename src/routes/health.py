@@ -0,0 +1,33 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+
+from src.services.lifecycle import lifecycle
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+@router.get("/live")
+async def liveness():
+    """
+    The liveness function answers as long as the event loop of the process is responsive.
+
+    :return: The status
+    :doc-author: Trelent
+    """
+    return {"status": "alive"}
+
+
+@router.get("/ready")
+async def readiness():
+    """
+    The readiness function tells whether the instance should get traffic: 200 once the startup warm-up is done,
+    503 before that and from the termination signal on, while the requests in progress are drained.
+
+    :return: The status and the number of requests in progress
+    :doc-author: Trelent
+    """
+    if lifecycle.ready:
+        return {"status": "ready", "in_flight": lifecycle.in_flight}
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        content={"status": "draining" if lifecycle.draining else "starting",
+                                 "in_flight": lifecycle.in_flight})
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends
+
+from src.database.models import Role
+from src.services.compression import metrics as compression_metrics, precompressed
+from src.services.events import bus
+from src.services.outbox import relay
+from src.services.roles import RoleAccess
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+access_to_admin = RoleAccess([Role.admin])
+
+
+@router.get("/", dependencies=[Depends(access_to_admin)])
+async def get_metrics():
+    """
+    The get_metrics function returns the counters of the application. Available to admins only.
+        compression has, per encoding, the number of compressed responses, the bytes before and after,
+        the bytes saved and the CPU seconds spent; precompression_cpu_seconds is the one-off cost at startup.
+        events has, per subscription, the published, handled, failed, dropped and queued events.
+        outbox has the relayed batches and the delivered, failed and given up outbox messages.
+
+    :return: The metrics
+    :doc-author: Trelent
+    """
+    return {
+        "compression": compression_metrics.snapshot(),
+        "precompression_cpu_seconds": precompressed.cpu_seconds,
+        "events": bus.snapshot(),
+        "outbox": relay.snapshot(),
+    }
@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, status
+from fastapi.responses import PlainTextResponse
+
+from src.database.models import Role
+from src.schemas import ProfilingSettings, ProfilingStatus
+from src.services.profiling import profiler
+from src.services.roles import RoleAccess
+
+router = APIRouter(prefix="/profiling", tags=["profiling"])
+access_to_admin = RoleAccess([Role.admin])
+
+
+def profiling_status() -> dict:
+    return {
+        "armed": profiler.armed,
+        "sample_rate": profiler.sample_rate,
+        "path_prefix": profiler.path_prefix,
+        "token": profiler.token,
+        "active": len(profiler.active),
+        "profiles": [profile.summary() for profile in reversed(profiler.profiles)],
+    }
+
+
+@router.get("/", response_model=ProfilingStatus, dependencies=[Depends(access_to_admin)])
+async def get_profiling():
+    """
+    The get_profiling function returns the state of the profiler and the recorded profiles, newest first.
+    Available to admins only. The profiles are kept by the worker process that served the profiled requests.
+
+    :return: The profiler state
+    :doc-author: Trelent
+    """
+    return profiling_status()
+
+
+@router.post("/", response_model=ProfilingStatus, dependencies=[Depends(access_to_admin)])
+async def start_profiling(body: ProfilingSettings):
+    """
+    The start_profiling function arms the profiler. Available to admins only.
+        sample_rate is the fraction of the requests under path_prefix to profile; 0 profiles only the requests sent
+        with the X-Profile-Token header set to the returned token. A new token is issued on every call.
+
+    :param body: ProfilingSettings: The fraction of requests to profile and the path they must start with
+    :return: The profiler state, with the token
+    :doc-author: Trelent
+    """
+    profiler.arm(body.sample_rate, body.path_prefix)
+    return profiling_status()
+
+
+@router.delete("/", response_model=ProfilingStatus, dependencies=[Depends(access_to_admin)])
+async def stop_profiling():
+    """
+    The stop_profiling function disarms the profiler; the recorded profiles are kept. Available to admins only.
+
+    :return: The profiler state
+    :doc-author: Trelent
+    """
+    profiler.disarm()
+    return profiling_status()
+
+
+@router.get("/{profile_id}", response_class=PlainTextResponse, dependencies=[Depends(access_to_admin)])
+async def get_profile(profile_id: int = Path(ge=1)):
+    """
+    The get_profile function returns a profile in the collapsed stack format, ready for flamegraph.pl or speedscope.
+    Available to admins only.
+
+    :param profile_id: int: The id of the profile
+    :return: The collapsed stacks, one line per stack with its number of samples
+    :doc-author: Trelent
+    """
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return PlainTextResponse(profile.collapsed())
@@ -1,24 +1,18 @@
 from fastapi import APIRouter, Depends, status, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
 
+from src.conf.config import config
 from src.database.db import get_db
 from src.database.models import User
 from src.repository import users as repository_users
 from src.services.auth import auth_service
-from src.conf.config import config
+from src.services.avatar import store_avatar
+from src.services.rate_limit import RateLimit
 from src.schemas import UserResponseSchema
 
-router = APIRouter(prefix="/users", tags=["users"])
-
-cloudinary.config(
-    cloud_name=config.cloudinary_name,
-    api_key=config.cloudinary_api_key,
-    api_secret=config.cloudinary_api_secret,
-    secure=True
-)
+router = APIRouter(prefix="/users", tags=["users"],
+                   dependencies=[Depends(RateLimit(config.rate_limit_read, scope="user"))])
+write_limit = RateLimit(config.rate_limit_write, scope="user")
 
 
 @router.get("/me/", response_model=UserResponseSchema)
@@ -34,13 +28,14 @@ async def read_users_me(current_user: User = Depends(auth_service.get_current_us
     return current_user
 
 
-@router.patch('/avatar', response_model=UserResponseSchema)
+@router.patch('/avatar', response_model=UserResponseSchema, dependencies=[Depends(write_limit)])
 async def update_avatar_user(file: UploadFile = File(), current_user: User = Depends(auth_service.get_current_user),
                              db: AsyncSession = Depends(get_db)):
 
     """
     The update_avatar_user function is used to update the avatar of a user.
-        The function takes in an UploadFile object, which contains the file that will be uploaded to Cloudinary.
+        The function takes in an UploadFile object, which is read with a size limit and stored with its thumbnails
+        in the configured storage (Cloudinary or the local disk) without blocking the event loop.
         It also takes in a User object, which is obtained from auth_service's get_current_user function.
         Finally it takes in an AsyncSession object, which is obtained from get_db().
 
@@ -50,9 +45,6 @@ async def update_avatar_user(file: UploadFile = File(), current_user: User = Dep
     :return: The updated user
     :doc-author: Trelent
     """
-    r = cloudinary.uploader.upload(file.file, public_id=f'TODOApp/{current_user.username}', overwrite=True)
-
-    src_url = cloudinary.CloudinaryImage(f'TODOApp/{current_user.username}')\
-                        .build_url(width=250, height=250, crop='fill', version=r.get('version'))
+    src_url = await store_avatar(file)
     user = await repository_users.update_avatar(current_user.email, src_url, db)
     return user
\ No newline at end of file
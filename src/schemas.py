@@ -1,7 +1,9 @@
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, ValidationInfo, field_validator
+
+from src.services.gravatar import gravatar_url
 
 
 class UserSchema(BaseModel):
@@ -16,6 +18,16 @@ class UserResponseSchema(BaseModel):
     email: str
     avatar: str
 
+    @field_validator("avatar", mode="before")
+    @classmethod
+    def default_avatar(cls, value: str | None, info: ValidationInfo):
+        """
+        Users without an uploaded avatar get their Gravatar image, resolved here instead of at signup.
+        """
+        if value is None and info.data.get("email"):
+            return gravatar_url(info.data["email"])
+        return value
+
     class Config:
         from_attributes = True
 
@@ -40,6 +52,49 @@ class ContactsUpdateSchema(ContactsSchema):
     pass
 
 
+class ContactsMergeSchema(BaseModel):
+    primary_id: int = Field(ge=1)
+    duplicate_ids: list[int] = Field(min_length=1, max_length=100)
+
+
+class ContactsStatsResponse(BaseModel):
+    total: int = 0
+    by_city: dict[str, int] = {}
+    by_birth_month: dict[str, int] = {}
+
+
+class ProfilingSettings(BaseModel):
+    sample_rate: float = Field(default=0.0, ge=0, le=1)
+    path_prefix: str = Field(default="/", max_length=200)
+
+
+class ProfileSummary(BaseModel):
+    id: int
+    method: str
+    path: str
+    request_id: str | None
+    started_at: float
+    duration: float
+    status: int | None
+    samples: int
+
+
+class ProfilingStatus(BaseModel):
+    armed: bool
+    sample_rate: float
+    path_prefix: str
+    token: str | None
+    active: int
+    profiles: list[ProfileSummary]
+
+
+class ContactsFilter(BaseModel):
+    user_id: int | None = Field(default=None, ge=1)
+    city: str | None = Field(default=None, max_length=50)
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+
+
 class ContactsResponse(BaseModel):
     id: int = 1
     name: str
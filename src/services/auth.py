@@ -1,35 +1,55 @@
+import functools
+import logging
+import math
 import pickle
+import random
+import time
 from typing import Optional
 
-import redis
 from jose import JWTError, jwt
+from redis.exceptions import RedisError
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.repository import users as repository_users
 from src.conf.config import config
+from src.services.cache import Cache, cache as shared_cache
+from src.services.sessions import get_session_store
+from src.services.single_flight import SingleFlight
+from src.services.token_cache import TokenCache
+
+logger = logging.getLogger(__name__)
 
 def hash_for_user(email: str):
     """
-    The hash_for_user function takes an email address and returns a Redis hash key.
+    The hash_for_user function takes an email address and returns the key of the user in the cache.
 
     :param email: str: Specify the type of the email parameter
-    :return: A string that is the key of a hash in redis
+    :return: A string that is the key of the user in the cache
     :doc-author: Trelent
     """
     return f"user:{email}"
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
     SECRET_KEY = config.secret_key
     ALGORITHM = config.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-    cache = redis.Redis(host='localhost', port=6379, db=0)
+    token_cache = TokenCache(config.token_cache_size)
+    user_flight = SingleFlight()
+    sessions = get_session_store()
+    cache: Cache = shared_cache
+
+    # passlib with bcrypt is loaded on first use, not when the application is imported
+
+    @functools.cached_property
+    def pwd_context(self):
+        from passlib.context import CryptContext
+
+        return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
     def verify_password(self, plain_password, hashed_password):
         """
@@ -76,8 +96,9 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(minutes=60)
-        to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "access_token"})
+            expire = datetime.utcnow() + timedelta(minutes=config.access_token_minutes)
+        # iat with the fraction of the second, to tell the tokens issued before a rotation from the ones after it
+        to_encode.update({"iat": time.time(), "exp": expire, "scope": "access_token"})
         encoded_access_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_access_token
 
@@ -99,7 +120,7 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(days=7)
+            expire = datetime.utcnow() + timedelta(days=config.refresh_token_days)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"})
         encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_refresh_token
@@ -107,20 +128,20 @@ class Auth:
     async def decode_refresh_token(self, refresh_token: str):
         """
         The decode_refresh_token function is used to decode the refresh token.
-        It takes in a refresh_token as an argument and returns the email of the user if it's valid.
+        It takes in a refresh_token as an argument and returns its claims if it's valid: the email of the user (sub),
+        the id of the session (sid) and the id of the token (jti).
         If not, it raises an HTTPException with status code 401 (Unauthorized) and detail 'Could not validate credentials'.
 
 
         :param self: Represent the instance of the class
         :param refresh_token: str: Pass in the refresh token that we want to decode
-        :return: The email address of the user that is associated with the refresh token
+        :return: The claims of the refresh token
         :doc-author: Trelent
         """
         try:
             payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
             if payload['scope'] == 'refresh_token':
-                email = payload['sub']
-                return email
+                return payload
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
@@ -157,10 +178,49 @@ class Auth:
             email = payload["sub"]
             return email
         except JWTError as e:
-            print(e)
+            logger.info("Invalid email token: %s", e)
             raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                                 detail="Invalid token for email verification")
 
+    def verify_access_token(self, token: str) -> dict | None:
+        """
+        The verify_access_token function returns the validated claims of an access token.
+        Tokens seen before are answered from the token cache without the signature check and JSON parsing,
+        the cache drops them when they expire or are revoked.
+
+        :param self: Represent the instance of the class
+        :param token: str: The encoded access token
+        :return: The claims, or None if the token is invalid, expired or revoked
+        :doc-author: Trelent
+        """
+        payload = self.token_cache.get(token)
+        if payload is not None:
+            return payload
+        try:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+        except JWTError:
+            return None
+        if payload.get('scope') != 'access_token' or payload.get('sub') is None:
+            return None
+        if self.token_cache.is_revoked(token):
+            return None
+        self.token_cache.put(token, payload)
+        return payload
+
+    def revoke_access_token(self, token: str) -> None:
+        """
+        The revoke_access_token function rejects the access token in this process from now on, used on logout.
+        The other processes reject it through the revoked session.
+
+        :param self: Represent the instance of the class
+        :param token: str: The encoded access token
+        :return: None
+        :doc-author: Trelent
+        """
+        payload = self.verify_access_token(token)
+        if payload is not None:
+            self.token_cache.revoke(token, payload)
+
     async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
         """
         The get_current_user function is a dependency that will be called by FastAPI to
@@ -179,34 +239,88 @@ class Auth:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-        try:
-            # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload["sub"]
-                if email is None:
-                    raise credentials_exception
-            else:
-                raise credentials_exception
-        except JWTError as e:
+        payload = self.verify_access_token(token)
+        if payload is None:
             raise credentials_exception
+        if payload.get("sid") and payload["iat"] < await self.session_not_before(payload["sid"]):
+            self.token_cache.revoke(token, payload)
+            raise credentials_exception
+        email = payload["sub"]
 
         # user = await repository_users.get_user_by_email(email, db)
         # if user is None:
         #     raise credentials_exception
 
-        user_hash = hash_for_user(email)
-        user = self.cache.get(user_hash)
+        user = await self.get_cached_user(email, db)
         if user is None:
-            user = await repository_users.get_user_by_email(email, db)
-            if user is None:
-                raise credentials_exception
-            self.cache.set(user_hash, pickle.dumps(user))
-            self.cache.expire(user_hash, 900)
-        else:
-            user = pickle.loads(user)
-            print(f'Get user form cache {user.email}')
+            raise credentials_exception
+        return user
+
+    async def session_not_before(self, sid: str) -> float:
+        """
+        The session_not_before function gets the time before which the access tokens of the session were issued
+        are rejected: the last refresh of the session, or inf once it was revoked.
+        When the session store is unavailable the token is accepted, as its signature and expiry are already checked.
 
+        :param self: Represent the instance of the class
+        :param sid: str: The id of the session
+        :return: The time, 0 if no token of the session is rejected
+        :doc-author: Trelent
+        """
+        try:
+            return await self.sessions.not_before(sid)
+        except (RedisError, OSError) as err:
+            logger.warning("Session store is unavailable: %s", err)
+            return 0.0
+
+    async def get_cached_user(self, email: str, db: AsyncSession):
+        """
+        The get_cached_user function returns the user from the cache, loading it from the database on a miss.
+        Concurrent misses for the same email in this process share one database query.
+        An entry is refreshed before it expires with a probability that grows as the expiry gets closer
+        (probabilistic early expiration), so hot users are renewed by a single request instead of all at once.
+        Unknown emails are cached for a short time too. Errors of the cache are treated as a miss.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email of the user
+        :param db: AsyncSession: Get the database session
+        :return: The user, or None if there is no such user
+        :doc-author: Trelent
+        """
+        user_hash = hash_for_user(email)
+        try:
+            cached = await self.cache.get(user_hash)
+        except (RedisError, OSError) as err:
+            logger.warning("User cache is unavailable: %s", err)
+            cached = None
+        if cached is not None:
+            entry = pickle.loads(cached)
+            if isinstance(entry, tuple):
+                user, expires_at, delta = entry
+                if time.time() - delta * config.user_cache_beta * math.log(1.0 - random.random()) < expires_at:
+                    logger.debug("Get user from cache %s", email)
+                    return user
+        return await self.user_flight.do(user_hash, lambda: self.load_user(email, db))
+
+    async def load_user(self, email: str, db: AsyncSession):
+        """
+        The load_user function reads the user from the database and stores it in the cache,
+        together with its expiry time and the time the query took, which drives the early refresh.
+
+        :param self: Represent the instance of the class
+        :param email: str: The email of the user
+        :param db: AsyncSession: Get the database session
+        :return: The user, or None if there is no such user
+        :doc-author: Trelent
+        """
+        start = time.time()
+        user = await repository_users.get_user_by_email(email, db)
+        now = time.time()
+        ttl = config.user_cache_ttl if user is not None else config.user_cache_negative_ttl
+        try:
+            await self.cache.set(hash_for_user(email), pickle.dumps((user, now + ttl, now - start)), ttl)
+        except (RedisError, OSError) as err:
+            logger.warning("User cache is unavailable: %s", err)
         return user
 
 
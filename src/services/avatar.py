@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import io
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, UploadFile, status
+
+from src.conf.config import config
+from src.services.storage import StorageBackend, get_storage
+
+CHUNK_SIZE = 64 * 1024
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def pillow_available() -> bool:
+    """
+    Thumbnails are generated with Pillow, a dependency of the project. Without it only the original image is stored.
+
+    :return: True if Pillow can be imported
+    """
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def make_thumbnails(data: bytes, sizes: tuple[int, ...]) -> dict[int, bytes]:
+    """
+    The make_thumbnails function resizes the image to square png thumbnails (crop to fill, like the old Cloudinary
+    transformation). It is CPU bound and is executed in the process pool, so it must stay a module level function.
+
+    :param data: bytes: Content of the uploaded image
+    :param sizes: tuple[int, ...]: Sizes of the thumbnails in pixels
+    :return: A dict of size to png bytes
+    """
+    from PIL import Image, ImageOps
+
+    thumbnails = {}
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image).convert("RGBA")
+        for size in sizes:
+            thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            out = io.BytesIO()
+            thumbnail.save(out, format="PNG", optimize=True)
+            thumbnails[size] = out.getvalue()
+    return thumbnails
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    The get_pool function returns the process pool for thumbnail generation, creating it on the first call.
+
+    :return: The process pool
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=config.avatar_workers)
+    return _pool
+
+
+def shutdown_pool() -> None:
+    """
+    The shutdown_pool function stops the worker processes of the thumbnail pool, if it was created.
+    The next get_pool call creates a new one.
+
+    :return: None
+    """
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+async def read_upload(file: UploadFile, max_size: int) -> tuple[bytes, str]:
+    """
+    The read_upload function reads the uploaded file chunk by chunk and hashes it on the way.
+    The upload is rejected as soon as it grows over max_size, so a huge file is never read completely.
+
+    :param file: UploadFile: The uploaded file
+    :param max_size: int: Maximum allowed size in bytes
+    :return: The content of the file and its sha256 hex digest
+    """
+    if file.size is not None and file.size > max_size:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    while chunk := await file.read(CHUNK_SIZE):
+        if len(buffer) + len(chunk) > max_size:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+        digest.update(chunk)
+        buffer.extend(chunk)
+    return bytes(buffer), digest.hexdigest()
+
+
+async def store_avatar(file: UploadFile, storage: StorageBackend | None = None) -> str:
+    """
+    The store_avatar function stores the uploaded image together with its thumbnails and returns the avatar url.
+    Files are named by the content hash, so uploading the same image again finds it in the storage and does no work.
+    The largest thumbnail is written last and is used as the avatar, so its presence means the whole set is stored.
+
+    :param file: UploadFile: The uploaded image
+    :param storage: StorageBackend: The storage to use, the configured one by default
+    :return: The url of the avatar
+    """
+    storage = storage or get_storage()
+    data, digest = await read_upload(file, config.avatar_max_size)
+    if not pillow_available():
+        name = f"{digest}/original"
+        if await storage.exists(name):
+            return storage.url(name)
+        return await storage.save(name, data, file.content_type or "application/octet-stream")
+
+    sizes = tuple(sorted(config.avatar_sizes))
+    avatar_name = f"{digest}/{sizes[-1]}.png"
+    if await storage.exists(avatar_name):
+        return storage.url(avatar_name)
+    from PIL import Image
+
+    loop = asyncio.get_running_loop()
+    try:
+        thumbnails = await loop.run_in_executor(get_pool(), make_thumbnails, data, sizes)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image")
+    await asyncio.gather(*(storage.save(f"{digest}/{size}.png", thumbnails[size], "image/png") for size in sizes[:-1]))
+    return await storage.save(avatar_name, thumbnails[sizes[-1]], "image/png")
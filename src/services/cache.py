@@ -0,0 +1,240 @@
+import abc
+import time
+from collections import OrderedDict
+
+import redis.asyncio as redis
+
+from src.conf.config import config
+from src.database.redis import get_redis
+
+# Adds to the counter and sets its expiry when the counter has none, in a single round-trip.
+# KEYS[1] - counter key, ARGV[1] - amount, ARGV[2] - time to live in milliseconds, 0 for none.
+INCR_SCRIPT = """
+local value = redis.call('INCRBY', KEYS[1], ARGV[1])
+local ttl = tonumber(ARGV[2])
+if ttl > 0 and redis.call('PTTL', KEYS[1]) == -1 then
+    redis.call('PEXPIRE', KEYS[1], ttl)
+end
+return value
+"""
+
+
+class Cache(abc.ABC):
+    """
+    Key-value cache shared by the user cache and the rate limiter. Values are bytes.
+    The Redis backed caches raise RedisError or OSError when Redis is unavailable; the callers treat that as a miss.
+    """
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> bytes | None:
+        """
+        Return the cached value.
+
+        :param key: str: The key
+        :return: The value, or None if it is not cached or has expired
+        """
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        """
+        Cache the value.
+
+        :param key: str: The key
+        :param value: bytes: The value
+        :param ttl: float: Seconds to keep the value, None to keep it until it is evicted
+        """
+
+    @abc.abstractmethod
+    async def mget(self, keys: list[str]) -> list[bytes | None]:
+        """
+        Return the cached values of several keys, in one round-trip.
+
+        :param keys: list[str]: The keys
+        :return: The values in the order of the keys, None for the missing ones
+        """
+
+    @abc.abstractmethod
+    async def delete(self, *keys: str) -> None:
+        """
+        Remove the keys.
+
+        :param keys: str: The keys
+        """
+
+    @abc.abstractmethod
+    async def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        """
+        Add to an integer counter, created at 0.
+
+        :param key: str: The counter key
+        :param amount: int: The amount to add
+        :param ttl: float: Seconds to keep the counter, counted from its creation
+        :return: The new value
+        """
+
+    @property
+    def redis(self) -> redis.Redis | None:
+        """
+        The Redis client behind the cache, for the atomic scripts of the rate limiter, or None.
+        """
+        return None
+
+
+class MemoryCache(Cache):
+    def __init__(self, max_size: int):
+        """
+        LRU cache in the memory of the process: only the max_size most recently used keys are kept.
+        Expired values are dropped when they are read. For tests, benchmarks and single process setups,
+        and as the local tier of TieredCache.
+
+        :param max_size: int: Maximum number of cached keys
+        """
+        self.max_size = max_size
+        self._values: OrderedDict[str, tuple[bytes, float | None]] = OrderedDict()
+
+    def _get(self, key: str) -> bytes | None:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._values[key]
+            return None
+        self._values.move_to_end(key)
+        return value
+
+    def _set(self, key: str, value: bytes, expires_at: float | None) -> None:
+        self._values[key] = (value, expires_at)
+        self._values.move_to_end(key)
+        if len(self._values) > self.max_size:
+            self._values.popitem(last=False)
+
+    async def get(self, key: str) -> bytes | None:
+        return self._get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        self._set(key, value, None if ttl is None else time.monotonic() + ttl)
+
+    async def mget(self, keys: list[str]) -> list[bytes | None]:
+        return [self._get(key) for key in keys]
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._values.pop(key, None)
+
+    async def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        # stored as digits, like Redis does, so get returns the same bytes with both backends
+        value = self._get(key)
+        if value is None:
+            expires_at = None if ttl is None else time.monotonic() + ttl
+            value = amount
+        else:
+            expires_at = self._values[key][1]
+            value = int(value) + amount
+        self._set(key, str(value).encode(), expires_at)
+        return value
+
+
+class RedisCache(Cache):
+    def __init__(self):
+        """
+        Cache in Redis, shared by the processes. It uses the pooled client of src.database.redis,
+        so the caches, the session store and the idempotency store share one connection pool.
+        """
+        self._incr = None
+
+    @property
+    def redis(self) -> redis.Redis:
+        return get_redis()
+
+    async def get(self, key: str) -> bytes | None:
+        return await get_redis().get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        await get_redis().set(key, value, px=None if ttl is None else int(ttl * 1000))
+
+    async def mget(self, keys: list[str]) -> list[bytes | None]:
+        if not keys:
+            return []
+        return await get_redis().mget(keys)
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await get_redis().delete(*keys)
+
+    async def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        if self._incr is None:
+            self._incr = get_redis().register_script(INCR_SCRIPT)
+        return int(await self._incr(keys=[key], args=[amount, int(ttl * 1000) if ttl else 0]))
+
+
+class TieredCache(Cache):
+    def __init__(self, local: Cache, remote: Cache, local_ttl: float):
+        """
+        A local cache in front of a shared one. Reads are answered by the local tier when they can,
+        the values read from the remote tier are kept locally for at most local_ttl seconds.
+        Writes and deletes go to both tiers, but the local tiers of the other processes keep their copy
+        until it expires: local_ttl bounds how stale a read can be. Counters live in the remote tier only.
+
+        :param local: Cache: The cache of the process
+        :param remote: Cache: The cache shared by the processes
+        :param local_ttl: float: Maximum number of seconds a value is served from the local tier
+        """
+        self.local = local
+        self.remote = remote
+        self.local_ttl = local_ttl
+
+    @property
+    def redis(self) -> redis.Redis | None:
+        return self.remote.redis
+
+    def _local_ttl(self, ttl: float | None) -> float:
+        return self.local_ttl if ttl is None else min(ttl, self.local_ttl)
+
+    async def get(self, key: str) -> bytes | None:
+        value = await self.local.get(key)
+        if value is None:
+            value = await self.remote.get(key)
+            if value is not None:
+                await self.local.set(key, value, self.local_ttl)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        await self.remote.set(key, value, ttl)
+        await self.local.set(key, value, self._local_ttl(ttl))
+
+    async def mget(self, keys: list[str]) -> list[bytes | None]:
+        values = await self.local.mget(keys)
+        missing = [index for index, value in enumerate(values) if value is None]
+        if missing:
+            for index, value in zip(missing, await self.remote.mget([keys[index] for index in missing])):
+                if value is not None:
+                    values[index] = value
+                    await self.local.set(keys[index], value, self.local_ttl)
+        return values
+
+    async def delete(self, *keys: str) -> None:
+        await self.local.delete(*keys)
+        await self.remote.delete(*keys)
+
+    async def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        await self.local.delete(key)
+        return await self.remote.incr(key, amount, ttl)
+
+
+def get_cache() -> Cache:
+    """
+    The get_cache function creates the cache selected by the cache_backend setting.
+
+    :return: The cache
+    """
+    if config.cache_backend == "memory":
+        return MemoryCache(config.cache_max_size)
+    if config.cache_backend == "redis":
+        return RedisCache()
+    if config.cache_backend == "tiered":
+        return TieredCache(MemoryCache(config.cache_max_size), RedisCache(), config.cache_local_ttl)
+    raise ValueError(f"Unknown cache backend: {config.cache_backend}")
+
+
+cache = get_cache()
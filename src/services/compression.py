@@ -0,0 +1,225 @@
+import asyncio
+import gzip
+import time
+from typing import Callable
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.conf.config import config
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript",
+                      "application/xml", "image/svg+xml")
+
+
+def _gzip(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=config.compression_gzip_level, mtime=0)
+
+
+def available_encoders() -> dict[str, Callable[[bytes], bytes]]:
+    """
+    The available_encoders function returns the encoders that can be used, in the order of preference of the
+    compression_encodings setting. Brotli and zstd are optional dependencies, the brotli and zstandard packages
+    of the compression extra (poetry install -E compression): without them only gzip is offered.
+
+    :return: A dict of the Content-Encoding name to the compress function
+    """
+    encoders = {"gzip": _gzip}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        encoders["br"] = lambda data: brotli.compress(data, quality=config.compression_brotli_quality)
+    try:
+        import zstandard
+    except ImportError:
+        pass
+    else:
+        compressor = zstandard.ZstdCompressor(level=config.compression_zstd_level)
+        encoders["zstd"] = compressor.compress
+    return {name: encoders[name] for name in config.compression_encodings if name in encoders}
+
+
+ENCODERS = available_encoders()
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    """
+    The negotiate function picks the encoding of the response from the Accept-Encoding header of the request:
+    the encoding with the highest q-value, and among equal ones the one we prefer.
+
+    :param accept_encoding: str: The Accept-Encoding header
+    :return: The encoding, or None if the client accepts none of ours
+    """
+    accepted: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for name in ENCODERS:
+        q = accepted.get(name, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def compress(data: bytes, encoding: str) -> tuple[bytes, float]:
+    """
+    The compress function compresses the data and measures the CPU time it took, in the calling thread.
+
+    :param data: bytes: The body
+    :param encoding: str: The Content-Encoding
+    :return: The compressed body and the CPU seconds spent
+    """
+    start = time.thread_time()
+    compressed = ENCODERS[encoding](data)
+    return compressed, time.thread_time() - start
+
+
+class CompressionMetrics:
+    def __init__(self):
+        """
+        Counters of the response compression, per encoding.
+        """
+        self.encodings: dict[str, dict[str, float]] = {}
+
+    def record(self, encoding: str, size: int, compressed_size: int, cpu_seconds: float, precompressed: bool) -> None:
+        stats = self.encodings.setdefault(encoding, {"responses": 0, "precompressed": 0, "bytes_in": 0,
+                                                     "bytes_out": 0, "cpu_seconds": 0.0})
+        stats["responses"] += 1
+        stats["precompressed"] += precompressed
+        stats["bytes_in"] += size
+        stats["bytes_out"] += compressed_size
+        stats["cpu_seconds"] += cpu_seconds
+
+    def snapshot(self) -> dict:
+        """
+        The snapshot function returns the counters with the bytes saved by every encoding.
+
+        :return: A dict of the encoding to its counters
+        """
+        return {encoding: {**stats, "bytes_saved": stats["bytes_in"] - stats["bytes_out"]}
+                for encoding, stats in self.encodings.items()}
+
+
+class Precompressed:
+    def __init__(self):
+        """
+        Compressed variants of bodies that never change, made once at startup instead of on every response.
+        """
+        self._bodies: dict[str, tuple[bytes, dict[str, bytes]]] = {}
+        self.cpu_seconds = 0.0
+
+    def add(self, path: str, body: bytes) -> None:
+        """
+        The add function compresses the body served at the path with every encoding.
+        Variants that are not smaller than the body are not kept.
+
+        :param path: str: The path of the request
+        :param body: bytes: The body of the response
+        :return: None
+        """
+        variants = {}
+        for encoding in ENCODERS:
+            compressed, cpu_seconds = compress(body, encoding)
+            self.cpu_seconds += cpu_seconds
+            if len(compressed) < len(body):
+                variants[encoding] = compressed
+        self._bodies[path] = (body, variants)
+
+    def get(self, path: str, body: bytes, encoding: str) -> bytes | None:
+        """
+        The get function returns the stored variant, if the response is still the body it was made from.
+
+        :param path: str: The path of the request
+        :param body: bytes: The body of the response
+        :param encoding: str: The negotiated encoding
+        :return: The compressed body, or None
+        """
+        stored = self._bodies.get(path)
+        if stored is None or stored[0] != body:
+            return None
+        return stored[1].get(encoding)
+
+
+metrics = CompressionMetrics()
+precompressed = Precompressed()
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int | None = None, thread_size: int | None = None):
+        """
+        Compresses the responses with the encoding negotiated from Accept-Encoding.
+        Bodies smaller than minimum_size, already encoded ones and binary types are sent as they are,
+        and so are streamed responses, which are forwarded chunk by chunk.
+        Bodies of thread_size bytes or more are compressed in a worker thread to keep the event loop free.
+
+        :param app: ASGIApp: The application
+        :param minimum_size: int: Minimum size of the body to compress, compression_min_size by default
+        :param thread_size: int: Minimum size to compress off the event loop, compression_thread_size by default
+        """
+        self.app = app
+        self.minimum_size = config.compression_min_size if minimum_size is None else minimum_size
+        self.thread_size = config.compression_thread_size if thread_size is None else thread_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not config.compression_enabled:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Message | None = None
+        streaming = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, streaming
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] != "http.response.body" or streaming:
+                await send(message)
+            elif message.get("more_body", False):
+                streaming = True
+                await send(start)
+                await send(message)
+            else:
+                await self.send_body(scope["path"], start, message["body"], encoding, send)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def send_body(self, path: str, start: Message, body: bytes, encoding: str, send: Send) -> None:
+        headers = MutableHeaders(raw=start["headers"])
+        if (len(body) >= self.minimum_size and "content-encoding" not in headers
+                and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)):
+            headers.add_vary_header("Accept-Encoding")
+            compressed = precompressed.get(path, body, encoding)
+            if compressed is not None:
+                metrics.record(encoding, len(body), len(compressed), 0.0, precompressed=True)
+            else:
+                if len(body) >= self.thread_size:
+                    compressed, cpu_seconds = await asyncio.to_thread(compress, body, encoding)
+                else:
+                    compressed, cpu_seconds = compress(body, encoding)
+                metrics.record(encoding, len(body), len(compressed), cpu_seconds, precompressed=False)
+            if len(compressed) < len(body):
+                body = compressed
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                # the encoded body is a different representation
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+        await send(start)
+        await send({"type": "http.response.body", "body": body})
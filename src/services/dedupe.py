@@ -0,0 +1,139 @@
+import re
+import unicodedata
+from typing import Iterable, Iterator
+
+from src.conf.config import config
+
+NON_DIGITS = re.compile(r"\D")
+SPACES = re.compile(r"\s+")
+
+
+def normalize_email(email: str | None) -> str | None:
+    """
+    The normalize_email function lower-cases and trims the email.
+
+    :param email: str: The email
+    :return: The normalized email, or None for an empty value
+    """
+    email = (email or "").strip().lower()
+    return email or None
+
+
+def normalize_phone(phone: str | None, country_code: str | None = None,
+                    national_length: int | None = None) -> str | None:
+    """
+    The normalize_phone function converts a phone number to E.164 (+ and up to 15 digits).
+    Numbers in the national format get the default country code: with the trunk prefix (leading 0),
+    or without it when they have exactly the length of a national number. Other numbers are taken
+    as international numbers written without the +.
+
+    :param phone: str: The phone number as entered
+    :param country_code: str: Country code for national numbers, default_phone_country_code by default
+    :param national_length: int: Digits of a national number without the trunk prefix,
+        default_phone_national_length by default
+    :return: The E.164 number, or None if the value is not a phone number
+    """
+    if not phone:
+        return None
+    country_code = country_code or config.default_phone_country_code
+    national_length = national_length or config.default_phone_national_length
+    phone = phone.strip()
+    digits = NON_DIGITS.sub("", phone)
+    if phone.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = country_code + digits[1:]
+    elif len(digits) == national_length:
+        digits = country_code + digits
+    if not 8 <= len(digits) <= 15:
+        return None
+    return "+" + digits
+
+
+def fold_name(*parts: str | None) -> str | None:
+    """
+    The fold_name function builds the name key: accents removed, case folded, whitespace collapsed
+    and the words sorted, so "Stark  Tony" and "tony stark" get the same key.
+
+    :param parts: str: Name, surname
+    :return: The name key, or None for an empty name
+    """
+    text = unicodedata.normalize("NFKD", " ".join(part for part in parts if part))
+    text = "".join(char for char in text if not unicodedata.combining(char)).casefold()
+    words = sorted(SPACES.split(text.strip()))
+    return " ".join(words)[:300] or None
+
+
+def normalize_contact(contact) -> None:
+    """
+    The normalize_contact function fills the normalized columns of the contact from its fields.
+
+    :param contact: Contact: The contact
+    :return: None
+    """
+    contact.email_normalized = normalize_email(contact.email)
+    contact.phone_e164 = normalize_phone(contact.phone)
+    contact.name_key = fold_name(contact.name, contact.surname)
+
+
+def person_key(name_key: str | None, bd: str | None) -> str | None:
+    """
+    The person_key function builds the blocking key of a name: the name key is only a match together with
+    the birthday, since many different people share a name.
+
+    :param name_key: str: The name key of the contact
+    :param bd: str: The birthday of the contact
+    :return: The key, or None if the name or the birthday is missing
+    """
+    if not name_key or not bd:
+        return None
+    return f"{name_key}|{bd.strip()}"
+
+
+class ClusterStream:
+    def __init__(self):
+        """
+        Groups contacts from rows of (key, id) sorted by key: a group is complete, and is returned,
+        as soon as the key changes, so only the ids of the current key are held. Contacts sharing several keys
+        (the email and the phone) would be reported once per key, so the groups already reported are remembered;
+        there are as many of them as duplicates, not as contacts.
+        """
+        self.key = None
+        self.ids: list[int] = []
+        self.reported: set[tuple[int, ...]] = set()
+
+    def add(self, key, contact_id: int) -> list[int] | None:
+        cluster = self.close() if key != self.key else None
+        self.key = key
+        self.ids.append(contact_id)
+        return cluster
+
+    def close(self) -> list[int] | None:
+        ids, self.ids = tuple(sorted(self.ids)), []
+        if len(ids) < 2 or ids in self.reported:
+            return None
+        self.reported.add(ids)
+        return list(ids)
+
+
+def find_clusters(rows: Iterable[tuple[object, int]]) -> Iterator[list[int]]:
+    """
+    The find_clusters function groups contacts that share a blocking key: the normalized email, the E.164 phone,
+    or the name key together with the birthday, never a bare name, which would group every namesake together.
+    The rows must be sorted by key, as the database returns them, and each group is yielded as soon as its key
+    is complete. A contact sharing its email with one contact and its phone with another is in both groups:
+    the groups are not joined transitively, which would need every key in memory until the last row.
+
+    :param rows: Iterable[tuple]: Rows of (key, id) sorted by key
+    :return: The clusters of duplicate candidates, as sorted lists of contact ids
+    """
+    clusters = ClusterStream()
+    for key, contact_id in rows:
+        cluster = clusters.add(key, contact_id)
+        if cluster:
+            yield cluster
+    cluster = clusters.close()
+    if cluster:
+        yield cluster
@@ -1,25 +1,38 @@
+import functools
+import logging
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
 from pydantic import EmailStr
 
 from src.services.auth import auth_service
 from src.conf.config import config
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=config.mail_username,
-    MAIL_PASSWORD=config.mail_password,
-    MAIL_FROM=config.mail_from,
-    MAIL_PORT=config.mail_port,
-    MAIL_SERVER=config.mail_server,
-    MAIL_FROM_NAME="Register mail",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
+logger = logging.getLogger(__name__)
+
+
+@functools.cache
+def get_mail_config():
+    """
+    The get_mail_config function builds the mail connection settings on the first email sent:
+    fastapi_mail and its dependencies are imported only then, not when the application starts.
+
+    :return: The ConnectionConfig of fastapi_mail
+    """
+    from fastapi_mail import ConnectionConfig
+
+    return ConnectionConfig(
+        MAIL_USERNAME=config.mail_username,
+        MAIL_PASSWORD=config.mail_password,
+        MAIL_FROM=config.mail_from,
+        MAIL_PORT=config.mail_port,
+        MAIL_SERVER=config.mail_server,
+        MAIL_FROM_NAME="Register mail",
+        MAIL_STARTTLS=False,
+        MAIL_SSL_TLS=True,
+        USE_CREDENTIALS=True,
+        VALIDATE_CERTS=True,
+        TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
+    )
 
 
 async def send_email(email: EmailStr, username: str, host: str):
@@ -36,6 +49,9 @@ async def send_email(email: EmailStr, username: str, host: str):
     :return: A coroutine object
     :doc-author: Trelent
     """
+    from fastapi_mail import FastMail, MessageSchema, MessageType
+    from fastapi_mail.errors import ConnectionErrors
+
     try:
         token_verification = auth_service.create_email_token({"sub": email})
         message = MessageSchema(
@@ -45,7 +61,8 @@ async def send_email(email: EmailStr, username: str, host: str):
             subtype=MessageType.html
         )
 
-        fm = FastMail(conf)
+        fm = FastMail(get_mail_config())
         await fm.send_message(message, template_name="email_template.html")
     except ConnectionErrors as err:
-        print(err)
\ No newline at end of file
+        logger.error("Failed to send the email to %s: %s", email, err)
+        raise
\ No newline at end of file
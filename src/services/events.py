@@ -0,0 +1,160 @@
+import asyncio
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from src.conf.config import config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class Event:
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class UserUpdated(Event):
+    user_id: int
+    email: str
+
+
+@dataclass(frozen=True, slots=True)
+class ContactChanged(Event):
+    contact_id: int
+    user_id: int
+    action: str
+
+
+Handler = Callable[[Event], Awaitable[None]]
+
+
+class Subscription:
+    def __init__(self, event_type: type[Event], handler: Handler, workers: int):
+        self.event_type = event_type
+        self.handler = handler
+        self.workers = workers
+        self.queue: asyncio.Queue | None = None
+        self.tasks: list[asyncio.Task] = []
+
+    @property
+    def name(self) -> str:
+        return f"{self.event_type.__name__}:{getattr(self.handler, '__name__', 'handler')}"
+
+
+class EventBus:
+    def __init__(self, queue_size: int, publish_timeout: float):
+        """
+        In-process bus for the side effects of the writes: the repositories publish events after their commit
+        and the subscribers handle them in background tasks, so a new side effect adds no latency to the request.
+        Every subscription has its own bounded queue and workers: a slow subscriber does not delay the others,
+        and when its queue is full the publisher waits up to publish_timeout, then the event is dropped and counted.
+        Events are not persisted: the ones still queued when the process dies are lost.
+
+        :param queue_size: int: Maximum number of events waiting per subscription
+        :param publish_timeout: float: Maximum number of seconds publish waits for room in a full queue
+        """
+        self.queue_size = queue_size
+        self.publish_timeout = publish_timeout
+        self.subscriptions: list[Subscription] = []
+        self.running = False
+        self.counters: dict[str, Counter] = {}
+
+    def subscribe(self, event_type: type[Event], handler: Handler, workers: int = 1) -> None:
+        """
+        The subscribe function registers a handler for the events of a type and of its subclasses.
+
+        :param event_type: type[Event]: The type of the events to handle
+        :param handler: Handler: The coroutine function called with each event
+        :param workers: int: Number of events of this subscription handled concurrently
+        :return: None
+        """
+        subscription = Subscription(event_type, handler, workers)
+        self.subscriptions.append(subscription)
+        if self.running:
+            self._start(subscription)
+
+    def start(self) -> None:
+        """
+        The start function creates the queues and the workers. Before it, and after stop, events are not delivered.
+
+        :return: None
+        """
+        self.running = True
+        for subscription in self.subscriptions:
+            self._start(subscription)
+
+    def _start(self, subscription: Subscription) -> None:
+        subscription.queue = asyncio.Queue(self.queue_size)
+        subscription.tasks = [asyncio.create_task(self._work(subscription)) for _ in range(subscription.workers)]
+
+    async def stop(self, timeout: float) -> None:
+        """
+        The stop function stops accepting events, lets the workers finish the queued ones and then stops them.
+
+        :param timeout: float: Maximum number of seconds to wait for the queues to drain
+        :return: None
+        """
+        self.running = False
+        queues = [subscription.queue.join() for subscription in self.subscriptions if subscription.queue is not None]
+        try:
+            await asyncio.wait_for(asyncio.gather(*queues), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Event queues not drained after %s s", timeout)
+        for subscription in self.subscriptions:
+            for task in subscription.tasks:
+                task.cancel()
+            await asyncio.gather(*subscription.tasks, return_exceptions=True)
+            subscription.tasks = []
+            subscription.queue = None
+
+    async def publish(self, event: Event) -> None:
+        """
+        The publish function queues the event for each subscription of its type.
+        It returns at once unless a queue is full, see the backpressure in EventBus.
+
+        :param event: Event: The event to publish
+        :return: None
+        """
+        if not self.running:
+            return
+        for subscription in self.subscriptions:
+            if not isinstance(event, subscription.event_type):
+                continue
+            counter = self.counters.setdefault(subscription.name, Counter())
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                try:
+                    await asyncio.wait_for(subscription.queue.put(event), self.publish_timeout)
+                except asyncio.TimeoutError:
+                    counter["dropped"] += 1
+                    logger.warning("Event queue of %s is full, %s dropped", subscription.name, event)
+                    continue
+            counter["published"] += 1
+
+    async def _work(self, subscription: Subscription) -> None:
+        while True:
+            event = await subscription.queue.get()
+            try:
+                await subscription.handler(event)
+                self.counters[subscription.name]["handled"] += 1
+            except Exception:
+                self.counters[subscription.name]["failed"] += 1
+                logger.exception("Handler %s failed on %s", subscription.name, event)
+            finally:
+                subscription.queue.task_done()
+
+    def snapshot(self) -> dict:
+        """
+        The snapshot function returns the counters and the queue lengths of the subscriptions, for the metrics.
+
+        :return: The published, handled, failed and dropped events and the queued ones per subscription
+        """
+        return {subscription.name: {**self.counters.get(subscription.name, {}),
+                                    "queued": subscription.queue.qsize() if subscription.queue else 0}
+                for subscription in self.subscriptions}
+
+
+bus = EventBus(config.event_queue_size, config.event_publish_timeout)
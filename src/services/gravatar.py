@@ -0,0 +1,25 @@
+GRAVATAR_URL = "https://www.gravatar.com/avatar/{hash}"
+
+
+def email_hash(email: str) -> str:
+    """
+    The email_hash function returns the Gravatar hash of the email: md5 of the lower-cased and stripped address.
+
+    :param email: str: The email of the user
+    :return: The hex digest used by Gravatar
+    """
+    from libgravatar import md5_hash, sanitize_email
+
+    return md5_hash(sanitize_email(email))
+
+
+def gravatar_url(email: str) -> str:
+    """
+    The gravatar_url function builds the Gravatar image url of the email, the same url as Gravatar(email).get_image().
+    It is called lazily when a user without an uploaded avatar is serialized, never inside the signup transaction.
+    The url is only the hash of the email, so there is nothing worth caching.
+
+    :param email: str: The email of the user
+    :return: The url of the Gravatar image
+    """
+    return GRAVATAR_URL.format(hash=email_hash(email))
@@ -0,0 +1,202 @@
+import abc
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable
+
+from fastapi import HTTPException, status
+from redis.exceptions import RedisError
+
+from src.conf.config import config
+from src.database.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Deletes the lock only if it is still held with the given token.
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class IdempotencyStore(abc.ABC):
+    """
+    Storage of the first responses to requests with an Idempotency-Key and of the locks of the running requests.
+    """
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> str | None:
+        """
+        Return the stored response record.
+
+        :param key: str: The record key
+        :return: The record, or None
+        """
+
+    @abc.abstractmethod
+    async def put(self, key: str, record: str, ttl: int) -> None:
+        """
+        Store the response record.
+
+        :param key: str: The record key
+        :param record: str: The record
+        :param ttl: int: Seconds to keep the record
+        """
+
+    @abc.abstractmethod
+    async def acquire(self, key: str, ttl: int) -> str | None:
+        """
+        Take the lock if nobody holds it.
+
+        :param key: str: The lock key
+        :param ttl: int: Seconds after which the lock is released anyway
+        :return: The lock token, or None if the lock is held
+        """
+
+    @abc.abstractmethod
+    async def release(self, key: str, token: str) -> None:
+        """
+        Release the lock taken with the token.
+
+        :param key: str: The lock key
+        :param token: str: The token returned by acquire
+        """
+
+
+class RedisIdempotencyStore(IdempotencyStore):
+    def __init__(self):
+        self._release = None
+
+    async def get(self, key: str) -> str | None:
+        record = await get_redis().get(key)
+        return record.decode() if record is not None else None
+
+    async def put(self, key: str, record: str, ttl: int) -> None:
+        await get_redis().set(key, record, ex=ttl)
+
+    async def acquire(self, key: str, ttl: int) -> str | None:
+        token = uuid.uuid4().hex
+        return token if await get_redis().set(key, token, ex=ttl, nx=True) else None
+
+    async def release(self, key: str, token: str) -> None:
+        if self._release is None:
+            self._release = get_redis().register_script(RELEASE_SCRIPT)
+        await self._release(keys=[key], args=[token])
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    def __init__(self):
+        """
+        Store in the memory of the process, for tests and single process development setups.
+        """
+        self._values: dict[str, tuple[str, float]] = {}
+
+    def _get(self, key: str) -> str | None:
+        value = self._values.get(key)
+        if value is None or value[1] < time.time():
+            return None
+        return value[0]
+
+    async def get(self, key: str) -> str | None:
+        return self._get(key)
+
+    async def put(self, key: str, record: str, ttl: int) -> None:
+        self._values[key] = (record, time.time() + ttl)
+
+    async def acquire(self, key: str, ttl: int) -> str | None:
+        if self._get(key) is not None:
+            return None
+        token = uuid.uuid4().hex
+        self._values[key] = (token, time.time() + ttl)
+        return token
+
+    async def release(self, key: str, token: str) -> None:
+        if self._get(key) == token:
+            del self._values[key]
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    """
+    The get_idempotency_store function creates the store selected by the idempotency_backend setting.
+
+    :return: The idempotency store
+    """
+    if config.idempotency_backend == "memory":
+        return MemoryIdempotencyStore()
+    if config.idempotency_backend == "redis":
+        return RedisIdempotencyStore()
+    raise ValueError(f"Unknown idempotency backend: {config.idempotency_backend}")
+
+
+store = get_idempotency_store()
+
+
+def fingerprint(*parts: str) -> str:
+    """
+    The fingerprint function identifies the request, so a key reused for a different request can be rejected.
+
+    :param parts: str: Method, path, body and so on
+    :return: The sha256 hex digest of the parts
+    """
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+async def run_idempotent(scope: str, key: str, request_fingerprint: str,
+                         fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+    """
+    The run_idempotent function executes fn once per scope and Idempotency-Key.
+    The first successful result is stored for idempotency_ttl seconds and returned to the retries
+    without executing fn again. A concurrent duplicate waits for the first request to finish,
+    and gets 409 Conflict if it takes longer than idempotency_wait seconds.
+    A failed request stores nothing, so it can be retried. If the store is unavailable fn is simply executed.
+
+    :param scope: str: Scope of the key, the user id, so keys of different users never collide
+    :param key: str: The Idempotency-Key header
+    :param request_fingerprint: str: The fingerprint of the request
+    :param fn: Callable[[], Awaitable[Any]]: Executes the request and returns a JSON serializable result
+    :return: The result and True if it was replayed
+    """
+    record_key = f"idem:{scope}:{key}"
+    lock_key = f"idem-lock:{scope}:{key}"
+    try:
+        deadline = time.monotonic() + config.idempotency_wait
+        while True:
+            token = await store.acquire(lock_key, config.idempotency_lock_ttl)
+            # checked under the lock too, the holder may have finished between the two calls
+            record = await store.get(record_key)
+            if record is not None:
+                if token is not None:
+                    await store.release(lock_key, token)
+                record = json.loads(record)
+                if record["fingerprint"] != request_fingerprint:
+                    raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                        detail="Idempotency-Key was used for a different request")
+                return record["result"], True
+            if token is not None:
+                break
+            if time.monotonic() > deadline:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                    detail="A request with this Idempotency-Key is in progress")
+            await asyncio.sleep(0.05)
+    except (RedisError, OSError) as err:
+        logger.warning("Idempotency store is unavailable: %s", err)
+        return await fn(), False
+
+    try:
+        result = await fn()
+        try:
+            await store.put(record_key, json.dumps({"fingerprint": request_fingerprint, "result": result}),
+                            config.idempotency_ttl)
+        except (RedisError, OSError) as err:
+            logger.warning("Idempotency store is unavailable: %s", err)
+        return result, False
+    finally:
+        try:
+            await store.release(lock_key, token)
+        except (RedisError, OSError):
+            pass
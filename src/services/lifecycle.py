@@ -0,0 +1,141 @@
+import asyncio
+import functools
+import logging
+import signal
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.database.db import sessionmanager
+from src.database.models import User
+from src.database.redis import get_redis
+from src.repository import contacts as repository_contacts
+from src.repository import stats as repository_stats
+from src.repository import users as repository_users
+
+logger = logging.getLogger(__name__)
+
+
+class Lifecycle:
+    def __init__(self):
+        """
+        State of the application for the health checks: ready once the startup is done,
+        draining from the termination signal on, plus the number of requests in progress.
+        """
+        self.ready = False
+        self.draining = False
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def request_started(self) -> None:
+        self.in_flight += 1
+        self._idle.clear()
+
+    def request_finished(self) -> None:
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        The drain function stops reporting ready and waits for the requests in progress to finish,
+        including the background tasks that run after their responses.
+
+        :param timeout: float: Maximum number of seconds to wait
+        :return: True if all the requests finished in time
+        """
+        self.draining = True
+        self.ready = False
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%d requests still running after %s s", self.in_flight, timeout)
+            return False
+        return True
+
+    def delay_server_exit(self, server_class: type, delay: float) -> None:
+        """
+        The delay_server_exit function wraps the exit handler of the uvicorn server (Server.handle_exit): on SIGTERM
+        the application reports not ready at once, so the load balancer stops routing to it, and the server is told
+        to stop after delay seconds. A second signal, or one before the startup is done, stops it at once.
+        uvicorn 0.23 registers the bound handle_exit with loop.add_signal_handler after it imported the application,
+        so the class must be wrapped before the server starts: when main is imported, or by serve.py.
+
+        :param server_class: type: The uvicorn Server class
+        :param delay: float: Seconds between the signal and the shutdown of the server
+        :return: None
+        """
+        handle_exit = server_class.handle_exit
+        if delay <= 0 or getattr(handle_exit, "delays_exit", False):
+            return
+        lifecycle = self
+
+        @functools.wraps(handle_exit)
+        def delayed_exit(server, sig, frame):
+            if sig != signal.SIGTERM or lifecycle.draining or not lifecycle.ready:
+                return handle_exit(server, sig, frame)
+            lifecycle.draining = True
+            lifecycle.ready = False
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return handle_exit(server, sig, frame)
+            loop.call_soon_threadsafe(loop.call_later, delay, handle_exit, server, sig, frame)
+
+        delayed_exit.delays_exit = True
+        server_class.handle_exit = delayed_exit
+
+lifecycle = Lifecycle()
+
+
+class InFlightMiddleware:
+    def __init__(self, app: ASGIApp):
+        """
+        Counts the HTTP requests in progress, from the first byte received to the end of the background tasks.
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        lifecycle.request_started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lifecycle.request_finished()
+
+
+async def warm_up_session() -> None:
+    # the most frequent queries, so their SQL is compiled and, on PostgreSQL, prepared on the connection
+    # not sessionmanager.session(): it would swallow the errors, they are logged by the caller
+    nobody = User(id=0, email="")
+    async with sessionmanager.session_maker() as session:
+        await repository_users.get_user_by_email(nobody.email, session)
+        await repository_contacts.get_contacts(10, 0, session, nobody)
+        await repository_contacts.get_contact(0, session, nobody)
+        await repository_stats.get_stats(session, nobody.id)
+        await repository_stats.count_contacts(session, nobody.id)
+
+
+async def warm_up_database(connections: int) -> None:
+    """
+    The warm_up_database function opens the connections of the pool and runs the hot queries on each of them,
+    so the first requests do not pay for the connection setup and the statement compilation.
+    The sessions are held concurrently, so each of them gets its own connection.
+
+    :param connections: int: Number of connections to open
+    :return: None
+    """
+    await asyncio.gather(*(warm_up_session() for _ in range(connections)))
+
+
+async def warm_up_redis(connections: int) -> None:
+    """
+    The warm_up_redis function opens the connections of the shared Redis client with concurrent PINGs.
+
+    :param connections: int: Number of connections to open
+    :return: None
+    """
+    client = get_redis()
+    await asyncio.gather(*(client.ping() for _ in range(connections)))
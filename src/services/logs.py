@@ -0,0 +1,159 @@
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import uuid
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+request_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("request_id", default=None)
+
+VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._-]{1,128}")
+# attributes of every LogRecord, the others were passed with extra= and are added to the JSON object
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        The format function renders the record as one JSON object per line, with the request id and the extra fields.
+
+        :param self: Represent the instance of the class
+        :param record: logging.LogRecord: The record to render
+        :return: The JSON line
+        """
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            record.exc_text = record.exc_text or self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate: float):
+        """
+        Keeps only a fraction of the DEBUG records, the high-volume ones; the other levels always pass.
+
+        :param rate: float: Fraction of the DEBUG records to keep, from 0 to 1
+        """
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        The prepare function runs in the thread that logs: it stamps the record with the request id of the current
+        context and resolves the message, so the arguments are not read later from another thread.
+        The JSON rendering and the write are left to the writer thread.
+
+        :param self: Represent the instance of the class
+        :param record: logging.LogRecord: The record to enqueue
+        :return: The record to put on the queue
+        """
+        record.request_id = request_id.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def setup_logging(level: str = "INFO", json_format: bool = True, debug_sample_rate: float = 1.0) -> None:
+    """
+    The setup_logging function sends the records of the root logger, and of uvicorn, through a queue to a writer
+    thread, so logging never blocks the event loop on stdout.
+    A logger call below the level is rejected by the level check before any record is created, so the disabled
+    debug calls on the hot paths cost next to nothing; they must pass their arguments lazily (%s), not as f-strings.
+
+    :param level: str: Level of the root logger
+    :param json_format: bool: Write JSON lines, or plain text
+    :param debug_sample_rate: float: Fraction of the DEBUG records to keep
+    :return: None
+    """
+    global _listener
+    stop_logging()
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if json_format else logging.Formatter(
+        "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+    records = queue.SimpleQueue()
+    handler = ContextQueueHandler(records)
+    handler.addFilter(SamplingFilter(debug_sample_rate))
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        server_logger = logging.getLogger(name)
+        server_logger.handlers.clear()
+        server_logger.propagate = True
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """
+    The stop_logging function writes the queued records and stops the writer thread.
+
+    :return: None
+    """
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
+
+
+class RequestIdMiddleware:
+    def __init__(self, app: ASGIApp):
+        """
+        Gives every HTTP request an id, taken from a valid X-Request-ID header or generated, that is added to its
+        log records and returned in the X-Request-ID response header.
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        value = None
+        for name, header in scope["headers"]:
+            if name == b"x-request-id":
+                value = header.decode("latin-1")
+                break
+        if value is None or not VALID_REQUEST_ID.fullmatch(value):
+            value = uuid.uuid4().hex
+        token = request_id.set(value)
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-ID"] = value
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
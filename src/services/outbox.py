@@ -0,0 +1,188 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Awaitable, Callable
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import Session
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.database.models import OutboxMessage
+from src.repository.outbox import claim_messages, delete_messages, postpone_message
+
+logger = logging.getLogger(__name__)
+
+# the delay before the next attempt doubles with every failure, up to this many seconds
+MAX_RETRY_DELAY = 300
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class OutboxRelay:
+    def __init__(self, batch_size: int, interval: float, concurrency: int, max_attempts: int, lease: float,
+                 session_maker: async_sessionmaker | None = None):
+        """
+        The OutboxRelay delivers the messages of the outbox table to the handlers of their topics.
+        A batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED and leased for lease seconds in a short transaction,
+        delivered with up to concurrency handlers at once outside of any transaction, so no lock or pooled
+        connection is held while the handlers wait on the network, then the delivered messages are deleted and the
+        failed ones postponed in a second short transaction.
+        A full batch is followed by the next one at once; otherwise the relay waits for a commit that wrote to the
+        outbox or for interval seconds. Delivery is at least once: a handler may see a message again when the
+        process dies before the end of its batch, or when a delivery outlasts the lease,
+        so the handlers must tolerate duplicates.
+
+        :param batch_size: int: Number of messages claimed per transaction
+        :param interval: float: Maximum number of seconds between two polls of the outbox
+        :param concurrency: int: Number of messages of a batch delivered concurrently
+        :param max_attempts: int: Messages that failed this many times are kept in the table and no longer delivered
+        :param lease: float: Seconds a claimed batch is hidden from the other relays, longer than a delivery takes
+        :param session_maker: async_sessionmaker: The factory of the sessions, the application database by default
+        """
+        self.batch_size = batch_size
+        self.interval = interval
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self._session_maker = session_maker
+        self.handlers: dict[str, Handler] = {}
+        self.counters = Counter()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    @property
+    def session_maker(self) -> async_sessionmaker:
+        return self._session_maker or sessionmanager.session_maker
+
+    def handle(self, topic: str, handler: Handler) -> None:
+        """
+        The handle function registers the coroutine function that delivers the messages of a topic.
+        The handler raises to have the message retried later.
+
+        :param topic: str: The topic of the messages
+        :param handler: Handler: The coroutine function called with the payload of each message
+        :return: None
+        """
+        self.handlers[topic] = handler
+
+    def notify(self) -> None:
+        """
+        The notify function wakes up the relay, so a committed message does not wait for the next poll. It does no I/O.
+
+        :return: None
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _deliver(self, message: OutboxMessage, semaphore: asyncio.Semaphore) -> bool:
+        handler = self.handlers.get(message.topic)
+        if handler is None:
+            logger.error("No handler for the outbox topic %s", message.topic)
+            return False
+        async with semaphore:
+            try:
+                await handler(message.payload)
+            except Exception:
+                logger.exception("Delivery of outbox message %d (%s) failed", message.id, message.topic)
+                return False
+        return True
+
+    async def relay_batch(self) -> int:
+        """
+        The relay_batch function claims one batch of due messages, delivers it and records the outcome.
+
+        :return: The number of claimed messages, delivered or not
+        """
+        async with self.session_maker() as session:
+            messages = await claim_messages(self.batch_size, self.max_attempts, self.lease, session)
+            # read after the commit, without reloading
+            session.expunge_all()
+            await session.commit()
+        if not messages:
+            return 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*(self._deliver(message, semaphore) for message in messages))
+        async with self.session_maker() as session:
+            await delete_messages([message.id for message, delivered in zip(messages, results) if delivered], session)
+            for message, delivered in zip(messages, results):
+                if not delivered:
+                    await postpone_message(message.id, min(2 ** message.attempts, MAX_RETRY_DELAY), session)
+                    if message.attempts + 1 >= self.max_attempts:
+                        logger.error("Outbox message %d (%s) given up after %d attempts",
+                                     message.id, message.topic, message.attempts + 1)
+                        self.counters["given_up"] += 1
+            await session.commit()
+        self.counters["batches"] += 1
+        self.counters["delivered"] += sum(results)
+        self.counters["failed"] += len(results) - sum(results)
+        return len(messages)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                while not self._stopping and await self.relay_batch() == self.batch_size:
+                    pass
+            except Exception as err:
+                logger.error("Outbox relay failed: %s", err)
+
+    def start(self) -> None:
+        """
+        The start function starts the relay task. It must be called from the running event loop.
+        The messages left by a previous run, or committed by another process, are delivered too.
+
+        :return: None
+        """
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float) -> None:
+        """
+        The stop function lets the batch in progress finish, then stops the relay task.
+        The messages not delivered yet stay in the outbox for the next start; those of a batch cut short by the timeout
+        are delivered again once their lease expires.
+
+        :param timeout: float: Maximum number of seconds to wait for the batch in progress
+        :return: None
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Outbox relay stopped in the middle of a batch after %s s", timeout)
+        self._task = None
+        self._wakeup = None
+
+    def snapshot(self) -> dict:
+        """
+        The snapshot function returns the counters of the relay, for the metrics.
+
+        :return: The batches, the delivered, failed and given up messages
+        """
+        return dict(self.counters)
+
+
+relay = OutboxRelay(config.outbox_batch_size, config.outbox_interval, config.outbox_concurrency,
+                    config.outbox_max_attempts, config.outbox_lease)
+
+
+@event.listens_for(Session, "after_commit")
+def notify_relay(session: Session) -> None:
+    if session.info.pop("outbox", False):
+        relay.notify()
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_messages(session: Session) -> None:
+    session.info.pop("outbox", None)
@@ -0,0 +1,194 @@
+import asyncio
+import collections
+import itertools
+import random
+import secrets
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.conf.config import config
+from src.services.logs import request_id
+
+PROFILE_HEADER = b"x-profile-token"
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({code.co_filename}:{code.co_firstlineno})"
+
+
+def task_stack(task: asyncio.Task, running_frame) -> tuple[str, ...]:
+    """
+    The task_stack function returns the logical stack of a request task, from its coroutine to the innermost call.
+    When the task is running, the stack is the one of the event loop thread, so the synchronous calls are included;
+    when it is suspended, it is the chain of the awaited coroutines, ending with [await]: waiting for the database,
+    Redis, a lock or a thread.
+
+    :param task: asyncio.Task: The task of the request
+    :param running_frame: The current frame of the event loop thread if the task is running, else None
+    :return: The frame names, outermost first
+    """
+    coro = task.get_coro()
+    if running_frame is not None:
+        names = []
+        frame = running_frame
+        while frame is not None:
+            names.append(frame_name(frame))
+            if frame is coro.cr_frame:
+                break
+            frame = frame.f_back
+        return tuple(reversed(names))
+    names = []
+    awaitable = coro
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "ag_frame", None) \
+            or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        names.append(frame_name(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "ag_await", None) \
+            or getattr(awaitable, "gi_yieldfrom", None)
+    names.append("[await]")
+    return tuple(names)
+
+
+@dataclass
+class Profile:
+    id: int
+    method: str
+    path: str
+    request_id: str | None
+    started_at: float
+    duration: float = 0.0
+    status: int | None = None
+    samples: collections.Counter = field(default_factory=collections.Counter)
+
+    def summary(self) -> dict:
+        return {"id": self.id, "method": self.method, "path": self.path, "request_id": self.request_id,
+                "started_at": self.started_at, "duration": self.duration, "status": self.status,
+                "samples": sum(self.samples.values())}
+
+    def collapsed(self) -> str:
+        """
+        The collapsed function renders the samples in the collapsed stack format, one "frame;frame;frame count"
+        line per distinct stack, read by flamegraph.pl, speedscope and most flamegraph viewers.
+
+        :param self: Represent the instance of the class
+        :return: The collapsed stacks
+        """
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.samples.most_common())
+
+
+class Profiler:
+    def __init__(self):
+        """
+        Statistical, async-aware profiler of requests, driven by the admin endpoints.
+        While armed, a sampled fraction of the requests whose path starts with path_prefix, and every request that
+        carries the X-Profile-Token header with the current token, are profiled: a sampler thread records the
+        logical stack of their tasks every profiling_interval seconds. The thread runs only while a request is being
+        profiled, at most profiling_max_concurrent requests are profiled at once, and the last
+        profiling_max_profiles profiles are kept in memory, per worker process.
+        Code that runs in the thread pool, such as the sync endpoints, shows as [await] in the calling task.
+        """
+        self.armed = False
+        self.sample_rate = 0.0
+        self.path_prefix = "/"
+        self.token: str | None = None
+        self.active: dict[asyncio.Task, Profile] = {}
+        self.profiles: collections.deque[Profile] = collections.deque(maxlen=config.profiling_max_profiles)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def arm(self, sample_rate: float, path_prefix: str) -> None:
+        self.sample_rate = sample_rate
+        self.path_prefix = path_prefix
+        self.token = secrets.token_urlsafe(16)
+        self.armed = True
+
+    def disarm(self) -> None:
+        self.armed = False
+        self.token = None
+
+    def get(self, profile_id: int) -> Profile | None:
+        return next((profile for profile in self.profiles if profile.id == profile_id), None)
+
+    def should_profile(self, scope: Scope) -> bool:
+        if len(self.active) >= config.profiling_max_concurrent:
+            return False
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return self.token is not None and secrets.compare_digest(value, self.token.encode())
+        return scope["path"].startswith(self.path_prefix) and random.random() < self.sample_rate
+
+    def start(self, scope: Scope) -> Profile:
+        """
+        The start function profiles the current task from now on, starting the sampler thread if needed.
+
+        :param self: Represent the instance of the class
+        :param scope: Scope: The scope of the request
+        :return: The profile being recorded
+        """
+        profile = Profile(next(self._ids), scope["method"], scope["path"], request_id.get(), time.time())
+        task = asyncio.current_task()
+        with self._lock:
+            self.active[task] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True,
+                                                args=(asyncio.get_running_loop(), threading.get_ident()))
+                self._thread.start()
+        return profile
+
+    def stop(self, profile: Profile) -> None:
+        with self._lock:
+            self.active.pop(asyncio.current_task(), None)
+        profile.duration = time.time() - profile.started_at
+        self.profiles.append(profile)
+
+    def _sample(self, loop: asyncio.AbstractEventLoop, thread_id: int) -> None:
+        while True:
+            time.sleep(config.profiling_interval)
+            with self._lock:
+                if not self.active:
+                    self._thread = None
+                    return
+                active = list(self.active.items())
+            frame = sys._current_frames().get(thread_id)
+            running = asyncio.current_task(loop)
+            for task, profile in active:
+                try:
+                    profile.samples[task_stack(task, frame if task is running else None)] += 1
+                except (AttributeError, RuntimeError):
+                    # the task moved on while its stack was read
+                    continue
+
+
+profiler = Profiler()
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp):
+        """
+        Profiles the requests selected by the profiler. While the profiler is not armed it costs one attribute check.
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not profiler.armed or not profiler.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        profile = profiler.start(scope)
+
+        async def send_with_status(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            profiler.stop(profile)
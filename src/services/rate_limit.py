@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import math
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request, status
+from redis.exceptions import RedisError
+
+from src.conf.config import config
+from src.services.auth import auth_service
+from src.services.cache import Cache, cache as shared_cache
+
+logger = logging.getLogger(__name__)
+
+# Generic cell rate algorithm. The key holds the theoretical arrival time (TAT) in milliseconds.
+# KEYS[1] - limit key, ARGV[1] - emission interval (period / times), ARGV[2] - period, both in milliseconds.
+# Returns 0 if the request is allowed, otherwise the number of milliseconds to wait.
+GCRA_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local allow_at = tat + interval - period
+if now < allow_at then
+    return math.ceil(allow_at - now)
+end
+local new_tat = tat + interval
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+return 0
+"""
+
+
+def parse_rate(rate: str) -> tuple[int, int]:
+    """
+    The parse_rate function parses a rate setting like "10/60" (10 requests per 60 seconds).
+
+    :param rate: str: The rate setting
+    :return: The number of requests and the period in seconds
+    """
+    times, seconds = rate.split("/")
+    return int(times), int(seconds)
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_rate: float, max_keys: int = 10000):
+        """
+        In-process token buckets, one per key. They reject obvious floods without a Redis round-trip.
+        Only the max_keys most recently used keys are kept.
+
+        :param capacity: float: Maximum number of tokens (the allowed burst)
+        :param refill_rate: float: Tokens added per second
+        :param max_keys: int: Maximum number of tracked keys
+        """
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def acquire(self, key: str, now: float | None = None) -> bool:
+        """
+        The acquire function takes one token from the bucket of the key.
+
+        :param key: str: The key of the bucket
+        :param now: float: Current monotonic time, for tests
+        :return: True if a token was available
+        """
+        now = time.monotonic() if now is None else now
+        tokens, updated = self._buckets.pop(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * self.refill_rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed
+
+
+class RateLimit:
+    # After a Redis error only the in-process limit is applied for this many seconds
+    redis_retry_after = 5.0
+    _redis_down_until = 0.0
+    _script = None
+    cache: Cache = shared_cache
+
+    def __init__(self, rate: str, scope: str = "ip"):
+        """
+        Rate limit dependency. Every route gets its own limit: the key is built from the route, the method
+        and the client identity. The exact limit is checked in the cache: with the GCRA script in a single Redis call
+        when the cache is backed by Redis, with a counter per period otherwise. In front of it an in-process
+        token bucket with prefilter_factor times the rate rejects floods locally.
+        If Redis is unavailable only the in-process bucket is applied.
+
+        :param rate: str: The limit, like "10/60" for 10 requests per 60 seconds
+        :param scope: str: "ip" to limit per client address, "user" to limit per bearer token subject
+        """
+        self.times, self.seconds = parse_rate(rate)
+        self.scope = scope
+        factor = config.rate_limit_prefilter_factor
+        self.prefilter = TokenBucket(self.times * factor, self.times * factor / self.seconds)
+
+    def identity(self, request: Request) -> str:
+        """
+        The identity function returns the client identity for the limit key.
+        The user scope keys by the subject of the bearer token once its signature is verified, through the token
+        cache, so a repeated token costs a dict lookup. A forged or expired token is limited by the client address:
+        otherwise anyone could spend the limit of another user by sending unsigned tokens with their email.
+
+        :param request: Request: The request
+        :return: The identity of the client
+        """
+        if self.scope == "user":
+            authorization = request.headers.get("authorization", "")
+            if authorization.lower().startswith("bearer "):
+                payload = auth_service.verify_access_token(authorization[7:])
+                if payload is not None:
+                    return "user:" + hashlib.sha1(str(payload["sub"]).encode()).hexdigest()
+        return "ip:" + (request.client.host if request.client else "unknown")
+
+    async def check_redis(self, key: str) -> int:
+        """
+        The check_redis function checks the limit of the key in the cache.
+        Redis runs the GCRA script; the other caches count the requests of the current period,
+        which allows up to twice the rate across the boundary of two periods.
+
+        :param key: str: The limit key
+        :return: Milliseconds to wait, 0 if the request is allowed
+        """
+        client = self.cache.redis
+        if client is None:
+            now = time.time()
+            window = int(now // self.seconds)
+            if await self.cache.incr(f"{key}:{window}", ttl=self.seconds) <= self.times:
+                return 0
+            return math.ceil(((window + 1) * self.seconds - now) * 1000)
+        if RateLimit._script is None:
+            RateLimit._script = client.register_script(GCRA_SCRIPT)
+        period = self.seconds * 1000
+        return int(await RateLimit._script(keys=[key], args=[period / self.times, period]))
+
+    async def __call__(self, request: Request):
+        """
+        The __call__ function checks the limit for the request and raises 429 Too Many Requests if it is exceeded.
+
+        :param request: Request: The request
+        :return: None
+        :doc-author: Trelent
+        """
+        if not config.rate_limit_enabled:
+            return
+        route = request.scope.get("route")
+        key = f"rl:{request.method}:{getattr(route, 'path', request.url.path)}:{self.identity(request)}"
+        if not self.prefilter.acquire(key):
+            self.reject(math.ceil(1 / self.prefilter.refill_rate))
+        if time.monotonic() < RateLimit._redis_down_until:
+            return
+        try:
+            wait_ms = await self.check_redis(key)
+        except (RedisError, OSError) as err:
+            logger.warning("Rate limit falls back to in-process buckets: %s", err)
+            RateLimit._redis_down_until = time.monotonic() + self.redis_retry_after
+            return
+        if wait_ms:
+            self.reject(math.ceil(wait_ms / 1000))
+
+    @staticmethod
+    def reject(retry_after: int):
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many requests",
+                            headers={"Retry-After": str(retry_after)})
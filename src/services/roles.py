@@ -1,3 +1,4 @@
+import logging
 from typing import List
 
 from fastapi import Request, Depends, HTTPException, status
@@ -5,6 +6,8 @@ from fastapi import Request, Depends, HTTPException, status
 from src.database.models import Role, User
 from src.services.auth import auth_service
 
+logger = logging.getLogger(__name__)
+
 
 class RoleAccess:
     def __init__(self, allowed_roles: List[Role]):
@@ -34,7 +37,6 @@ class RoleAccess:
         :return: A function that takes a request and user as parameters
         :doc-author: Trelent
         """
-        print(user.role)
-        print(self.allowed_roles)
+        logger.debug("Role %s, allowed %s", user.role, self.allowed_roles)
         if user.role not in self.allowed_roles:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Operation forbidden")
\ No newline at end of file
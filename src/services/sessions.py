@@ -0,0 +1,167 @@
+import abc
+import math
+import time
+import uuid
+
+from src.conf.config import config
+from src.database.redis import get_redis
+
+# Replaces the current refresh token id of the session, only if the presented one is still current,
+# and rejects the access tokens the session was issued until now.
+# KEYS[1] - session key, KEYS[2] - not before key, ARGV[1] - email, ARGV[2] - presented jti, ARGV[3] - new jti,
+# ARGV[4] - refresh ttl in seconds, ARGV[5] - current time, ARGV[6] - access ttl in seconds
+ROTATE_SCRIPT = """
+local session = redis.call('HMGET', KEYS[1], 'email', 'jti')
+if session[1] ~= ARGV[1] or session[2] ~= ARGV[2] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'jti', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('SET', KEYS[2], ARGV[5], 'EX', ARGV[6])
+return 1
+"""
+
+
+def new_id() -> str:
+    return uuid.uuid4().hex
+
+
+class SessionStore(abc.ABC):
+    """
+    Store of the login sessions. A session (sid) is created on login and lives as long as its refresh token.
+    Every refresh rotates the refresh token id (jti) of the session, a refresh token that is not the current one
+    of its session is rejected. A rotation also rejects the access tokens issued to the session before it,
+    and a revocation all of them: the not before time of the session is remembered for the lifetime of the
+    access tokens.
+    """
+
+    @abc.abstractmethod
+    async def create(self, email: str, jti: str) -> str:
+        """
+        Create a session with its first refresh token id.
+
+        :param email: str: The email of the user
+        :param jti: str: The id of the refresh token
+        :return: The id of the session
+        """
+
+    @abc.abstractmethod
+    async def rotate(self, sid: str, email: str, jti: str, new_jti: str) -> bool:
+        """
+        Atomically replace the refresh token id of the session and reject its earlier access tokens.
+
+        :param sid: str: The id of the session
+        :param email: str: The email of the user the token was issued to
+        :param jti: str: The id of the presented refresh token
+        :param new_jti: str: The id of the new refresh token
+        :return: False if the session does not exist or the presented token is not its current one
+        """
+
+    @abc.abstractmethod
+    async def revoke(self, sid: str) -> None:
+        """
+        End the session and reject its access tokens.
+
+        :param sid: str: The id of the session
+        """
+
+    @abc.abstractmethod
+    async def not_before(self, sid: str) -> float:
+        """
+        Return the time before which the access tokens of the session were issued are rejected, in O(1).
+
+        :param sid: str: The id of the session
+        :return: The time of the last rotation, inf if the session was revoked, 0 if none of its tokens is rejected
+        """
+
+
+class RedisSessionStore(SessionStore):
+    def __init__(self, refresh_ttl: int, access_ttl: int):
+        """
+        Sessions in Redis: session:{sid} is a hash with the email and the current jti, expiring with the refresh
+        token; not_before:{sid} holds the time of the last rotation, or inf once the session is revoked,
+        until the last access token issued before it expires.
+
+        :param refresh_ttl: int: Lifetime of the refresh tokens in seconds
+        :param access_ttl: int: Lifetime of the access tokens in seconds
+        """
+        self.refresh_ttl = refresh_ttl
+        self.access_ttl = access_ttl
+        self._rotate = None
+
+    async def create(self, email: str, jti: str) -> str:
+        sid = new_id()
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.hset(f"session:{sid}", mapping={"email": email, "jti": jti})
+            pipe.expire(f"session:{sid}", self.refresh_ttl)
+            await pipe.execute()
+        return sid
+
+    async def rotate(self, sid: str, email: str, jti: str, new_jti: str) -> bool:
+        if self._rotate is None:
+            self._rotate = get_redis().register_script(ROTATE_SCRIPT)
+        return bool(await self._rotate(keys=[f"session:{sid}", f"not_before:{sid}"],
+                                       args=[email, jti, new_jti, self.refresh_ttl, time.time(),
+                                             self.access_ttl]))
+
+    async def revoke(self, sid: str) -> None:
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.delete(f"session:{sid}")
+            pipe.set(f"not_before:{sid}", "inf", ex=self.access_ttl)
+            await pipe.execute()
+
+    async def not_before(self, sid: str) -> float:
+        value = await get_redis().get(f"not_before:{sid}")
+        return float(value) if value is not None else 0.0
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self, refresh_ttl: int, access_ttl: int):
+        """
+        Sessions in the memory of the process, for tests and single process development setups.
+
+        :param refresh_ttl: int: Lifetime of the refresh tokens in seconds
+        :param access_ttl: int: Lifetime of the access tokens in seconds
+        """
+        self.refresh_ttl = refresh_ttl
+        self.access_ttl = access_ttl
+        self._sessions: dict[str, tuple[str, str, float]] = {}
+        # sid -> (not before, expiry of the entry)
+        self._not_before: dict[str, tuple[float, float]] = {}
+
+    async def create(self, email: str, jti: str) -> str:
+        sid = new_id()
+        self._sessions[sid] = (email, jti, time.time() + self.refresh_ttl)
+        return sid
+
+    async def rotate(self, sid: str, email: str, jti: str, new_jti: str) -> bool:
+        session = self._sessions.get(sid)
+        if session is None or session[2] < time.time() or session[:2] != (email, jti):
+            return False
+        now = time.time()
+        self._sessions[sid] = (email, new_jti, now + self.refresh_ttl)
+        self._not_before[sid] = (now, now + self.access_ttl)
+        return True
+
+    async def revoke(self, sid: str) -> None:
+        self._sessions.pop(sid, None)
+        self._not_before[sid] = (math.inf, time.time() + self.access_ttl)
+
+    async def not_before(self, sid: str) -> float:
+        not_before, expires_at = self._not_before.get(sid, (0.0, 0.0))
+        return not_before if expires_at > time.time() else 0.0
+
+
+def get_session_store() -> SessionStore:
+    """
+    The get_session_store function creates the session store selected by the session_backend setting.
+
+    :return: The session store
+    """
+    refresh_ttl = config.refresh_token_days * 24 * 3600
+    access_ttl = config.access_token_minutes * 60
+    if config.session_backend == "memory":
+        return MemorySessionStore(refresh_ttl, access_ttl)
+    if config.session_backend == "redis":
+        return RedisSessionStore(refresh_ttl, access_ttl)
+    raise ValueError(f"Unknown session backend: {config.session_backend}")
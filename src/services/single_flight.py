@@ -0,0 +1,49 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+# result of a call whose leader was cancelled: the waiters run the call again
+_LEADER_CANCELLED = object()
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Coalesces concurrent calls with the same key: the first caller runs the function,
+        the others wait for its result instead of repeating the work. Nothing is cached after the call completes.
+        """
+        self._calls: dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        The do function runs fn once per key at a time and returns its result to every concurrent caller.
+        An exception raised by fn is raised in every caller. When the caller running fn is cancelled, for example
+        because its client went away, only that caller is cancelled: one of the waiters runs fn in its place.
+
+        :param key: str: The key of the call
+        :param fn: Callable[[], Awaitable[Any]]: The coroutine function to run
+        :return: The result of fn
+        """
+        while (future := self._calls.get(key)) is not None:
+            result = await asyncio.shield(future)
+            if result is not _LEADER_CANCELLED:
+                return result
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_result(_LEADER_CANCELLED)
+            raise
+        except BaseException as err:
+            future.set_exception(err)
+            # the leader re-raises the error itself, waiters may not exist
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def __len__(self):
+        return len(self._calls)
@@ -0,0 +1,142 @@
+import abc
+import asyncio
+import io
+import os
+import tempfile
+from pathlib import Path
+
+from src.conf.config import config
+
+
+class StorageBackend(abc.ABC):
+    """
+    Interface of the file storages used for user avatars.
+    Every method that touches the network or the disk is a coroutine and never blocks the event loop.
+    """
+
+    @abc.abstractmethod
+    async def exists(self, name: str) -> bool:
+        """
+        Check whether a file with the given name is already stored.
+
+        :param name: str: Name of the file inside the storage
+        :return: True if the file exists
+        """
+
+    @abc.abstractmethod
+    async def save(self, name: str, data: bytes, content_type: str) -> str:
+        """
+        Store the file and return its public url.
+
+        :param name: str: Name of the file inside the storage
+        :param data: bytes: Content of the file
+        :param content_type: str: Mime type of the content
+        :return: The url of the stored file
+        """
+
+    @abc.abstractmethod
+    def url(self, name: str) -> str:
+        """
+        Build the public url of a stored file without touching the storage.
+
+        :param name: str: Name of the file inside the storage
+        :return: The url of the file
+        """
+
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: str, base_url: str):
+        """
+        Storage that keeps the files on the local disk, so avatars work without any network access.
+        The files are expected to be served as static files under base_url.
+
+        :param root: str: Directory for the files
+        :param base_url: str: Url prefix the directory is served from
+        """
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+
+    async def exists(self, name: str) -> bool:
+        return await asyncio.to_thread((self.root / name).exists)
+
+    async def save(self, name: str, data: bytes, content_type: str) -> str:
+        await asyncio.to_thread(self._write, self.root / name, data)
+        return self.url(name)
+
+    def url(self, name: str) -> str:
+        return f"{self.base_url}/{name}"
+
+    @staticmethod
+    def _write(path: Path, data: bytes) -> None:
+        """
+        Write the file atomically, so a concurrent reader never sees a partially written image.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_name, path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+
+
+class CloudinaryStorage(StorageBackend):
+    folder = "TODOApp"
+
+    def __init__(self, cloud_name: str, api_key: str, api_secret: str):
+        """
+        Storage on top of Cloudinary. The blocking SDK calls are run in a worker thread.
+        The rate limited Admin API is never called: exists only knows the files saved by this process,
+        and save uploads with overwrite=False, so a file that is already stored is kept and its url returned.
+
+        :param cloud_name: str: Cloudinary cloud name
+        :param api_key: str: Cloudinary api key
+        :param api_secret: str: Cloudinary api secret
+        """
+        import cloudinary
+
+        cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
+        self._saved: set[str] = set()
+
+    def _public_id(self, name: str) -> str:
+        return f"{self.folder}/{name.rsplit('.', 1)[0]}"
+
+    async def exists(self, name: str) -> bool:
+        return name in self._saved
+
+    async def save(self, name: str, data: bytes, content_type: str) -> str:
+        import cloudinary.uploader
+
+        r = await asyncio.to_thread(cloudinary.uploader.upload, io.BytesIO(data), public_id=self._public_id(name),
+                                    overwrite=False)
+        self._saved.add(name)
+        return r["secure_url"]
+
+    def url(self, name: str) -> str:
+        import cloudinary
+
+        return cloudinary.CloudinaryImage(self._public_id(name)).build_url()
+
+
+_storage: StorageBackend | None = None
+
+
+def get_storage() -> StorageBackend:
+    """
+    The get_storage function returns the storage selected by the avatar_storage setting.
+    The backend is created once on the first call.
+
+    :return: The configured storage backend
+    """
+    global _storage
+    if _storage is None:
+        if config.avatar_storage == "local":
+            _storage = LocalStorage(config.avatar_local_dir, config.avatar_base_url)
+        elif config.avatar_storage == "cloudinary":
+            _storage = CloudinaryStorage(config.cloudinary_name, config.cloudinary_api_key,
+                                         config.cloudinary_api_secret)
+        else:
+            raise ValueError(f"Unknown avatar storage: {config.avatar_storage}")
+    return _storage
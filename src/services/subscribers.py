@@ -0,0 +1,63 @@
+import logging
+
+from redis.exceptions import RedisError
+
+from src.services.auth import auth_service, hash_for_user
+from src.services.email import send_email
+from src.services.events import ContactChanged, EventBus, UserUpdated
+from src.services.outbox import OutboxRelay
+
+logger = logging.getLogger(__name__)
+
+
+async def send_confirmation_email(payload: dict) -> None:
+    """
+    The send_confirmation_email function sends the email with the confirmation link to a new user.
+    It is delivered from the outbox: a failure raises and the email is retried later.
+
+    :param payload: dict: The user.created message, with the user_id, email, username and host
+    :return: None
+    """
+    if payload["host"] is not None:
+        await send_email(payload["email"], payload["username"], payload["host"])
+
+
+def publish_to(bus: EventBus):
+    async def publish_contact_change(payload: dict) -> None:
+        await bus.publish(ContactChanged(**payload))
+
+    return publish_contact_change
+
+
+async def invalidate_user_cache(event: UserUpdated) -> None:
+    """
+    The invalidate_user_cache function removes the cached copy of a changed user, so the next request reads
+    the confirmed flag and the avatar from the database instead of the stale copy.
+
+    :param event: UserUpdated: The change of the user
+    :return: None
+    """
+    try:
+        await auth_service.cache.delete(hash_for_user(event.email))
+    except (RedisError, OSError) as err:
+        logger.warning("User cache is unavailable: %s", err)
+
+
+async def log_contact_change(event: ContactChanged) -> None:
+    logger.info("Contact %d %s", event.contact_id, event.action,
+                extra={"contact_id": event.contact_id, "user_id": event.user_id, "action": event.action})
+
+
+def register(bus: EventBus, relay: OutboxRelay) -> None:
+    """
+    The register function subscribes the side effects of the writes: the ones that must not be lost to the outbox
+    relay, the others to the bus. The contact changes come from the outbox and are passed on to the bus.
+
+    :param bus: EventBus: The bus the repositories publish to
+    :param relay: OutboxRelay: The relay of the messages the repositories write to the outbox
+    :return: None
+    """
+    relay.handle("user.created", send_confirmation_email)
+    relay.handle("contact.changed", publish_to(bus))
+    bus.subscribe(UserUpdated, invalidate_user_cache)
+    bus.subscribe(ContactChanged, log_contact_change)
@@ -0,0 +1,78 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+
+class TokenCache:
+    def __init__(self, max_size: int):
+        """
+        Bounded in-process cache of validated JWT claims, keyed by the sha256 digest of the token.
+        Entries are dropped when the token expires, so a cached token is never accepted longer than jwt.decode would.
+        Revocations are kept in the same process: a revoked token is rejected even when it is not cached.
+        The tokens of a refreshed or revoked session are rejected through the session store, see Auth.get_current_user.
+        A max_size of 0 disables the cache.
+
+        :param max_size: int: Maximum number of cached tokens
+        """
+        self.max_size = max_size
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._revoked: dict[str, float] = {}
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> dict | None:
+        """
+        The get function returns the cached claims of the token.
+
+        :param token: str: The encoded token
+        :return: The claims, or None if the token is not cached or has expired
+        """
+        key = self.digest(token)
+        payload = self._entries.get(key)
+        if payload is None:
+            return None
+        if payload["exp"] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return payload
+
+    def put(self, token: str, payload: dict) -> None:
+        """
+        The put function caches the claims of a token that has just been verified.
+
+        :param token: str: The encoded token
+        :param payload: dict: The validated claims, must contain exp
+        :return: None
+        """
+        if self.max_size <= 0:
+            return
+        self._entries[self.digest(token)] = payload
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def is_revoked(self, token: str) -> bool:
+        """
+        The is_revoked function checks the token against the revocations.
+
+        :param token: str: The encoded token
+        :return: True if the token must be rejected
+        """
+        return self.digest(token) in self._revoked
+
+    def revoke(self, token: str, payload: dict) -> None:
+        """
+        The revoke function drops the token from the cache and rejects it until it expires.
+
+        :param token: str: The encoded token
+        :param payload: dict: The claims of the token
+        :return: None
+        """
+        key = self.digest(token)
+        self._entries.pop(key, None)
+        now = time.time()
+        self._revoked = {k: exp for k, exp in self._revoked.items() if exp > now}
+        self._revoked[key] = payload["exp"]
+
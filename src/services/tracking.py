@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+from src.conf.config import config
+from src.database.db import sessionmanager
+from src.database.models import EmailOpen
+
+PIXEL_PATH = Path(__file__).parent.parent / "static" / "check.png"
+# 1x1 transparent png, used when there is no static/check.png
+TRANSPARENT_PNG = (b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15'
+                   b'\xc4\x89\x00\x00\x00\x0bIDATx\xdac`\x00\x02\x00\x00\x05\x00\x01\xe9\xfa\xdc\xd8\x00\x00\x00\x00IEND'
+                   b'\xaeB`\x82')
+
+
+def load_pixel() -> bytes:
+    """
+    The load_pixel function reads the tracking image once, so the route never touches the disk.
+
+    :return: The png bytes of the tracking pixel
+    """
+    try:
+        return PIXEL_PATH.read_bytes()
+    except OSError:
+        return TRANSPARENT_PNG
+
+
+PIXEL = load_pixel()
+PIXEL_ETAG = f'"{hashlib.sha256(PIXEL).hexdigest()[:16]}"'
+# The pixel itself never changes, but every open must reach us to be counted: clients keep it
+# and revalidate with If-None-Match, which is answered with an empty 304.
+PIXEL_HEADERS = {
+    "Cache-Control": "private, no-cache",
+    "ETag": PIXEL_ETAG,
+    "Content-Disposition": "inline",
+}
+
+logger = logging.getLogger(__name__)
+
+
+class OpenEventRecorder:
+    def __init__(self, batch_size: int, flush_interval: float, max_buffer: int):
+        """
+        The OpenEventRecorder buffers email open events in memory and writes them to the email_opens table
+        with one bulk INSERT per batch. A batch is flushed when it is full or every flush_interval seconds.
+
+        :param batch_size: int: Number of events that triggers a flush
+        :param flush_interval: float: Maximum number of seconds an event waits in the buffer
+        :param max_buffer: int: Events over this limit are dropped, so a database outage can not exhaust memory
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._buffer: list[dict] = []
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def record(self, username: str) -> None:
+        """
+        The record function adds an open event to the buffer. It does no I/O.
+
+        :param username: str: The user who opened the email
+        :return: None
+        """
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self._buffer.append({"username": username, "opened_at": datetime.utcnow()})
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """
+        The flush function writes the buffered events with a single bulk INSERT.
+        On failure the events are put back into the buffer to be retried with the next batch, unless the rows
+        themselves were rejected (DataError, IntegrityError): a retry would fail again, so the batch is dropped.
+
+        :return: The number of written events
+        """
+        rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        try:
+            # not sessionmanager.session(), which logs and swallows the error: the rows must be put back
+            async with sessionmanager.session_maker() as session:
+                await session.execute(insert(EmailOpen), rows)
+                await session.commit()
+        except (DataError, IntegrityError) as err:
+            logger.error("Dropped %d email open events rejected by the database: %s", len(rows), err)
+            self.dropped += len(rows)
+            return 0
+        except Exception as err:
+            logger.error("Failed to write %d email open events: %s", len(rows), err)
+            self._buffer[:0] = rows[:max(self.max_buffer - len(self._buffer), 0)]
+            return 0
+        return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        """
+        The start function starts the background flushing task. It must be called from the running event loop.
+
+        :return: None
+        """
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        The stop function stops the background task and flushes what is left in the buffer.
+
+        :return: None
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+        await self.flush()
+
+
+open_recorder = OpenEventRecorder(config.email_open_batch_size, config.email_open_flush_interval,
+                                  config.email_open_max_buffer)
@@ -1,17 +1,27 @@
 import asyncio
+import contextlib
+import re
 
 import pytest
 import pytest_asyncio
 from fastapi.testclient import TestClient
+from passlib.context import CryptContext
+from sqlalchemy import event
 from sqlalchemy.pool import StaticPool
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
 from main import app
+from src.conf.config import config
 from src.database.db import Base, get_db
 from src.database.models import User
 from src.services.auth import auth_service
+from src.services.cache import MemoryCache
+from src.services import idempotency
+from src.services.idempotency import MemoryIdempotencyStore
+from src.services.sessions import MemorySessionStore
 
-SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.sqlite"
+# in memory: every test process, so every pytest-xdist worker (pytest -n auto), gets its own database
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite://"
 
 engine = create_async_engine(
     SQLALCHEMY_DATABASE_URL,
@@ -23,39 +33,82 @@ TestingSessionLocal = async_sessionmaker(
     autocommit=False, autoflush=False, bind=engine, expire_on_commit=False
 )
 
+
+@event.listens_for(engine.sync_engine, "connect")
+def disable_driver_transactions(dbapi_connection, connection_record):
+    # the driver would start transactions on its own and SAVEPOINT would not nest in them
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(engine.sync_engine, "begin")
+def begin_transaction(conn):
+    conn.exec_driver_sql("BEGIN")
+
+
+def pytest_configure(config):
+    # with pytest-xdist (pytest -n auto) the tests of a module, which build on each other, stay on one worker
+    if getattr(config.option, "dist", "no") == "load":
+        config.option.dist = "loadfile"
+
+
+auth_service.sessions = MemorySessionStore(refresh_ttl=3600, access_ttl=3600)
+# the minimum bcrypt cost for the users the tests sign up, like PASSWORD_HASH below
+auth_service.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=4)
+idempotency.store = MemoryIdempotencyStore()
+config.rate_limit_enabled = False
+
+TRANSACTION_CONTROL = re.compile(r"(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b", re.IGNORECASE)
+
+# SQL statements and round-trips (the statements plus the start and end of the transactions) allowed per request,
+# see query_budget.
+# The budgets allow for an authenticated request that also loads its user from the database, on a user cache miss.
+# The contact writes also INSERT their message into the outbox.
+QUERY_BUDGETS = {
+    "POST /auth/login": (1, 3),
+    "GET /api/users/me/": (1, 3),
+    "GET /api/contacts/": (2, 4),
+    "GET /api/contacts/all": (2, 4),
+    "GET /api/contacts/{contact_id}": (2, 4),
+    "GET /api/contacts/stats": (2, 4),
+    "GET /api/contacts/duplicates": (2, 4),
+    "POST /api/contacts/": (5, 9),
+    "PUT /api/contacts/{contact_id}": (6, 10),
+    "DELETE /api/contacts/{contact_id}": (5, 7),
+}
+
 user = {
     "username": "ironman",
     "email": "ironman@example.com",
     "password": "123456789",
 }
+# bcrypt hash of the password above with the minimum cost, so the fixture user is created and logs in fast
+PASSWORD_HASH = "$2b$04$KKc3CrCeOavm0G7F2XCpneDtTnaihnLg5FSf9B65Za3H97EQQwCQO"
 
 
-@pytest.fixture(scope="module", autouse=True)
+@pytest.fixture(scope="session", autouse=True)
 def init_models_fixture():
     """
-    The init_models_fixture function is a fixture that will be called before each test.
-    It will create the database tables and insert a user into the database.
+    The init_models_fixture function is a fixture that will be called once per test process.
+    It will create the database tables and insert a user into the database; the test modules then work on top of
+    this database and roll back what they write, see isolate_module.
 
     :return: A function
     :doc-author: Trelent
     """
     async def init_models():
         """
-        The init_models function is a fixture that will be run before each test.
-        It creates the database tables and inserts an admin user into the database.
+        The init_models function creates the database tables and inserts an admin user into the database.
 
         :return: A coroutine, which is an object that can be awaited
         :doc-author: Trelent
         """
         async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.drop_all)
             await conn.run_sync(Base.metadata.create_all)
         async with TestingSessionLocal() as session:
-            user_hash = auth_service.get_password_hash(user.get("password"))
             current_user = User(
                 username=user.get("username"),
                 email=user.get("email"),
-                password=user_hash,
+                password=PASSWORD_HASH,
                 confirmed=True,
                 role="admin",
             )
@@ -63,6 +116,55 @@ def init_models_fixture():
             await session.commit()
 
     asyncio.run(init_models())
+    yield
+    asyncio.run(engine.dispose())
+
+
+@pytest.fixture(scope="module", autouse=True)
+def isolate_module(init_models_fixture):
+    """
+    The isolate_module function runs each test module in a transaction that is rolled back at its end,
+    so the modules do not see each other's data and nothing is left behind.
+    The sessions of the tests and of the application join the transaction: their commits only release a SAVEPOINT.
+    Every module gets an empty user cache, so no user of a rolled back module is served from it.
+
+    :param init_models_fixture: The database with its tables and the fixture user
+    :return: The connection of the transaction
+    :doc-author: Trelent
+    """
+    async def begin():
+        connection = await engine.connect()
+        await connection.begin()
+        return connection
+
+    async def rollback(connection):
+        await connection.rollback()
+        await connection.close()
+
+    connection = asyncio.run(begin())
+    auth_service.cache = MemoryCache(config.cache_max_size)
+    TestingSessionLocal.configure(bind=connection, join_transaction_mode="create_savepoint")
+    yield connection
+    TestingSessionLocal.configure(bind=engine, join_transaction_mode="conservative_savepoint")
+    asyncio.run(rollback(connection))
+
+
+@pytest.fixture()
+def isolated(isolate_module):
+    """
+    The isolated function rolls back what a test writes, for the tests that do not build on the previous ones:
+    the test runs in a SAVEPOINT of the module transaction.
+
+    :param isolate_module: The connection of the module transaction
+    :return: None
+    :doc-author: Trelent
+    """
+    async def begin_nested():
+        return await isolate_module.begin_nested()
+
+    savepoint = asyncio.run(begin_nested())
+    yield
+    asyncio.run(savepoint.rollback())
 
 
 @pytest.fixture(scope="module")
@@ -134,4 +236,61 @@ async def get_token_simple(client):
     access_token = await auth_service.create_access_token(
         data={"sub": user.get("email")}
     )
-    return access_token
\ No newline at end of file
+    return access_token
+
+class QueryCounter:
+    def __init__(self, sync_engine):
+        """
+        Records the SQL statements run through the engine, and counts the round-trips to the database:
+        the statements plus the transaction control (BEGIN, SAVEPOINT, COMMIT, ...).
+
+        :param sync_engine: The engine to listen to
+        """
+        self.engine = sync_engine
+        self.statements = []
+        self.round_trips = 0
+
+    def on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.round_trips += 1
+        if not TRANSACTION_CONTROL.match(statement):
+            self.statements.append(statement)
+
+    def on_end(self, conn):
+        self.round_trips += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self.on_execute)
+        event.listen(self.engine, "commit", self.on_end)
+        event.listen(self.engine, "rollback", self.on_end)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self.on_execute)
+        event.remove(self.engine, "commit", self.on_end)
+        event.remove(self.engine, "rollback", self.on_end)
+
+
+@pytest.fixture()
+def query_budget():
+    """
+    The query_budget fixture checks a request against its budget in QUERY_BUDGETS.
+    The test fails when the request runs more SQL statements or round-trips than declared, and prints the statements,
+    so a lazy load per row or an extra refresh shows up as a failure with the SQL that caused it.
+
+        with query_budget("GET /api/contacts/{contact_id}"):
+            client.get("/api/contacts/1", headers=headers)
+
+    :return: A function that takes the endpoint name and returns a context manager
+    :doc-author: Trelent
+    """
+    @contextlib.contextmanager
+    def check(endpoint: str):
+        statements, round_trips = QUERY_BUDGETS[endpoint]
+        with QueryCounter(engine.sync_engine) as counter:
+            yield counter
+        if len(counter.statements) > statements or counter.round_trips > round_trips:
+            listing = "\n".join(f"{number}. {statement}" for number, statement in enumerate(counter.statements, 1))
+            pytest.fail(f"{endpoint} ran {len(counter.statements)} statements in {counter.round_trips} round-trips, "
+                        f"the budget is {statements} in {round_trips}:\n{listing}", pytrace=False)
+
+    return check
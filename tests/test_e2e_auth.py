@@ -4,7 +4,8 @@ import pytest
 from sqlalchemy import select
 
 from src.database.models import User
-from tests.conftest import TestingSessionLocal
+from src.services.tracking import PIXEL, open_recorder
+from conftest import TestingSessionLocal
 
 user_mock = {
     "username": "ironman",
@@ -174,4 +175,86 @@ def test_login_validation_user(client, monkeypatch):
     )
     assert response.status_code == 422, response.text
     data = response.json()
-    assert "detail" in data
\ No newline at end of file
+    assert "detail" in data
+
+def test_email_opened(client):
+    """
+    The test_email_opened function tests the tracking image route.
+    The image is served from memory with an ETag, a revalidation gets an empty 304,
+    and both opens are buffered for the batched write instead of being written one by one.
+
+    :param client: Make requests to the api
+    :return: None
+    :doc-author: Trelent
+    """
+    open_recorder._buffer.clear()
+    response = client.get(f"/auth/{user_mock.get('username')}")
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "image/png"
+    assert response.content == PIXEL
+    etag = response.headers["etag"]
+
+    response = client.get(f"/auth/{user_mock.get('username')}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert [event["username"] for event in open_recorder._buffer] == [user_mock.get("username")] * 2
+    # longer than the column: rejected before it can break the batched INSERT
+    assert client.get(f"/auth/{'x' * 51}").status_code == 422
+    assert len(open_recorder._buffer) == 2
+    open_recorder._buffer.clear()
+
+
+def test_refresh_token_rotation(client):
+    """
+    The test_refresh_token_rotation function tests the refresh of the tokens.
+    A refresh rejects the access token issued before it. A refresh token works once: using it again revokes
+    the session, so the rotated refresh token and the access tokens of the session stop working as well.
+
+    :param client: Make requests to the api
+    :return: None
+    """
+    response = client.post(
+        "/auth/login",
+        data={
+            "username": user_mock.get("email"),
+            "password": user_mock.get("password"),
+        },
+    )
+    assert response.status_code == 200, response.text
+    tokens = response.json()
+
+    response = client.get("/auth/refresh_token", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 200, response.text
+    rotated = response.json()
+    response = client.get("/api/users/me/", headers={"Authorization": f"Bearer {rotated['access_token']}"})
+    assert response.status_code == 200, response.text
+    response = client.get("/api/users/me/", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    assert response.status_code == 401, response.text
+
+    response = client.get("/auth/refresh_token", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 401, response.text
+    response = client.get("/auth/refresh_token", headers={"Authorization": f"Bearer {rotated['refresh_token']}"})
+    assert response.status_code == 401, response.text
+    response = client.get("/api/users/me/", headers={"Authorization": f"Bearer {rotated['access_token']}"})
+    assert response.status_code == 401, response.text
+
+
+def test_logout(client):
+    """
+    The test_logout function tests that after logout neither the access token nor the refresh token work,
+    while another session of the same user is not affected.
+
+    :param client: Make requests to the api
+    :return: None
+    """
+    data = {"username": user_mock.get("email"), "password": user_mock.get("password")}
+    first = client.post("/auth/login", data=data).json()
+    second = client.post("/auth/login", data=data).json()
+
+    response = client.post("/auth/logout", headers={"Authorization": f"Bearer {first['access_token']}"})
+    assert response.status_code == 200, response.text
+    response = client.get("/api/users/me/", headers={"Authorization": f"Bearer {first['access_token']}"})
+    assert response.status_code == 401, response.text
+    response = client.get("/auth/refresh_token", headers={"Authorization": f"Bearer {first['refresh_token']}"})
+    assert response.status_code == 401, response.text
+    response = client.get("/api/users/me/", headers={"Authorization": f"Bearer {second['access_token']}"})
+    assert response.status_code == 200, response.text
@@ -0,0 +1,187 @@
+import json
+
+
+contact = {
+    "name": "Tony",
+    "surname": "Stark",
+    "email": "tony@stark.com",
+    "phone": "0501234567",
+    "bd": "29-05-1970",
+    "city": "Malibu",
+    "notes": "Iron Man",
+}
+
+
+def test_create_contact_idempotent(client, get_token):
+    """
+    The test_create_contact_idempotent function tests that a retried create with the same Idempotency-Key
+    returns the first response instead of creating the contact again.
+
+    :param client: Make requests to the api
+    :param get_token: Get the access token of the test user
+    :return: None
+    """
+    headers = {"Authorization": f"Bearer {get_token}", "Idempotency-Key": "create-tony"}
+    response = client.post("/api/contacts/", json=contact, headers=headers)
+    assert response.status_code == 201, response.text
+    first = response.json()
+    assert "Idempotent-Replayed" not in response.headers
+
+    response = client.post("/api/contacts/", json=contact, headers=headers)
+    assert response.status_code == 201, response.text
+    assert response.json() == first
+    assert response.headers["Idempotent-Replayed"] == "true"
+
+
+def test_idempotency_key_reused_for_other_request(client, get_token):
+    headers = {"Authorization": f"Bearer {get_token}", "Idempotency-Key": "create-tony"}
+    response = client.post("/api/contacts/", json={**contact, "email": "pepper@stark.com"}, headers=headers)
+    assert response.status_code == 422, response.text
+
+
+def test_create_contact_duplicate_email(client, get_token):
+    """
+    The test_create_contact_duplicate_email function tests that a contact with an existing email
+    is rejected with 409 instead of failing on the unique constraint.
+
+    :param client: Make requests to the api
+    :param get_token: Get the access token of the test user
+    :return: None
+    """
+    response = client.post("/api/contacts/", json=contact, headers={"Authorization": f"Bearer {get_token}"})
+    assert response.status_code == 409, response.text
+    assert response.json()["detail"] == "Contact with this email already exists"
+
+
+def test_find_and_merge_duplicates(client, get_token):
+    """
+    The test_find_and_merge_duplicates function tests that contacts sharing a phone number written differently
+    are reported as duplicates and can be merged into one.
+
+    :param client: Make requests to the api
+    :param get_token: Get the access token of the test user
+    :return: None
+    """
+    headers = {"Authorization": f"Bearer {get_token}"}
+    duplicate = {**contact, "name": "Anthony", "email": "ironman@stark.com", "phone": "+38 (050) 123-45-67",
+                 "city": "NYC", "notes": "Avenger"}
+    response = client.post("/api/contacts/", json=duplicate, headers=headers)
+    assert response.status_code == 201, response.text
+    duplicate_id = response.json()["id"]
+
+    response = client.get("/api/contacts/duplicates", headers=headers)
+    assert response.status_code == 200, response.text
+    clusters = [json.loads(line)["contact_ids"] for line in response.text.splitlines()]
+    assert len(clusters) == 1
+    primary_id = clusters[0][0]
+    assert duplicate_id in clusters[0]
+
+    response = client.post("/api/contacts/merge", json={"primary_id": primary_id, "duplicate_ids": [duplicate_id]},
+                           headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["notes"] == "Iron Man; Avenger"
+    response = client.get(f"/api/contacts/{duplicate_id}", headers=headers)
+    assert response.status_code == 404, response.text
+    response = client.get("/api/contacts/duplicates", headers=headers)
+    assert response.text == ""
+
+
+def test_contact_stats(client, get_token):
+    """
+    The test_contact_stats function tests that the counters follow the contact changes
+    and that reconciling finds nothing to repair.
+
+    :param client: Make requests to the api
+    :param get_token: Get the access token of the test user
+    :return: None
+    """
+    headers = {"Authorization": f"Bearer {get_token}"}
+    response = client.get("/api/contacts/stats", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json() == {"total": 1, "by_city": {"Malibu": 1}, "by_birth_month": {"05": 1}}
+
+    response = client.post("/api/contacts/", json={**contact, "email": "pepper@stark.com", "phone": "0507654321",
+                                                   "name": "Pepper", "surname": "Potts", "bd": "1974.12.01"},
+                           headers=headers)
+    assert response.status_code == 201, response.text
+    pepper_id = response.json()["id"]
+    response = client.put(f"/api/contacts/{pepper_id}", json={**response.json(), "city": "NYC", "bd": "01.12.1974"},
+                          headers=headers)
+    assert response.status_code == 200, response.text
+    response = client.get("/api/contacts/stats", headers=headers)
+    assert response.json() == {"total": 2, "by_city": {"Malibu": 1, "NYC": 1}, "by_birth_month": {"05": 1, "12": 1}}
+
+    response = client.delete(f"/api/contacts/{pepper_id}", headers=headers)
+    assert response.status_code == 200, response.text
+    response = client.post("/api/contacts/stats/reconcile", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json() == {"repaired": 0}
+    response = client.get("/api/contacts/stats", headers=headers)
+    assert response.json() == {"total": 1, "by_city": {"Malibu": 1}, "by_birth_month": {"05": 1}}
+
+
+def test_total_count(client, get_token):
+    """
+    The test_total_count function tests that the X-Total-Count header is returned only when asked for.
+
+    :param client: Make requests to the api
+    :param get_token: Get the access token of the test user
+    :return: None
+    """
+    headers = {"Authorization": f"Bearer {get_token}"}
+    response = client.get("/api/contacts/", headers=headers)
+    assert response.status_code == 200, response.text
+    assert "X-Total-Count" not in response.headers
+    response = client.get("/api/contacts/", params={"count": "exact"}, headers=headers)
+    assert response.headers["X-Total-Count"] == str(len(response.json())) == "1"
+    response = client.get("/api/contacts/all", params={"count": "estimated"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["X-Total-Count"] == "1"
+    assert "X-Total-Count-Estimated" not in response.headers
+
+
+def test_admin_view(client, get_token):
+    """
+    The test_admin_view function tests the filters and the keyset paging of the admin view of all the contacts,
+    and their export as newline delimited JSON.
+
+    :param client: Make requests to the api
+    :param get_token: Get the access token of the test user, an admin
+    :return: None
+    """
+    headers = {"Authorization": f"Bearer {get_token}"}
+    for number in range(12):
+        response = client.post("/api/contacts/", json={**contact, "email": f"avenger{number}@stark.com",
+                                                       "city": "Kyiv" if number % 2 else "Lviv"}, headers=headers)
+        assert response.status_code == 201, response.text
+    response = client.get("/api/contacts/all", params={"city": "Kyiv"}, headers=headers)
+    assert response.status_code == 200, response.text
+    page = response.json()
+    assert [item["city"] for item in page] == ["Kyiv"] * 6
+    assert "X-Next-After-Id" not in response.headers
+    for count in ("exact", "estimated"):
+        response = client.get("/api/contacts/all", params={"city": "Kyiv", "limit": 10, "after_id": page[0]["id"],
+                                                           "count": count}, headers=headers)
+        assert response.headers["X-Total-Count"] == "6"
+        assert "X-Total-Count-Estimated" not in response.headers
+
+    response = client.get("/api/contacts/all", params={"limit": 10}, headers=headers)
+    first = [item["id"] for item in response.json()]
+    assert first == sorted(first)
+    response = client.get("/api/contacts/all", params={"limit": 10, "after_id": response.headers["X-Next-After-Id"]},
+                          headers=headers)
+    second = [item["id"] for item in response.json()]
+    assert second and min(second) > max(first)
+    assert "X-Next-After-Id" not in response.headers
+
+    response = client.get("/api/contacts/all", params={"created_from": "2000-01-01T00:00:00",
+                                                       "created_to": "2000-01-02T00:00:00"}, headers=headers)
+    assert response.json() == []
+
+    response = client.get("/api/contacts/all/export", params={"city": "Lviv", "after_id": first[0]}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert [item["city"] for item in exported] == ["Lviv"] * 6
+    assert all(item["id"] > first[0] for item in exported)
+    assert exported[0]["user"]["email"] == "ironman@example.com"
@@ -0,0 +1,31 @@
+from fastapi.testclient import TestClient
+
+from main import app
+from src.services.lifecycle import lifecycle
+
+
+def test_liveness(client):
+    response = client.get("/health/live")
+    assert response.status_code == 200, response.text
+
+
+def test_readiness_follows_lifespan(client):
+    """
+    The test_readiness_follows_lifespan function tests that the instance is ready only between the end of the
+    startup and the shutdown. The warm-up tolerates the missing database and Redis of the test environment.
+
+    :param client: Make requests to the api
+    :return: None
+    """
+    response = client.get("/health/ready")
+    assert response.status_code == 503, response.text
+    assert response.json()["status"] == "starting"
+
+    with TestClient(app) as started:
+        response = started.get("/health/ready")
+        assert response.status_code == 200, response.text
+    assert not lifecycle.ready
+    assert lifecycle.draining
+
+    response = client.get("/health/ready")
+    assert response.json()["status"] == "draining"
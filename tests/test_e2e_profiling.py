@@ -0,0 +1,39 @@
+from src.services.profiling import profiler
+
+
+def test_profile_flagged_request(client, get_token):
+    """
+    The test_profile_flagged_request function tests that an admin can arm the profiler, that a request sent with
+    the token is profiled while the others are not, and that its profile is served as collapsed stacks.
+
+    :param client: Make requests to the api
+    :param get_token: Get the access token of the test user, an admin
+    :return: None
+    """
+    headers = {"Authorization": f"Bearer {get_token}"}
+    response = client.post("/api/profiling/", json={"sample_rate": 0}, headers=headers)
+    assert response.status_code == 200, response.text
+    token = response.json()["token"]
+    assert response.json()["armed"] is True
+    client.get("/api/contacts/", headers=headers)
+    response = client.get("/api/contacts/", headers={**headers, "X-Profile-Token": token})
+    assert response.status_code == 200, response.text
+    response = client.delete("/api/profiling/", headers=headers)
+    data = response.json()
+    assert data["armed"] is False
+    assert data["token"] is None
+    assert [(item["path"], item["status"]) for item in data["profiles"]] == [("/api/contacts/", 200)]
+    assert data["profiles"][0]["request_id"]
+    response = client.get(f"/api/profiling/{data['profiles'][0]['id']}", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/plain")
+    for line in response.text.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack and int(count) > 0
+    assert client.get("/api/profiling/999", headers=headers).status_code == 404
+    profiler.profiles.clear()
+
+
+def test_profiling_requires_admin(client):
+    response = client.get("/api/profiling/")
+    assert response.status_code == 401, response.text
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+import conftest
+from src.database.models import Contact, User
+from src.services.auth import auth_service
+from src.services.cache import MemoryCache
+
+contact = {
+    "name": "Tony",
+    "surname": "Stark",
+    "email": "tony@example.com",
+    "phone": "0501234567",
+    "bd": "1970-05-29",
+    "city": "Malibu",
+    "notes": "Iron Man",
+}
+
+
+async def add_other_users(count: int) -> None:
+    async with conftest.TestingSessionLocal() as session:
+        for number in range(count):
+            owner = User(username=f"other{number}", email=f"other{number}@example.com", password="-", confirmed=True)
+            session.add(owner)
+            session.add(Contact(**{**contact, "email": f"other{number}@example.com"}, user=owner))
+        await session.commit()
+
+
+def test_contacts_budgets(client, get_token, query_budget, isolated):
+    """
+    The test_contacts_budgets function runs every contacts endpoint within its query budget.
+    The lists are read with several contacts of several users, so a query per row would exceed the budget.
+
+    :param client: Make requests to the api
+    :param get_token: Get the access token of the test user
+    :param query_budget: Check the requests against their budgets
+    :param isolated: Roll back the contacts created by the test
+    :return: None
+    """
+    asyncio.run(add_other_users(3))
+    headers = {"Authorization": f"Bearer {get_token}"}
+    with query_budget("POST /api/contacts/"):
+        response = client.post("/api/contacts/", json=contact, headers=headers)
+    assert response.status_code == 201, response.text
+    contact_id = response.json()["id"]
+    for number in range(5):
+        client.post("/api/contacts/", json={**contact, "email": f"tony{number}@example.com"}, headers=headers)
+    with query_budget("GET /api/contacts/"):
+        assert len(client.get("/api/contacts/", headers=headers).json()) == 6
+    with query_budget("GET /api/contacts/all"):
+        assert len(client.get("/api/contacts/all", headers=headers).json()) == 9
+    with query_budget("GET /api/contacts/{contact_id}"):
+        assert client.get(f"/api/contacts/{contact_id}", headers=headers).status_code == 200
+    with query_budget("GET /api/contacts/stats"):
+        assert client.get("/api/contacts/stats", headers=headers).json()["total"] == 6
+    with query_budget("GET /api/contacts/duplicates"):
+        assert client.get("/api/contacts/duplicates", headers=headers).status_code == 200
+    with query_budget("PUT /api/contacts/{contact_id}"):
+        response = client.put(f"/api/contacts/{contact_id}", json={**contact, "city": "New York"}, headers=headers)
+    assert response.status_code == 200, response.text
+    with query_budget("DELETE /api/contacts/{contact_id}"):
+        assert client.delete(f"/api/contacts/{contact_id}", headers=headers).status_code == 200
+
+
+def test_auth_budgets(client, get_token, query_budget):
+    with query_budget("POST /auth/login"):
+        response = client.post("/auth/login", data={"username": conftest.user["email"],
+                                                    "password": conftest.user["password"]})
+    assert response.status_code == 200, response.text
+    with query_budget("GET /api/users/me/"):
+        assert client.get("/api/users/me/", headers={"Authorization": f"Bearer {get_token}"}).status_code == 200
+
+
+def test_budget_exceeded(client, get_token, query_budget, monkeypatch):
+    monkeypatch.setitem(conftest.QUERY_BUDGETS, "GET /api/users/me/", (0, 0))
+    # a user cache miss, so the request loads its user
+    monkeypatch.setattr(auth_service, "cache", MemoryCache(max_size=10))
+    with pytest.raises(pytest.fail.Exception, match="ran 1 statements in 3 round-trips.*\n1. SELECT users"):
+        with query_budget("GET /api/users/me/"):
+            client.get("/api/users/me/", headers={"Authorization": f"Bearer {get_token}"})
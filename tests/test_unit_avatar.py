@@ -0,0 +1,115 @@
+import io
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi import HTTPException, UploadFile
+
+from src.services import avatar
+from src.services.storage import LocalStorage
+
+
+def png_bytes(color="red", size=(300, 200)):
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, format="PNG")
+    return out.getvalue()
+
+
+class TestAvatar(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        """
+        The setUp function creates a local storage in a temporary directory for each test.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = LocalStorage(self.tmp.name, "/static/avatars")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def test_read_upload_rejects_large_file(self):
+        """
+        The test_read_upload_rejects_large_file function tests that an upload over the size limit is rejected with 413.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        file = UploadFile(io.BytesIO(b"x" * 200))
+        with self.assertRaises(HTTPException) as ctx:
+            await avatar.read_upload(file, max_size=100)
+        self.assertEqual(ctx.exception.status_code, 413)
+
+    async def test_local_storage_save(self):
+        """
+        The test_local_storage_save function tests that the local storage writes the file and returns its url.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        url = await self.storage.save("abc/64.png", b"data", "image/png")
+        self.assertEqual(url, "/static/avatars/abc/64.png")
+        self.assertTrue(await self.storage.exists("abc/64.png"))
+        self.assertFalse(await self.storage.exists("abc/128.png"))
+
+    @unittest.skipUnless(avatar.pillow_available(), "Pillow is not installed")
+    def test_make_thumbnails(self):
+        """
+        The test_make_thumbnails function tests that every requested thumbnail is a square png of the right size.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        from PIL import Image
+
+        thumbnails = avatar.make_thumbnails(png_bytes(), (64, 250))
+        for size, data in thumbnails.items():
+            with Image.open(io.BytesIO(data)) as image:
+                self.assertEqual(image.size, (size, size))
+
+    @unittest.skipUnless(avatar.pillow_available(), "Pillow is not installed")
+    async def test_store_avatar_deduplicates(self):
+        """
+        The test_store_avatar_deduplicates function tests that uploading the same image twice generates thumbnails once.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        data = png_bytes()
+        with patch.object(avatar, "get_pool", return_value=None), \
+                patch.object(avatar, "make_thumbnails", wraps=avatar.make_thumbnails) as mock_make:
+            first = await avatar.store_avatar(UploadFile(io.BytesIO(data)), self.storage)
+            second = await avatar.store_avatar(UploadFile(io.BytesIO(data)), self.storage)
+        self.assertEqual(first, second)
+        self.assertTrue(first.endswith("/250.png"))
+        self.assertEqual(mock_make.call_count, 1)
+
+    @unittest.skipUnless(avatar.pillow_available(), "Pillow is not installed")
+    async def test_store_avatar_rejects_decompression_bomb(self):
+        from PIL import Image
+
+        bomb = Image.DecompressionBombError("Image size exceeds limit")
+        with patch.object(avatar, "get_pool", return_value=None), \
+                patch.object(avatar, "make_thumbnails", side_effect=bomb):
+            with self.assertRaises(HTTPException) as ctx:
+                await avatar.store_avatar(UploadFile(io.BytesIO(png_bytes())), self.storage)
+        self.assertEqual(ctx.exception.status_code, 400)
+
+    def test_shutdown_pool(self):
+        """
+        The test_shutdown_pool function tests that the thumbnail pool is shut down and recreated on the next use.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        pool = avatar.get_pool()
+        avatar.shutdown_pool()
+        with self.assertRaises(RuntimeError):
+            pool.submit(abs, -1)
+        self.assertIsNot(avatar.get_pool(), pool)
+        avatar.shutdown_pool()
+        avatar.shutdown_pool()
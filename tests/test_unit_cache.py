@@ -0,0 +1,112 @@
+import unittest
+from unittest.mock import patch
+
+from src.conf.config import config
+from src.services.cache import MemoryCache, RedisCache, TieredCache, get_cache
+
+
+class TestMemoryCache(unittest.IsolatedAsyncioTestCase):
+
+    async def test_get_set_delete(self):
+        cache = MemoryCache(max_size=10)
+        await cache.set("a", b"1")
+        await cache.set("b", b"2", ttl=60)
+        self.assertEqual(await cache.get("a"), b"1")
+        self.assertEqual(await cache.mget(["a", "missing", "b"]), [b"1", None, b"2"])
+        await cache.delete("a", "missing")
+        self.assertIsNone(await cache.get("a"))
+
+    async def test_lru_eviction(self):
+        """
+        The test_lru_eviction function tests that the least recently used key is evicted when the cache is full,
+        and that a read counts as a use.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        cache = MemoryCache(max_size=2)
+        await cache.set("a", b"1")
+        await cache.set("b", b"2")
+        await cache.get("a")
+        await cache.set("c", b"3")
+        self.assertEqual(await cache.mget(["a", "b", "c"]), [b"1", None, b"3"])
+
+    async def test_expiry(self):
+        """
+        The test_expiry function tests that values and counters are dropped after their time to live,
+        and that incr keeps the expiry set when the counter was created.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        cache = MemoryCache(max_size=10)
+        with patch("src.services.cache.time.monotonic", return_value=100.0):
+            await cache.set("a", b"1", ttl=5)
+            self.assertEqual(await cache.incr("n", ttl=5), 1)
+        with patch("src.services.cache.time.monotonic", return_value=104.0):
+            self.assertEqual(await cache.incr("n", 2, ttl=5), 3)
+            self.assertEqual(await cache.get("n"), b"3")
+        with patch("src.services.cache.time.monotonic", return_value=105.0):
+            self.assertIsNone(await cache.get("a"))
+            self.assertEqual(await cache.incr("n", ttl=5), 1)
+
+
+class TestTieredCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.remote = MemoryCache(max_size=100)
+        self.first = TieredCache(MemoryCache(max_size=10), self.remote, local_ttl=5)
+        self.second = TieredCache(MemoryCache(max_size=10), self.remote, local_ttl=5)
+
+    async def test_read_through(self):
+        """
+        The test_read_through function tests that a value written by one process is read by another
+        from the shared tier, and then served from its local tier.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        await self.first.set("a", b"1", ttl=60)
+        self.assertEqual(await self.second.mget(["a", "b"]), [b"1", None])
+        await self.remote.delete("a")
+        self.assertEqual(await self.second.get("a"), b"1")
+
+    async def test_local_copy_is_bounded(self):
+        """
+        The test_local_copy_is_bounded function tests that a deleted value is gone at once in the process that
+        deleted it, and in the other processes after local_ttl.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        with patch("src.services.cache.time.monotonic", return_value=100.0):
+            await self.first.set("a", b"1")
+            await self.second.get("a")
+            await self.first.delete("a")
+            self.assertIsNone(await self.first.get("a"))
+            self.assertEqual(await self.second.get("a"), b"1")
+        with patch("src.services.cache.time.monotonic", return_value=105.0):
+            self.assertIsNone(await self.second.get("a"))
+
+    async def test_counters_are_shared(self):
+        self.assertEqual(await self.first.incr("n"), 1)
+        self.assertEqual(await self.second.incr("n"), 2)
+        self.assertEqual(await self.first.get("n"), b"2")
+        self.assertEqual(await self.first.incr("n"), 3)
+        self.assertEqual(await self.first.get("n"), b"3")
+
+
+class TestGetCache(unittest.TestCase):
+
+    def test_backends(self):
+        for backend, cache_type in (("memory", MemoryCache), ("redis", RedisCache), ("tiered", TieredCache)):
+            with patch.object(config, "cache_backend", backend):
+                self.assertIsInstance(get_cache(), cache_type)
+        with patch.object(config, "cache_backend", "memcached"):
+            with self.assertRaises(ValueError):
+                get_cache()
+
+    def test_redis_client(self):
+        self.assertIsNone(MemoryCache(max_size=1).redis)
+        self.assertIsNone(TieredCache(MemoryCache(max_size=1), MemoryCache(max_size=1), local_ttl=1).redis)
+        self.assertIsNotNone(TieredCache(MemoryCache(max_size=1), RedisCache(), local_ttl=1).redis)
@@ -0,0 +1,37 @@
+import os
+import unittest
+
+from tools.importtime_report import measure, total_ms
+
+# integrations and drivers that are imported on first use, not at startup
+LAZY_MODULES = {"fastapi_mail", "cloudinary", "libgravatar", "passlib", "bcrypt", "asyncpg", "PIL", "uvicorn"}
+FRAMEWORK = ("fastapi", "sqlalchemy.orm", "sqlalchemy.ext.asyncio")
+# milliseconds the application may add to the import of the framework: generous, the overhead is measured far below,
+# so a loaded machine does not fail the test; set COLD_START_BUDGET to enforce a tighter one
+COLD_START_BUDGET = float(os.environ.get("COLD_START_BUDGET", "1000"))
+
+
+class TestColdStart(unittest.TestCase):
+
+    def test_lazy_integrations(self):
+        """
+        The test_lazy_integrations function tests that importing the application does not load the optional
+        integrations and drivers.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        imported = {item.name.split(".")[0] for item in measure("main")}
+        self.assertEqual(imported & LAZY_MODULES, set())
+
+    def test_import_budget(self):
+        """
+        The test_import_budget function tests the cold start budget: the time importing main takes over importing
+        FastAPI and SQLAlchemy alone. Both are measured in fresh interpreters and the best of three runs is kept,
+        so the result depends little on the speed and the load of the machine.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        overhead = min(total_ms(measure("main")) - total_ms(measure(*FRAMEWORK)) for _ in range(3))
+        self.assertLess(overhead, COLD_START_BUDGET, f"main adds {overhead:.0f} ms to the framework imports")
@@ -0,0 +1,94 @@
+import gzip
+import unittest
+from unittest.mock import patch
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.services import compression
+from src.services.compression import CompressionMiddleware, CompressionMetrics, Precompressed, negotiate
+
+BIG = {"contacts": [{"name": "Tony", "surname": "Stark", "city": "Malibu"}] * 100}
+
+
+def make_app(**options):
+    async def big(request):
+        return JSONResponse(BIG)
+
+    async def small(request):
+        return PlainTextResponse("ok")
+
+    async def image(request):
+        return Response(b"\x89PNG" + b"\x00" * 4096, media_type="image/png")
+
+    async def stream(request):
+        async def lines():
+            for _ in range(100):
+                yield "line\n" * 100
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    app = Starlette(routes=[Route("/big", big), Route("/small", small), Route("/image", image),
+                            Route("/stream", stream)])
+    app.add_middleware(CompressionMiddleware, **options)
+    return TestClient(app)
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        for patcher in (patch.object(compression, "metrics", CompressionMetrics()),
+                        patch.object(compression, "precompressed", Precompressed())):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_negotiate(self):
+        self.assertEqual(negotiate("gzip, deflate"), "gzip")
+        self.assertEqual(negotiate("gzip;q=0"), None)
+        self.assertEqual(negotiate("identity"), None)
+        self.assertEqual(negotiate("*"), next(iter(compression.ENCODERS)))
+
+    def test_compress_large_body(self):
+        """
+        The test_compress_large_body function tests that a JSON body over the threshold is sent gzip encoded,
+        in a worker thread when it is large enough, and counted in the metrics.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        client = make_app(minimum_size=100, thread_size=0)
+        response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+        self.assertEqual(response.json(), BIG)
+        stats = compression.metrics.snapshot()["gzip"]
+        self.assertEqual(stats["responses"], 1)
+        self.assertGreater(stats["bytes_saved"], 0)
+        self.assertEqual(stats["bytes_out"], int(response.headers["content-length"]))
+
+    def test_skipped_responses(self):
+        client = make_app(minimum_size=100)
+        for path in ("/small", "/image", "/stream"):
+            response = client.get(path, headers={"Accept-Encoding": "gzip"})
+            self.assertNotIn("content-encoding", response.headers, path)
+        self.assertEqual(response.text, "line\n" * 10000)
+        response = client.get("/big", headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertEqual(compression.metrics.snapshot(), {})
+
+    def test_precompressed(self):
+        """
+        The test_precompressed function tests that a registered body is served from the variant made at startup.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        body = JSONResponse(BIG).body
+        compression.precompressed.add("/big", body)
+        client = make_app(minimum_size=100)
+        response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(gzip.decompress(compression.precompressed.get("/big", body, "gzip")), body)
+        self.assertEqual(response.json(), BIG)
+        stats = compression.metrics.snapshot()["gzip"]
+        self.assertEqual((stats["precompressed"], stats["cpu_seconds"]), (1, 0.0))
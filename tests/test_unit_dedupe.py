@@ -0,0 +1,91 @@
+import unittest
+
+from src.services.dedupe import find_clusters, fold_name, normalize_email, normalize_phone, person_key
+
+
+class TestDedupe(unittest.TestCase):
+
+    def test_normalize_phone(self):
+        """
+        The test_normalize_phone function tests that national and international notations of a number
+        get the same E.164 form, and that garbage is rejected.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        for phone in ("0501234567", "+38 (050) 123-45-67", "00380501234567", "380501234567"):
+            self.assertEqual(normalize_phone(phone, "380"), "+380501234567")
+        self.assertEqual(normalize_phone("501234567", "380", 9), "+380501234567")
+        # not the length of a national number: an international number without the +
+        self.assertEqual(normalize_phone("12125551234", "380", 9), "+12125551234")
+        self.assertIsNone(normalize_phone("12-34", "380"))
+        self.assertIsNone(normalize_phone(None))
+
+    def test_normalize_email(self):
+        self.assertEqual(normalize_email("  Tony@Stark.COM "), "tony@stark.com")
+        self.assertIsNone(normalize_email(" "))
+
+    def test_fold_name(self):
+        self.assertEqual(fold_name("Tony", "Stark"), fold_name(" stark  ", "TONY"))
+        self.assertEqual(fold_name("Zoë", "Müller"), "muller zoe")
+
+    def test_default_national_length(self):
+        """
+        The test_default_national_length function tests that a country code without a national length
+        still recognizes national numbers without the trunk prefix.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self.assertEqual(normalize_phone("501234567", "380"), "+380501234567")
+
+    def test_find_clusters(self):
+        """
+        The test_find_clusters function tests that each key of the sorted rows is a group:
+        1 and 2 share the email, 2 and 3 the phone, 4 has nothing in common with them,
+        and 1 and 2 sharing the phone too are only reported once.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        rows = [
+            ((0, "a@x.com"), 1),
+            ((0, "a@x.com"), 2),
+            ((0, "b@x.com"), 3),
+            ((1, "+380501"), 1),
+            ((1, "+380501"), 2),
+            ((1, "+380502"), 2),
+            ((1, "+380502"), 3),
+            ((1, "+380503"), 4),
+        ]
+        self.assertEqual(list(find_clusters(rows)), [[1, 2], [2, 3]])
+
+    def test_clusters_are_streamed(self):
+        """
+        The test_clusters_are_streamed function tests that a group is returned as soon as its key is complete,
+        before the rest of the rows are read.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        rows = iter([("a", 1), ("a", 2), ("b", 3), ("b", 4)])
+        clusters = find_clusters(rows)
+        self.assertEqual(next(clusters), [1, 2])
+        self.assertEqual(list(rows), [("b", 4)])
+
+    def test_namesakes_are_not_chained(self):
+        """
+        The test_namesakes_are_not_chained function tests that contacts sharing only a name are not grouped,
+        while the same name with the same birthday is a match.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        keys = [
+            (1, person_key("john smith", "1990-01-01")),
+            (2, person_key("john smith", "1985-05-05")),
+            (3, person_key("john smith", None)),
+            (4, person_key("john smith", "1990-01-01")),
+        ]
+        rows = sorted((key, contact_id) for contact_id, key in keys if key is not None)
+        self.assertEqual(list(find_clusters(rows)), [[1, 4]])
@@ -0,0 +1,72 @@
+import asyncio
+import unittest
+
+from src.services.events import ContactChanged, Event, EventBus, UserUpdated
+
+
+class TestEventBus(unittest.IsolatedAsyncioTestCase):
+
+    async def test_subscribers_get_their_events(self):
+        """
+        The test_subscribers_get_their_events function tests that each subscriber gets the events of its type,
+        concurrently with the publisher, and that stopping the bus handles the queued events first.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        bus = EventBus(queue_size=10, publish_timeout=0.1)
+        contacts, everything = [], []
+
+        async def on_contact(event):
+            await asyncio.sleep(0.01)
+            contacts.append(event)
+
+        async def on_any(event):
+            everything.append(event)
+
+        bus.subscribe(ContactChanged, on_contact, workers=2)
+        bus.subscribe(Event, on_any)
+        bus.start()
+        await bus.publish(ContactChanged(1, 1, "created"))
+        await bus.publish(UserUpdated(1, "tony@stark.com"))
+        await bus.publish(ContactChanged(2, 1, "deleted"))
+        self.assertEqual(contacts, [])
+        await bus.stop(timeout=1)
+        self.assertEqual(sorted(event.contact_id for event in contacts), [1, 2])
+        self.assertEqual(len(everything), 3)
+        self.assertEqual(bus.snapshot()["ContactChanged:on_contact"], {"published": 2, "handled": 2, "queued": 0})
+
+    async def test_backpressure_drops_when_full(self):
+        bus = EventBus(queue_size=1, publish_timeout=0.01)
+        release = asyncio.Event()
+
+        async def slow(event):
+            await release.wait()
+
+        bus.subscribe(Event, slow)
+        bus.start()
+        for number in range(3):
+            await bus.publish(ContactChanged(number, 1, "created"))
+        release.set()
+        await bus.stop(timeout=1)
+        counters = bus.snapshot()["Event:slow"]
+        self.assertEqual(counters["published"], 2)
+        self.assertEqual(counters["dropped"], 1)
+
+    async def test_failures_are_counted(self):
+        bus = EventBus(queue_size=10, publish_timeout=0.1)
+
+        async def broken(event):
+            raise RuntimeError("boom")
+
+        bus.subscribe(Event, broken)
+        await bus.publish(ContactChanged(1, 1, "created"))
+        bus.start()
+        await bus.publish(ContactChanged(2, 1, "created"))
+        with self.assertLogs("src.services.events", "ERROR"):
+            await bus.stop(timeout=1)
+        self.assertEqual(bus.snapshot()["Event:broken"], {"published": 1, "failed": 1, "queued": 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
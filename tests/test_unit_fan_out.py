@@ -0,0 +1,147 @@
+import asyncio
+import contextlib
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.conf.config import config
+from src.database.db import Base
+from src.database.models import Contact, User
+from src.repository.contacts import fan_out_contacts, stream_all_contacts
+from src.routes import contacts as routes_contacts
+from src.schemas import ContactsFilter
+
+
+class TestFanOut(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        # a database file, so the concurrent sessions get connections of their own
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(self.directory.name, 'fan_out.db')}")
+        self.session_maker = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with self.session_maker() as session:
+            owners = [User(username=f"user{number}", email=f"user{number}@example.com", password="-")
+                      for number in range(3)]
+            session.add_all(owners)
+            for number in range(30):
+                session.add(Contact(name="Tony", surname="Stark", email=f"tony{number}@example.com",
+                                    phone="0501234567", bd="1970-05-29", city=["Kyiv", "Lviv"][number % 2], notes="",
+                                    user=owners[number % 3]))
+            await session.commit()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        self.directory.cleanup()
+
+    async def collect(self, contacts) -> list[int]:
+        return [contact.id async for contact in contacts]
+
+    async def test_same_contacts_as_one_scan(self):
+        """
+        The test_same_contacts_as_one_scan function tests that the concurrent range reads return the same contacts,
+        in the same order, as one streamed scan, with and without filters.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        for filters, after_id in ((None, None), (ContactsFilter(user_id=2), None), (ContactsFilter(city="Lviv"), 10)):
+            async with self.session_maker() as session:
+                expected = await self.collect(stream_all_contacts(session, filters, after_id, batch_size=7))
+            fanned_out = await self.collect(fan_out_contacts(self.session_maker, filters, after_id, parallel=3,
+                                                             chunk_size=4))
+            self.assertEqual(fanned_out, expected)
+            self.assertTrue(expected)
+        self.assertEqual(len(expected), 10)
+
+    async def test_no_contacts(self):
+        contacts = fan_out_contacts(self.session_maker, ContactsFilter(user_id=99), parallel=2)
+        self.assertEqual(await self.collect(contacts), [])
+
+    async def test_stop_early_cancels_reads(self):
+        """
+        The test_stop_early_cancels_reads function tests that closing the stream early cancels the range reads
+        in flight and closes their sessions before aclose returns.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        opened, cancelled, closed = [], [], []
+        release = asyncio.Event()
+
+        @contextlib.asynccontextmanager
+        async def session_maker():
+            session = self.session_maker()
+            try:
+                async with session:
+                    opened.append(session)
+                    # the min/max query and the first range are served, the next ranges hang
+                    if len(opened) > 2:
+                        await release.wait()
+                    yield session
+            except asyncio.CancelledError:
+                cancelled.append(session)
+                raise
+            finally:
+                closed.append(session)
+
+        contacts = fan_out_contacts(session_maker, parallel=3, chunk_size=2)
+        self.assertEqual((await anext(contacts)).id, 1)
+        self.assertEqual(len(opened), 4)
+        await contacts.aclose()
+        self.assertEqual(cancelled, opened[2:])
+        self.assertEqual(closed, opened)
+
+    async def test_connections_are_shared(self):
+        """
+        The test_connections_are_shared function tests that the range reads of concurrent streams
+        never hold more sessions than the shared permits.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        active = peak = 0
+
+        @contextlib.asynccontextmanager
+        async def session_maker():
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            try:
+                async with self.session_maker() as session:
+                    await asyncio.sleep(0.001)
+                    yield session
+            finally:
+                active -= 1
+
+        connections = asyncio.Semaphore(2)
+        streams = [fan_out_contacts(session_maker, parallel=3, chunk_size=2, connections=connections)
+                   for _ in range(2)]
+        results = await asyncio.gather(*(self.collect(stream) for stream in streams))
+        self.assertEqual(results[0], list(range(1, 31)))
+        self.assertEqual(results[1], results[0])
+        # two range reads, plus the min/max query of a stream that has not started its ranges; 6 without the permits
+        self.assertLessEqual(peak, 3)
+
+    async def test_export_permits_follow_the_worker_pool(self):
+        """
+        The test_export_permits_follow_the_worker_pool function tests that the export permits are sized from the pool
+        settings of the worker when the first export runs, not from those seen when the application was imported.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        with patch.object(routes_contacts, "_export_connections", None), \
+                patch.object(routes_contacts, "_export_limit", 0), \
+                patch.object(config, "db_pool_size", 3), patch.object(config, "db_max_overflow", 0):
+            connections, limit = routes_contacts.get_export_connections()
+            self.assertEqual(limit, 1)
+            self.assertIs(routes_contacts.get_export_connections()[0], connections)
+
+
+if __name__ == '__main__':
+    unittest.main()
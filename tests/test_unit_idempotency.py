@@ -0,0 +1,45 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from src.services import idempotency
+from src.services.idempotency import MemoryIdempotencyStore, run_idempotent
+
+
+class TestIdempotency(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        store = patch.object(idempotency, "store", MemoryIdempotencyStore())
+        store.start()
+        self.addCleanup(store.stop)
+
+    async def test_concurrent_duplicates_execute_once(self):
+        """
+        The test_concurrent_duplicates_execute_once function tests that concurrent requests with the same key
+        execute the write once and all get its result.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        calls = []
+
+        async def create():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return {"id": len(calls)}
+
+        results = await asyncio.gather(*(run_idempotent("1", "key", "fp", create) for _ in range(5)))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([result for result, _ in results], [{"id": 1}] * 5)
+        self.assertEqual(sum(replayed for _, replayed in results), 4)
+
+    async def test_failed_request_can_be_retried(self):
+        async def fail():
+            raise ValueError("db error")
+
+        async def create():
+            return {"id": 1}
+
+        with self.assertRaises(ValueError):
+            await run_idempotent("1", "key", "fp", fail)
+        self.assertEqual(await run_idempotent("1", "key", "fp", create), ({"id": 1}, False))
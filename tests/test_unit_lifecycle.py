@@ -0,0 +1,86 @@
+import asyncio
+import signal
+import unittest
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.services.lifecycle import Lifecycle, warm_up_database
+
+
+class TestLifecycle(unittest.IsolatedAsyncioTestCase):
+
+    async def test_drain_waits_for_requests(self):
+        """
+        The test_drain_waits_for_requests function tests that draining reports not ready at once
+        and returns when the last request in progress finishes.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        lifecycle = Lifecycle()
+        lifecycle.ready = True
+        lifecycle.request_started()
+        drain = asyncio.create_task(lifecycle.drain(timeout=5))
+        await asyncio.sleep(0.01)
+        self.assertFalse(lifecycle.ready)
+        self.assertTrue(lifecycle.draining)
+        self.assertFalse(drain.done())
+        lifecycle.request_finished()
+        self.assertTrue(await drain)
+
+    async def test_drain_timeout(self):
+        lifecycle = Lifecycle()
+        lifecycle.request_started()
+        self.assertFalse(await lifecycle.drain(timeout=0.01))
+
+    async def test_server_exit_is_delayed(self):
+        """
+        The test_server_exit_is_delayed function tests that SIGTERM makes the application not ready at once
+        and stops the server after the delay, while SIGINT stops it at once.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        class Server:
+            def __init__(self):
+                self.should_exit = False
+
+            def handle_exit(self, sig, frame):
+                self.should_exit = True
+
+        lifecycle = Lifecycle()
+        lifecycle.ready = True
+        lifecycle.delay_server_exit(Server, delay=0.05)
+        lifecycle.delay_server_exit(Server, delay=0.05)
+        server = Server()
+        server.handle_exit(signal.SIGTERM, None)
+        self.assertFalse(lifecycle.ready)
+        await asyncio.sleep(0.01)
+        self.assertFalse(server.should_exit)
+        await asyncio.sleep(0.1)
+        self.assertTrue(server.should_exit)
+        other = Server()
+        other.handle_exit(signal.SIGINT, None)
+        self.assertTrue(other.should_exit)
+
+
+class TestWarmUp(unittest.IsolatedAsyncioTestCase):
+
+    async def test_database_errors_propagate(self):
+        """
+        The test_database_errors_propagate function tests that a failed database warm-up raises,
+        so the startup can log it, instead of being swallowed by the session.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        # no tables: every query fails
+        engine = create_async_engine("sqlite+aiosqlite://")
+        try:
+            with patch("src.services.lifecycle.sessionmanager", MagicMock(session_maker=async_sessionmaker(engine))):
+                with self.assertRaises(OperationalError):
+                    await warm_up_database(1)
+        finally:
+            await engine.dispose()
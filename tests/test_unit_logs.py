@@ -0,0 +1,113 @@
+import contextlib
+import io
+import json
+import logging
+import unittest
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.services.logs import JsonFormatter, RequestIdMiddleware, SamplingFilter, request_id, setup_logging, \
+    stop_logging
+
+
+class CountingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestLogs(unittest.TestCase):
+
+    def setUp(self):
+        root = logging.getLogger()
+        self.saved = root.handlers[:], root.level
+
+    def tearDown(self):
+        stop_logging()
+        root = logging.getLogger()
+        root.handlers[:], level = self.saved
+        root.setLevel(level)
+
+    def test_json_lines_with_request_id(self):
+        """
+        The test_json_lines_with_request_id function tests that the records go through the writer thread as JSON
+        lines, stamped with the request id of the context they were logged in and with their extra fields.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            setup_logging("INFO")
+            token = request_id.set("abc123")
+            try:
+                logging.getLogger("test").info("Hello %s", "world", extra={"user_id": 7})
+            finally:
+                request_id.reset(token)
+            logging.getLogger("test").warning("No request")
+            stop_logging()
+        first, second = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(first["message"], "Hello world")
+        self.assertEqual(first["request_id"], "abc123")
+        self.assertEqual(first["user_id"], 7)
+        self.assertEqual(first["level"], "INFO")
+        self.assertNotIn("request_id", second)
+
+    def test_disabled_level_creates_no_record(self):
+        logger = logging.getLogger("test.disabled")
+        logger.setLevel(logging.INFO)
+        handler = CountingHandler()
+        logger.addHandler(handler)
+        try:
+            logger.debug("Hidden %s", object())
+            logger.info("Shown")
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual([record.getMessage() for record in handler.records], ["Shown"])
+
+    def test_sampling_only_drops_debug(self):
+        sampling = SamplingFilter(0.0)
+        debug = logging.LogRecord("test", logging.DEBUG, "", 0, "debug", None, None)
+        warning = logging.LogRecord("test", logging.WARNING, "", 0, "warning", None, None)
+        self.assertFalse(sampling.filter(debug))
+        self.assertTrue(sampling.filter(warning))
+        self.assertTrue(SamplingFilter(1.0).filter(debug))
+
+    def test_formatter_exception(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.LogRecord("test", logging.ERROR, "", 0, "failed", None, __import__("sys").exc_info())
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertIn("ValueError: boom", entry["exception"])
+
+
+class TestRequestIdMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        async def echo(request):
+            return PlainTextResponse(request_id.get())
+
+        self.client = TestClient(RequestIdMiddleware(Starlette(routes=[Route("/", echo)])))
+
+    def test_generated_id(self):
+        response = self.client.get("/")
+        self.assertEqual(response.headers["X-Request-ID"], response.text)
+        self.assertEqual(len(response.text), 32)
+
+    def test_incoming_id(self):
+        response = self.client.get("/", headers={"X-Request-ID": "req-42"})
+        self.assertEqual(response.headers["X-Request-ID"], "req-42")
+        self.assertEqual(response.text, "req-42")
+        response = self.client.get("/", headers={"X-Request-ID": "bad id\n"})
+        self.assertNotEqual(response.text, "bad id\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
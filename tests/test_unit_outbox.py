@@ -0,0 +1,159 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.database.db import Base
+from src.database.models import OutboxMessage
+from src.repository.outbox import add_message
+from src.repository.users import create_user
+from src.schemas import UserSchema
+from src.services.outbox import OutboxRelay
+
+
+class TestOutboxRelay(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(self.directory.name, 'outbox.db')}")
+        self.session_maker = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.relay = OutboxRelay(batch_size=3, interval=10, concurrency=2, max_attempts=2, lease=30,
+                                 session_maker=self.session_maker)
+        self.delivered = []
+
+    async def asyncTearDown(self):
+        await self.relay.stop(timeout=1)
+        await self.engine.dispose()
+        self.directory.cleanup()
+
+    async def deliver(self, payload: dict) -> None:
+        self.delivered.append(payload)
+
+    async def pending(self) -> list[OutboxMessage]:
+        async with self.session_maker() as session:
+            return list((await session.execute(select(OutboxMessage).order_by(OutboxMessage.id))).scalars().all())
+
+    async def test_written_with_the_change(self):
+        """
+        The test_written_with_the_change function tests that the message is stored by the commit of the user,
+        and that a rolled back change leaves no message behind.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        body = UserSchema(username="tony_stark", email="tony@stark.com", password="123456")
+        async with self.session_maker() as session:
+            user = await create_user(body, session, host="http://testserver/")
+        async with self.session_maker() as session:
+            add_message(session, "user.created", {"user_id": 99})
+            await session.rollback()
+        messages = await self.pending()
+        self.assertEqual([message.topic for message in messages], ["user.created"])
+        self.assertEqual(messages[0].payload, {"user_id": user.id, "email": "tony@stark.com", "username": "tony_stark",
+                                               "host": "http://testserver/"})
+
+    async def test_relay_in_batches(self):
+        """
+        The test_relay_in_batches function tests that the messages are delivered in order, in batches,
+        and deleted once delivered.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self.relay.handle("contact.changed", self.deliver)
+        async with self.session_maker() as session:
+            for number in range(5):
+                add_message(session, "contact.changed", {"contact_id": number})
+            await session.commit()
+        self.assertEqual(await self.relay.relay_batch(), 3)
+        self.assertEqual(await self.relay.relay_batch(), 2)
+        self.assertEqual(await self.relay.relay_batch(), 0)
+        self.assertEqual([payload["contact_id"] for payload in self.delivered], [0, 1, 2, 3, 4])
+        self.assertEqual(await self.pending(), [])
+        self.assertEqual(self.relay.snapshot(), {"batches": 2, "delivered": 5, "failed": 0})
+
+    async def test_failed_delivery_is_retried(self):
+        """
+        The test_failed_delivery_is_retried function tests that a failed message is kept and postponed,
+        while the other messages of its batch are delivered, and that it is given up after max_attempts.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        async def broken(payload: dict) -> None:
+            raise ConnectionError("mail server is down")
+
+        self.relay.handle("user.created", broken)
+        self.relay.handle("contact.changed", self.deliver)
+        async with self.session_maker() as session:
+            add_message(session, "user.created", {"user_id": 1})
+            add_message(session, "contact.changed", {"contact_id": 1})
+            await session.commit()
+        self.assertEqual(await self.relay.relay_batch(), 2)
+        [message] = await self.pending()
+        self.assertEqual((message.topic, message.attempts), ("user.created", 1))
+        # postponed: not due yet
+        self.assertEqual(await self.relay.relay_batch(), 0)
+        async with self.session_maker() as session:
+            (await session.get(OutboxMessage, message.id)).available_at = message.created_at
+            await session.commit()
+        self.assertEqual(await self.relay.relay_batch(), 1)
+        self.assertEqual(await self.relay.relay_batch(), 0)
+        [message] = await self.pending()
+        self.assertEqual(message.attempts, 2)
+        self.assertEqual(self.relay.snapshot(), {"batches": 2, "delivered": 1, "failed": 2, "given_up": 1})
+
+    async def test_delivered_outside_the_transaction(self):
+        """
+        The test_delivered_outside_the_transaction function tests that the batch is leased and committed before
+        the handlers run: another relay does not claim it again, and the handler can write to the database.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        other = OutboxRelay(batch_size=3, interval=10, concurrency=2, max_attempts=2, lease=30,
+                            session_maker=self.session_maker)
+        claimed_again = []
+
+        async def deliver(payload: dict) -> None:
+            claimed_again.append(await other.relay_batch())
+            # the database is not locked by the relay: a write goes through at once
+            async with self.session_maker() as session:
+                add_message(session, "audit", payload)
+                await asyncio.wait_for(session.commit(), timeout=1)
+            [message] = [message for message in await self.pending() if message.topic == "contact.changed"]
+            self.assertGreater(message.available_at, message.created_at)
+
+        self.relay.handle("contact.changed", deliver)
+        async with self.session_maker() as session:
+            add_message(session, "contact.changed", {"contact_id": 1})
+            await session.commit()
+        self.assertEqual(await self.relay.relay_batch(), 1)
+        self.assertEqual(claimed_again, [0])
+        self.assertEqual([message.topic for message in await self.pending()], ["audit"])
+
+    async def test_notify_wakes_up_the_relay(self):
+        """
+        The test_notify_wakes_up_the_relay function tests that the running relay delivers a committed message
+        when notified, without waiting for its polling interval.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self.relay.handle("contact.changed", self.deliver)
+        self.relay.start()
+        async with self.session_maker() as session:
+            add_message(session, "contact.changed", {"contact_id": 1})
+            await session.commit()
+        self.assertNotIn("outbox", session.info)
+        self.relay.notify()
+        for _ in range(100):
+            if self.delivered:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.delivered, [{"contact_id": 1}])
@@ -0,0 +1,53 @@
+import asyncio
+import time
+import unittest
+
+from src.services.profiling import Profiler
+
+
+async def busy(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def handler() -> None:
+    await busy(0.1)
+    await asyncio.sleep(0.1)
+
+
+class TestProfiler(unittest.IsolatedAsyncioTestCase):
+
+    async def test_running_and_awaiting_stacks(self):
+        """
+        The test_running_and_awaiting_stacks function tests that the samples of a profiled task show where it runs,
+        and where it waits, and that the sampler thread stops with the last profile.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        profiler = Profiler()
+        profile = profiler.start({"method": "GET", "path": "/", "headers": []})
+        await handler()
+        profiler.stop(profile)
+        stacks = [";".join(stack) for stack in profile.samples]
+        self.assertTrue(any("busy" in stack and not stack.endswith("[await]") for stack in stacks))
+        self.assertTrue(any("handler" in stack and stack.endswith("[await]") for stack in stacks))
+        self.assertEqual(len(profiler.profiles), 1)
+        await asyncio.sleep(0.05)
+        self.assertIsNone(profiler._thread)
+
+    def test_selection(self):
+        profiler = Profiler()
+        profiler.arm(0.0, "/api")
+        token = profiler.token.encode()
+        self.assertFalse(profiler.should_profile({"path": "/api/contacts", "headers": []}))
+        self.assertTrue(profiler.should_profile({"path": "/", "headers": [(b"x-profile-token", token)]}))
+        self.assertFalse(profiler.should_profile({"path": "/", "headers": [(b"x-profile-token", b"guess")]}))
+        profiler.arm(1.0, "/api")
+        self.assertTrue(profiler.should_profile({"path": "/api/contacts", "headers": []}))
+        self.assertFalse(profiler.should_profile({"path": "/auth/login", "headers": []}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from tools.explain_queries import audit
+
+
+class TestQueryPlans(unittest.IsolatedAsyncioTestCase):
+
+    async def test_no_table_scans(self):
+        """
+        The test_no_table_scans function tests that every repository query can use an index,
+        so an index dropped from the models or a query with a new filter does not go unnoticed.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        engine = create_async_engine("sqlite+aiosqlite://", connect_args={"check_same_thread": False},
+                                     poolclass=StaticPool)
+        try:
+            plans = await audit(engine, users=2, contacts=5)
+        finally:
+            await engine.dispose()
+        self.assertIn("get_contacts", {plan.query for plan in plans})
+        self.assertEqual([(plan.query, plan.plan) for plan in plans if plan.flagged], [])
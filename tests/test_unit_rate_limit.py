@@ -0,0 +1,116 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException
+from redis.exceptions import ConnectionError
+
+from src.conf.config import config
+from src.services.auth import auth_service
+from src.services.cache import MemoryCache
+from src.services.rate_limit import RateLimit, TokenBucket, parse_rate
+
+
+def make_request(host="127.0.0.1", token=None):
+    request = MagicMock()
+    request.method = "POST"
+    request.scope = {"route": MagicMock(path="/auth/login")}
+    request.client.host = host
+    request.headers = {"authorization": f"Bearer {token}"} if token else {}
+    return request
+
+
+class TestRateLimit(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        RateLimit._redis_down_until = 0.0
+        enabled = patch.object(config, "rate_limit_enabled", True)
+        enabled.start()
+        self.addCleanup(enabled.stop)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("10/60"), (10, 60))
+
+    def test_token_bucket(self):
+        """
+        The test_token_bucket function tests that the bucket allows the burst, rejects the next request
+        and lets requests through again after the refill.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        bucket = TokenBucket(capacity=2, refill_rate=1)
+        self.assertTrue(bucket.acquire("key", now=0))
+        self.assertTrue(bucket.acquire("key", now=0))
+        self.assertFalse(bucket.acquire("key", now=0))
+        self.assertTrue(bucket.acquire("other", now=0))
+        self.assertTrue(bucket.acquire("key", now=1))
+
+    async def test_redis_rejects(self):
+        """
+        The test_redis_rejects function tests that a positive wait from the GCRA script is turned into 429 with
+        a Retry-After header.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        limit = RateLimit("10/60")
+        with patch.object(limit, "check_redis", AsyncMock(return_value=1500)):
+            with self.assertRaises(HTTPException) as ctx:
+                await limit(make_request())
+        self.assertEqual(ctx.exception.status_code, 429)
+        self.assertEqual(ctx.exception.headers["Retry-After"], "2")
+
+    async def test_prefilter_without_redis(self):
+        """
+        The test_prefilter_without_redis function tests that without Redis the in-process bucket still limits,
+        and Redis is not retried on every request.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        limit = RateLimit("2/60")
+        check_redis = AsyncMock(side_effect=ConnectionError("down"))
+        with patch.object(limit, "check_redis", check_redis):
+            for _ in range(4):
+                await limit(make_request())
+            with self.assertRaises(HTTPException):
+                await limit(make_request())
+            await limit(make_request(host="10.0.0.1"))
+        self.assertEqual(check_redis.await_count, 1)
+
+    async def test_limit_in_memory_cache(self):
+        """
+        The test_limit_in_memory_cache function tests that without Redis behind the cache the limit is counted
+        per period in the cache, and the rejection waits for the next period.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        limit = RateLimit("2/60")
+        with patch.object(limit, "cache", MemoryCache(max_size=100)), \
+                patch("src.services.rate_limit.time.time", return_value=6030.0):
+            await limit(make_request())
+            await limit(make_request())
+            with self.assertRaises(HTTPException) as ctx:
+                await limit(make_request())
+            await limit(make_request(host="10.0.0.1"))
+        self.assertEqual(ctx.exception.headers["Retry-After"], "30")
+
+    async def test_user_identity(self):
+        """
+        The test_user_identity function tests that the user scope keys by the verified token subject and falls back
+        to the ip without a token or with a forged one, so nobody can spend the limit of another user.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        from jose import jwt
+
+        limit = RateLimit("2/60", scope="user")
+        token = await auth_service.create_access_token({"sub": "user@example.com"})
+        self.assertEqual(limit.identity(make_request(token=token)),
+                         limit.identity(make_request(host="10.0.0.1", token=token)))
+        self.assertTrue(limit.identity(make_request(token=token)).startswith("user:"))
+        self.assertEqual(limit.identity(make_request()), "ip:127.0.0.1")
+        forged = jwt.encode({"sub": "user@example.com", "scope": "access_token"}, "not the secret key")
+        self.assertEqual(limit.identity(make_request(token=forged)), "ip:127.0.0.1")
@@ -0,0 +1,35 @@
+import unittest
+
+from serve import parse_args, worker_limits
+
+
+class TestServe(unittest.TestCase):
+
+    def test_worker_limits_split_budget(self):
+        """
+        The test_worker_limits_split_budget function tests that the workers together never hold more
+        connections than the budgets, and that each of them gets at least one.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        for workers in (1, 3, 8, 500):
+            limits = worker_limits(workers, 100, 200)
+            self.assertEqual(limits["db_max_overflow"], 0)
+            self.assertGreaterEqual(limits["db_pool_size"], 1)
+            self.assertGreaterEqual(limits["redis_max_connections"], 1)
+            if workers <= 100:
+                self.assertLessEqual(workers * limits["db_pool_size"], 100)
+                self.assertLessEqual(workers * limits["redis_max_connections"], 200)
+        self.assertEqual(worker_limits(4, 100, 200)["db_pool_size"], 25)
+
+    def test_parse_args(self):
+        args = parse_args(["--workers", "4", "--max-requests", "1000", "--pin-cpus", "--no-preload"])
+        self.assertEqual(args.workers, 4)
+        self.assertEqual(args.max_requests, 1000)
+        self.assertTrue(args.pin_cpus)
+        self.assertFalse(args.preload)
+
+
+if __name__ == '__main__':
+    unittest.main()
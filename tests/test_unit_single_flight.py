@@ -0,0 +1,108 @@
+import asyncio
+import pickle
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from src.database.models import User
+from src.services.auth import Auth, hash_for_user
+from src.services.cache import MemoryCache
+from src.services.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        """
+        The setUp function creates an auth service with an in-memory user cache for each test.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self.auth = Auth()
+        self.auth.cache = MemoryCache(max_size=100)
+        self.auth.user_flight = SingleFlight()
+        self.user = User(id=1, email="test@tes.com", username="tester")
+
+    async def test_concurrent_misses_share_one_query(self):
+        """
+        The test_concurrent_misses_share_one_query function tests that concurrent cache misses for one user
+        run a single database query and all get its result.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        async def slow_get_user(email, db):
+            await asyncio.sleep(0.01)
+            return self.user
+
+        with patch("src.repository.users.get_user_by_email", AsyncMock(side_effect=slow_get_user)) as mock_get:
+            users = await asyncio.gather(*(self.auth.get_cached_user(self.user.email, None) for _ in range(10)))
+        self.assertEqual(mock_get.await_count, 1)
+        self.assertTrue(all(user is self.user for user in users))
+        self.assertEqual(len(self.auth.user_flight), 0)
+        self.assertIsNotNone(await self.auth.cache.get(hash_for_user(self.user.email)))
+
+    async def test_error_reaches_all_callers(self):
+        with patch("src.repository.users.get_user_by_email", AsyncMock(side_effect=RuntimeError("db down"))):
+            results = await asyncio.gather(*(self.auth.get_cached_user(self.user.email, None) for _ in range(3)),
+                                           return_exceptions=True)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+    async def test_negative_cache(self):
+        """
+        The test_negative_cache function tests that an unknown email is cached, so the next request does not query.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        with patch("src.repository.users.get_user_by_email", AsyncMock(return_value=None)) as mock_get:
+            self.assertIsNone(await self.auth.get_cached_user("nobody@tes.com", None))
+            self.assertIsNone(await self.auth.get_cached_user("nobody@tes.com", None))
+        self.assertEqual(mock_get.await_count, 1)
+
+    async def test_early_refresh(self):
+        """
+        The test_early_refresh function tests that an entry close to its expiry is refreshed from the database,
+        while a fresh entry is served from the cache.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        key = hash_for_user(self.user.email)
+        with patch("src.repository.users.get_user_by_email", AsyncMock(return_value=self.user)) as mock_get:
+            await self.auth.cache.set(key, pickle.dumps((self.user, time.time() + 600, 0.001)))
+            await self.auth.get_cached_user(self.user.email, None)
+            self.assertEqual(mock_get.await_count, 0)
+            await self.auth.cache.set(key, pickle.dumps((self.user, time.time() + 0.5, 1.0)))
+            with patch("src.services.auth.random.random", return_value=0.99):
+                await self.auth.get_cached_user(self.user.email, None)
+            self.assertEqual(mock_get.await_count, 1)
+
+    async def test_cancelled_leader_hands_over(self):
+        """
+        The test_cancelled_leader_hands_over function tests that cancelling the caller that runs the query
+        cancels only that caller: a waiter runs the query again and the others get its result.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        flight = SingleFlight()
+        started = asyncio.Event()
+        calls = []
+
+        async def load():
+            calls.append(1)
+            started.set()
+            await asyncio.sleep(0.01 if len(calls) > 1 else 10)
+            return len(calls)
+
+        leader = asyncio.create_task(flight.do("key", load))
+        await started.wait()
+        followers = [asyncio.create_task(flight.do("key", load)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        self.assertEqual(await asyncio.gather(*followers), [2, 2, 2])
+        self.assertTrue(leader.cancelled())
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(flight), 0)
@@ -0,0 +1,86 @@
+import time
+import unittest
+
+from src.services.auth import Auth
+from src.services.sessions import MemorySessionStore
+from src.services.token_cache import TokenCache
+
+
+class TestTokenCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        """
+        The setUp function creates an auth service with its own token cache for each test.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self.auth = Auth()
+        self.auth.token_cache = TokenCache(max_size=2)
+
+    async def test_cached_after_verify(self):
+        """
+        The test_cached_after_verify function tests that a verified token is answered from the cache.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        token = await self.auth.create_access_token({"sub": "user@example.com"})
+        payload = self.auth.verify_access_token(token)
+        self.assertEqual(payload["sub"], "user@example.com")
+        self.assertIs(self.auth.token_cache.get(token), payload)
+
+    async def test_rejects_refresh_token(self):
+        token = await self.auth.create_refresh_token({"sub": "user@example.com"})
+        self.assertIsNone(self.auth.verify_access_token(token))
+        self.assertIsNone(self.auth.token_cache.get(token))
+
+    def test_expired_entry(self):
+        """
+        The test_expired_entry function tests that the cache does not return claims of an expired token.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self.auth.token_cache.put("token", {"sub": "user@example.com", "exp": time.time() - 1})
+        self.assertIsNone(self.auth.token_cache.get("token"))
+
+    def test_bounded(self):
+        exp = time.time() + 60
+        for token in ("a", "b", "c"):
+            self.auth.token_cache.put(token, {"sub": token, "exp": exp})
+        self.assertIsNone(self.auth.token_cache.get("a"))
+        self.assertIsNotNone(self.auth.token_cache.get("c"))
+
+    async def test_revoke(self):
+        """
+        The test_revoke function tests that a revoked token is rejected although its signature is still valid.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        token = await self.auth.create_access_token({"sub": "user@example.com"})
+        self.auth.revoke_access_token(token)
+        self.assertIsNone(self.auth.verify_access_token(token))
+
+    async def test_rotation_rejects_older_tokens(self):
+        """
+        The test_rotation_rejects_older_tokens function tests that a refresh of the session rejects the access tokens
+        issued before it, also within the same second, but not the one issued with the refresh,
+        and that a revocation rejects them all.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self.auth.sessions = MemorySessionStore(refresh_ttl=3600, access_ttl=3600)
+        sid = await self.auth.sessions.create("user@example.com", "first")
+        claims = {"sub": "user@example.com", "sid": sid}
+        old = self.auth.verify_access_token(await self.auth.create_access_token(claims))
+        self.assertEqual(await self.auth.session_not_before(sid), 0)
+        self.assertTrue(await self.auth.sessions.rotate(sid, "user@example.com", "first", "second"))
+        new = self.auth.verify_access_token(await self.auth.create_access_token(claims))
+        not_before = await self.auth.session_not_before(sid)
+        self.assertLess(old["iat"], not_before)
+        self.assertGreaterEqual(new["iat"], not_before)
+        await self.auth.sessions.revoke(sid)
+        self.assertLess(new["iat"], await self.auth.session_not_before(sid))
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.database.models import EmailOpen
+from src.services.tracking import OpenEventRecorder
+
+
+class TestOpenEventRecorder(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(self.directory.name, 'opens.db')}")
+        manager = MagicMock(session_maker=async_sessionmaker(self.engine, expire_on_commit=False))
+        patcher = patch("src.services.tracking.sessionmanager", manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.recorder = OpenEventRecorder(batch_size=10, flush_interval=60, max_buffer=100)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        self.directory.cleanup()
+
+    async def test_failed_insert_keeps_the_rows(self):
+        """
+        The test_failed_insert_keeps_the_rows function tests that the events of a failed INSERT stay in the buffer
+        and are written by the next flush.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self.recorder.record("ironman")
+        self.recorder.record("hulk")
+        # the table does not exist yet, the INSERT fails
+        self.assertEqual(await self.recorder.flush(), 0)
+        self.assertEqual([event["username"] for event in self.recorder._buffer], ["ironman", "hulk"])
+        async with self.engine.begin() as conn:
+            await conn.run_sync(EmailOpen.__table__.create)
+        self.assertEqual(await self.recorder.flush(), 2)
+        self.assertEqual(self.recorder._buffer, [])
+        async with self.engine.connect() as conn:
+            self.assertEqual(await conn.scalar(select(func.count()).select_from(EmailOpen)), 2)
+
+    async def test_rejected_rows_are_dropped(self):
+        """
+        The test_rejected_rows_are_dropped function tests that a batch the database rejects is not retried forever:
+        it is dropped, and the next events are written.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        async with self.engine.begin() as conn:
+            await conn.run_sync(EmailOpen.__table__.create)
+        # violates NOT NULL, like a username over the column length on PostgreSQL
+        self.recorder.record(None)
+        self.recorder.record("hulk")
+        self.assertEqual(await self.recorder.flush(), 0)
+        self.assertEqual((self.recorder._buffer, self.recorder.dropped), ([], 2))
+        self.recorder.record("ironman")
+        self.assertEqual(await self.recorder.flush(), 1)
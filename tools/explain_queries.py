@@ -0,0 +1,174 @@
+"""
+Query plan audit.
+
+Seeds a database with users and contacts, calls every repository function while recording the SQL it sends,
+and runs EXPLAIN for each recorded statement. Full scans of a table are reported, except for the queries
+in EXPECTED_SCANS. On PostgreSQL the plans are made with enable_seqscan off, so a sequential scan that remains
+means there is no index the query can use at all, whatever the size of the seeded tables.
+
+Usage: python -m tools.explain_queries [database url]
+The tables are created in the database and dropped at the end: use a scratch database, by default an in-memory
+SQLite one. Exits with status 1 if any unexpected scan was found.
+"""
+import asyncio
+import json
+import sys
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.db import Base
+from src.database.models import User
+from src.repository import contacts as repository_contacts
+from src.repository import stats as repository_stats
+from src.repository import users as repository_users
+from src.schemas import ContactsFilter, ContactsSchema, ContactsUpdateSchema, UserSchema
+
+# queries that read the whole table by design
+EXPECTED_SCANS = {"get_all_contacts"}
+
+
+@dataclass
+class Plan:
+    query: str
+    statement: str
+    plan: list[str]
+    scans: list[str] = field(default_factory=list)
+
+    @property
+    def flagged(self) -> bool:
+        return bool(self.scans) and self.query not in EXPECTED_SCANS
+
+
+class Recorder:
+    def __init__(self, engine: AsyncEngine):
+        """
+        Records the statements sent through the engine, labeled with the repository function that sent them.
+        """
+        self.query = None
+        self.statements: list[tuple[str, str, object]] = []
+        event.listen(engine.sync_engine, "before_cursor_execute", self.before_cursor_execute)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.query and not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            self.statements.append((self.query, statement, parameters))
+
+
+async def seed(session: AsyncSession, users: int, contacts: int) -> list[User]:
+    seeded = []
+    for i in range(users):
+        user = await repository_users.create_user(
+            UserSchema(username=f"user{i}", email=f"user{i}@example.com", password="x" * 6), session)
+        seeded.append(user)
+        for j in range(contacts):
+            await repository_contacts.create_contact(ContactsSchema(
+                name=f"Name{j}", surname=f"Surname{j}", email=f"contact{j}@example.com", phone=f"050{j:07d}",
+                bd="1990-01-01", city=f"City{j % 10}", notes="Seeded"), session, user)
+    return seeded
+
+
+async def run_queries(session: AsyncSession, recorder: Recorder, user: User) -> None:
+    contact = ContactsSchema(name="Tony", surname="Stark", email="tony@stark.com", phone="0501234567",
+                             bd="1970-05-29", city="Malibu", notes="Iron Man")
+    queries = [
+        ("get_user_by_email", lambda: repository_users.get_user_by_email(user.email, session)),
+        ("update_avatar", lambda: repository_users.update_avatar(user.email, "avatar.png", session)),
+        ("confirmed_email", lambda: repository_users.confirmed_email(user.email, session)),
+        ("create_contact", lambda: repository_contacts.create_contact(contact, session, user)),
+        ("get_contacts", lambda: repository_contacts.get_contacts(10, 10, session, user)),
+        ("get_all_contacts", lambda: repository_contacts.get_all_contacts(10, 10, session)),
+        ("get_all_contacts_of_owner", lambda: repository_contacts.get_all_contacts(
+            10, 0, session, ContactsFilter(user_id=user.id), after_id=1)),
+        ("get_contacts_range", lambda: repository_contacts.get_contacts_range(1, 100, session)),
+        ("get_contact", lambda: repository_contacts.get_contact(1, session, user)),
+        ("update_contact", lambda: repository_contacts.update_contact(
+            1, ContactsUpdateSchema(**contact.model_dump() | {"email": "anthony@stark.com"}), session, user)),
+        ("find_duplicates", lambda: drain(repository_contacts.find_duplicates(session, user))),
+        ("merge_contacts", lambda: repository_contacts.merge_contacts(1, [2], session, user)),
+        ("remove_contact", lambda: repository_contacts.remove_contact(3, session, user)),
+        ("get_stats", lambda: repository_stats.get_stats(session, user.id)),
+        ("count_contacts", lambda: repository_stats.count_contacts(session, user.id)),
+        ("count_all_contacts", lambda: repository_stats.count_all_contacts(session)),
+        ("reconcile_stats", lambda: repository_stats.reconcile_stats(session, user.id)),
+    ]
+    for name, query in queries:
+        recorder.query = name
+        await query()
+    recorder.query = None
+
+
+async def drain(iterator) -> None:
+    async for _ in iterator:
+        pass
+
+
+def scans_postgresql(node: dict) -> list[str]:
+    found = [node["Relation Name"]] if node["Node Type"] == "Seq Scan" else []
+    for child in node.get("Plans", []):
+        found += scans_postgresql(child)
+    return found
+
+
+async def explain(engine: AsyncEngine, query: str, statement: str, parameters) -> Plan:
+    async with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            await conn.exec_driver_sql("SET enable_seqscan = off")
+            result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+            plan = result.scalar_one()
+            root = (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+            return Plan(query, statement, [json.dumps(root)], scans_postgresql(root))
+        result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        details = [row[-1] for row in result.all()]
+        # "SCAN contacts USING INDEX ..." walks an index, a bare "SCAN contacts" reads the table
+        scans = [detail.split()[1] for detail in details if detail.startswith("SCAN ") and "USING" not in detail]
+        return Plan(query, statement, details, scans)
+
+
+async def audit(engine: AsyncEngine, users: int = 3, contacts: int = 20) -> list[Plan]:
+    """
+    The audit function seeds the database, runs every repository query and explains the recorded statements.
+
+    :param engine: AsyncEngine: Engine of a scratch database, the tables are created and dropped
+    :param users: int: Number of seeded users
+    :param contacts: int: Number of seeded contacts per user
+    :return: The plans, in the order of the queries
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
+    recorder = Recorder(engine)
+    try:
+        async with session_maker() as session:
+            seeded = await seed(session, users, contacts)
+            await run_queries(session, recorder, seeded[0])
+        return [await explain(engine, *statement) for statement in recorder.statements]
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", recorder.before_cursor_execute)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+
+
+async def main(url: str) -> int:
+    options = {"connect_args": {"check_same_thread": False}, "poolclass": StaticPool} if url.startswith("sqlite") else {}
+    engine = create_async_engine(url, **options)
+    try:
+        plans = await audit(engine)
+    finally:
+        await engine.dispose()
+    for plan in plans:
+        status = "SCAN " + ", ".join(plan.scans) if plan.scans else "ok"
+        if plan.scans and not plan.flagged:
+            status += " (expected)"
+        print(f"{plan.query:<26} {status}")
+        if plan.flagged:
+            print("    " + " ".join(plan.statement.split()))
+            for line in plan.plan:
+                print("    " + line)
+    return 1 if any(plan.flagged for plan in plans) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "sqlite+aiosqlite://")))
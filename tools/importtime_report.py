@@ -0,0 +1,64 @@
+"""
+Import time report.
+
+Imports a module in a fresh interpreter with `python -X importtime` and prints the total time and the modules that
+cost the most, by their own time and by cumulative time (including what they import).
+
+Usage: python -m tools.importtime_report [module] [top]
+The module is main by default, so the report shows the cold start of the application.
+"""
+import subprocess
+import sys
+from dataclasses import dataclass
+
+
+@dataclass
+class ImportTime:
+    name: str
+    depth: int
+    self_us: int
+    cumulative_us: int
+
+
+def measure(*modules: str) -> list[ImportTime]:
+    """
+    The measure function imports the modules in a new interpreter and parses the -X importtime output.
+
+    :param modules: str: The modules to import, main by default
+    :return: The imported modules, in the order the imports finished
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules or ['main'])}"],
+                            capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        stripped = name.lstrip()
+        times.append(ImportTime(stripped, (len(name) - len(stripped) - 1) // 2, int(self_us), int(cumulative_us)))
+    return times
+
+
+def total_ms(times: list[ImportTime]) -> float:
+    """
+    The total_ms function adds up the time of the top level imports.
+
+    :param times: list[ImportTime]: The result of measure
+    :return: The time of the whole import in milliseconds
+    """
+    return sum(item.cumulative_us for item in times if item.depth == 0) / 1000
+
+
+def main(module: str, top: int) -> None:
+    times = measure(module)
+    print(f"import {module}: {total_ms(times):.0f} ms, {len(times)} modules")
+    print(f"\nslowest by cumulative time (direct imports of {module}):")
+    for item in sorted((item for item in times if item.depth == 1), key=lambda item: -item.cumulative_us)[:top]:
+        print(f"  {item.cumulative_us / 1000:8.1f} ms  {item.name}")
+    print("\nslowest by own time:")
+    for item in sorted(times, key=lambda item: -item.self_us)[:top]:
+        print(f"  {item.self_us / 1000:8.1f} ms  {item.name}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "main", int(sys.argv[2]) if len(sys.argv) > 2 else 15)